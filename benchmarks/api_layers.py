@@ -0,0 +1,109 @@
+"""
+Per-layer overhead of the candidate list endpoint, on in-memory repositories.
+
+Times the same page of candidates read at each layer: the repository query, the
+document to API dict conversion (`candidate_helper`), the API function with its
+circuit breaker, FastAPI's response encoding, and the HTTP request through the
+routers (auth, validation and encoding) with or without the application's
+middleware stack. No database
+is needed, so the numbers are the application's own cost.
+
+Usage:
+    python -m benchmarks.api_layers [--candidates 100000] [--limit 100] [--full-stack]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import time
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from httpx import ASGITransport, AsyncClient
+from codegrapher.app.api.candidate import candidate_helper, candidate_schema_fields, retrieve_candidates
+from codegrapher.app.api.users import create_access_token
+from codegrapher.app.helpers import ResponseModel
+from codegrapher.app.memory_repositories import use_in_memory_repositories
+from codegrapher.app.routes.candidate import CandidateRouter
+from codegrapher.app.sync import utcnow
+from codegrapher.app.tenancy import DEFAULT_TENANT
+
+SKILLS = ["Python", "JavaScript", "SQL", "Go", "Rust", "Docker", "AWS", "React", "FastAPI", "MongoDB"]
+CITIES = ["London, UK", "Lahore, PK", "Berlin, DE", "Austin, US", "Toronto, CA"]
+EMAIL = "benchmark@example.com"
+
+
+def fake_candidate(i: int) -> dict:
+    candidate = {
+        "fullname": f"Candidate {i}",
+        "email": f"candidate{i}@example.com",
+        "address": f"{random.randint(1, 999)} Main St, {random.choice(CITIES)}",
+        "education": random.choice(["Bachelor in CS", "Master in CS", "BSc Mathematics"]),
+        "phone_number": f"+44{random.randint(1000000000, 9999999999)}",
+        "experience_years": round(random.uniform(0, 20), 1),
+        "skills": random.sample(SKILLS, 3),
+        "tenant_id": DEFAULT_TENANT,
+        "created_at": utcnow(),
+        "updated_at": utcnow(),
+    }
+    candidate.update(candidate_schema_fields(candidate))
+    return candidate
+
+
+async def timed(name: str, call, repeat: int):
+    # The auth dependency prints debug lines on every request.
+    with contextlib.redirect_stdout(io.StringIO()):
+        await call()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await call()
+        elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<28}{elapsed * 1e6:>12.1f}{1 / elapsed:>12.0f}")
+
+
+async def run(args):
+    if args.full_stack:
+        from codegrapher.main import app
+    else:
+        app = FastAPI()
+        app.include_router(CandidateRouter, prefix="/candidate")
+    candidates, users = use_in_memory_repositories(app)
+    candidates.load(fake_candidate(i) for i in range(args.candidates))
+    await users.insert({"fullname": "Benchmark", "email": EMAIL, "city": "London", "disabled": False})
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-32-bytes-or-more")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': EMAIL})}"}
+    params = {"limit": args.limit, "skills": "python"}
+    documents = await candidates.query(DEFAULT_TENANT, limit=args.limit, skills=("python",))
+
+    print(f"{args.candidates} candidates, pages of {args.limit} with a skill filter")
+    print(f"{'layer':<28}{'us/call':>12}{'calls/s':>12}")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark", headers=headers) as client:
+        await timed("repository query", lambda: candidates.query(DEFAULT_TENANT, limit=args.limit, skills=("python",)), args.repeat)
+        await timed("candidate_helper", lambda: asyncio.sleep(0, [candidate_helper(c) for c in documents]), args.repeat)
+        await timed("retrieve_candidates", lambda: retrieve_candidates(
+            DEFAULT_TENANT, candidates, 1, args.limit, None, False, ("python",)
+        ), args.repeat)
+        response = ResponseModel([candidate_helper(c) for c in documents], "Candidates data retrieved successfully")
+        await timed("jsonable_encoder", lambda: asyncio.sleep(0, jsonable_encoder(response)), args.repeat)
+        await timed("HTTP" + (" with middleware" if args.full_stack else ""), lambda: client.get(
+            "/candidate/all-candidates", params=params
+        ), args.repeat)
+    app.dependency_overrides.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--full-stack", action="store_true", help="Go through codegrapher.main's middleware stack")
+    args = parser.parse_args()
+
+    random.seed(0)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compression benchmark for candidate list pages and CSV exports.
+
+Reports bytes saved and CPU time per encoding for a 1000-candidate page
+(as returned by `/candidate/all-candidates`) and a 1M-row CSV export (as
+produced by `/candidate/generate-report`). Data is synthetic, no database
+is needed.
+
+Usage:
+    python -m benchmarks.compression [--rows 1000000]
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from bson.objectid import ObjectId
+from codegrapher.app.helpers import ResponseModel
+from codegrapher.app.compression import available_encodings, get_compressor
+
+SKILLS = ["Python", "JavaScript", "SQL", "Go", "Rust", "Docker", "AWS", "React", "FastAPI", "MongoDB"]
+CITIES = ["London, UK", "Lahore, PK", "Berlin, DE", "Austin, US", "Toronto, CA"]
+
+
+def fake_candidate(i: int) -> dict:
+    return {
+        "id": str(ObjectId()),
+        "fullname": f"Candidate {i}",
+        "email": f"candidate{i}@example.com",
+        "address": f"{random.randint(1, 999)} Main St, {random.choice(CITIES)}",
+        "education": random.choice(["Bachelor in CS", "Master in CS", "BSc Mathematics"]),
+        "phone_number": f"+44{random.randint(1000000000, 9999999999)}",
+        "experience_years": round(random.uniform(0, 20), 1),
+        "skills": random.sample(SKILLS, 3),
+    }
+
+
+def page_payload(size: int = 1000) -> bytes:
+    candidates = [fake_candidate(i) for i in range(size)]
+    return json.dumps(ResponseModel(candidates, "Candidates data retrieved successfully")).encode()
+
+
+def export_chunks(rows: int, rows_per_chunk: int = 10000):
+    headers = ["ID", "Full Name", "Email", "Address", "Education", "Phone Number", "Experience Years", "Skills"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for i in range(rows):
+        c = fake_candidate(i)
+        writer.writerow([
+            c["id"], c["fullname"], c["email"], c["address"], c["education"],
+            c["phone_number"], c["experience_years"], ", ".join(c["skills"]),
+        ])
+        if (i + 1) % rows_per_chunk == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def measure(encoding: str, chunks) -> tuple:
+    compressor = get_compressor(encoding)
+    raw = compressed = 0
+    cpu = 0.0
+    for chunk in chunks:
+        raw += len(chunk)
+        started = time.process_time()
+        compressed += len(compressor.compress(chunk))
+        cpu += time.process_time() - started
+    started = time.process_time()
+    compressed += len(compressor.flush())
+    cpu += time.process_time() - started
+    return raw, compressed, cpu
+
+
+def report(name: str, chunks: list):
+    print(f"\n{name}")
+    print(f"{'encoding':<10}{'raw bytes':>14}{'compressed':>14}{'saved':>9}{'cpu ms':>10}{'MB/s':>9}")
+    for encoding in available_encodings():
+        raw, compressed, cpu = measure(encoding, chunks)
+        saved = 100 * (1 - compressed / raw)
+        throughput = raw / 1e6 / cpu if cpu else float("inf")
+        print(f"{encoding:<10}{raw:>14}{compressed:>14}{saved:>8.1f}%{cpu * 1000:>10.1f}{throughput:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    report(f"{args.page_size}-candidate page", [page_payload(args.page_size)])
+    report(f"{args.rows}-row CSV export", list(export_chunks(args.rows)))
+
+
+if __name__ == "__main__":
+    main()
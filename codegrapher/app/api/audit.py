@@ -0,0 +1,140 @@
+import os
+from typing import List, Optional
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
+from ..database import database
+from ..deadline import max_time_ms
+from ..tracing import current_span
+from ..sync import utcnow
+from ..audit import AUDIT_COLLECTION, AuditBuffer
+
+load_dotenv()
+
+AUDIT_RETENTION_DAYS = float(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+
+audit_collection = database.get_collection(AUDIT_COLLECTION)
+
+
+async def create_audit_indexes():
+    """
+    Creates the TTL index expiring old events and the indexes used by audit queries.
+    Safe to call on every startup.
+    """
+    await audit_collection.create_index("timestamp", expireAfterSeconds=int(AUDIT_RETENTION_DAYS * 86400))
+    await audit_collection.create_index([("candidate_id", DESCENDING), ("timestamp", DESCENDING)])
+    await audit_collection.create_index([("actor", DESCENDING), ("timestamp", DESCENDING)])
+    await audit_collection.create_index([("tenant_id", DESCENDING), ("timestamp", DESCENDING)])
+
+
+async def write_audit_events(events: List[dict]):
+    """
+    Writes a batch of audit events.
+
+    Events carry their own `_id`, so a batch retried after a partial write only
+    inserts the events that are missing.
+
+    Args:
+        events (List[dict]): The events.
+    """
+    try:
+        await audit_collection.insert_many(events, ordered=False)
+    except BulkWriteError as exc:
+        if any(error.get("code") != 11000 for error in exc.details.get("writeErrors", [])):
+            raise
+
+
+audit_log = AuditBuffer(write_audit_events)
+
+
+def audit_helper(event) -> dict:
+    """
+    Helper function to format an audit event.
+
+    Args:
+        event (dict): Audit event from the database.
+
+    Returns:
+        dict: Formatted audit event.
+    """
+    return {
+        "id": str(event["_id"]),
+        "action": event["action"],
+        "candidate_id": event["candidate_id"],
+        "actor": event["actor"],
+        "tenant_id": event.get("tenant_id"),
+        "fields": event.get("fields", []),
+        "trace_id": event.get("trace_id"),
+        "timestamp": event["timestamp"],
+    }
+
+
+async def record_audit(
+    action: str, candidate_id: str, actor: str, tenant: str, fields: Optional[List[str]] = None
+) -> bool:
+    """
+    Buffers an audit event for a candidate mutation.
+
+    Args:
+        action (str): "create", "update" or "delete".
+        candidate_id (str): Candidate ID.
+        actor (str): Email of the user who made the change.
+        tenant (str): Tenant of the candidate.
+        fields (Optional[List[str]]): Names of the fields written.
+
+    Returns:
+        bool: False if the event was dropped.
+    """
+    span = current_span()
+    return await audit_log.record({
+        "_id": ObjectId(),
+        "action": action,
+        "candidate_id": candidate_id,
+        "actor": actor,
+        "tenant_id": tenant,
+        "fields": sorted(fields or []),
+        "trace_id": span.context.trace_id if span else None,
+        "timestamp": utcnow(),
+    })
+
+
+async def retrieve_audit_events(
+    candidate_id: Optional[str] = None,
+    actor: Optional[str] = None,
+    action: Optional[str] = None,
+    tenant: Optional[str] = None,
+    page: int = 1,
+    limit: int = 50,
+):
+    """
+    Retrieves audit events, newest first. Events still buffered in memory are not included.
+
+    Args:
+        candidate_id (Optional[str]): Only events about this candidate.
+        actor (Optional[str]): Only events by this user.
+        action (Optional[str]): Only events of this action.
+        tenant (Optional[str]): Only events of this tenant.
+        page (int): Page number for pagination.
+        limit (int): Number of events per page.
+
+    Returns:
+        list: List of formatted audit events.
+    """
+    query = {}
+    if candidate_id:
+        query["candidate_id"] = candidate_id
+    if actor:
+        query["actor"] = actor
+    if action:
+        query["action"] = action
+    if tenant:
+        query["tenant_id"] = tenant
+    skip = (page - 1) * limit
+    events = []
+    cursor = audit_collection.find(
+        query, max_time_ms=max_time_ms()
+    ).sort("timestamp", DESCENDING).skip(skip).limit(limit)
+    async for event in cursor:
+        events.append(audit_helper(event))
+    return events
@@ -1,186 +1,312 @@
 from fastapi import HTTPException
 from bson.objectid import ObjectId
-from ..database import database
-from typing import Optional
+from ..circuit_breaker import protected, mongo_breaker, read_cache
+from ..dedup import normalize_skills
+from ..export import REPORT_HEADERS, report_row
+from ..geo import Box, Point, location_document, location_helper
+from ..repositories import CandidateRepository, candidate_repository
+from ..tenancy import safe_tenant_name
+from .tenants import reserve_candidate, release_candidate
+from ..sync import (
+    utcnow,
+    sync_horizon,
+    caught_up,
+    decode_sync_token,
+    encode_sync_token,
+)
+from typing import Optional, Tuple
 import csv
 
-candidate_collection = database.get_collection("candidate_collection")
+# Version of the candidate document shape written by this code. Older documents
+# are upgraded by the migrations in `codegrapher.app.migrations`.
+CANDIDATE_SCHEMA_VERSION = 2
+
+def candidate_schema_fields(candidate: dict) -> dict:
+    """
+    Derived fields of the current candidate document shape, apart from the tenant_id
+    which callers set.
+
+    Args:
+        candidate (dict): Candidate data containing at least the email and skills.
+
+    Returns:
+        dict: Fields to store alongside the candidate data.
+    """
+    return {
+        "email_lower": candidate.get("email", "").strip().lower(),
+        "skills_canonical": normalize_skills(candidate.get("skills")),
+        "schema_version": CANDIDATE_SCHEMA_VERSION,
+    }
 
 def candidate_helper(candidate) -> dict:
     """
     Helper function to format candidate data.
 
+    Reads both the current document shape and the one written before schema
+    versioning, which lacks timestamps, from the hot or the archive collection.
+
     Args:
         candidate (dict): Candidate data from the database.
 
     Returns:
         dict: Formatted candidate data.
     """
+    created_at = candidate.get("created_at") or candidate["_id"].generation_time.replace(tzinfo=None)
     return {
         "id": str(candidate["_id"]),
         "fullname": candidate["fullname"],
         "email": candidate["email"],
-        "address": candidate["address"],
-        "education": candidate["education"],
-        "phone_number": candidate["phone_number"],
-        "experience_years": candidate["experience_years"],
-        "skills": candidate["skills"]
+        "address": candidate.get("address", ""),
+        "education": candidate.get("education", ""),
+        "phone_number": candidate.get("phone_number", ""),
+        "experience_years": candidate.get("experience_years", 0),
+        "skills": candidate.get("skills", []),
+        "location": location_helper(candidate.get("location")),
+        "created_at": created_at,
+        "updated_at": candidate.get("updated_at") or created_at,
+        "archived": "archived_at" in candidate,
     }
-    
+
+
+async def create_candidate_indexes():
+    """
+    Creates the indexes of the candidate collections. Safe to call on every startup.
+    """
+    await candidate_repository.create_indexes()
+
+@protected(mongo_breaker, read_cache)
 async def retrieve_candidates(
+    tenant: str,
+    repository: CandidateRepository,
     page: int = 1,
     limit: int = 10,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    include_archived: bool = False,
+    skills: Optional[Tuple[str, ...]] = None,
+    min_experience: Optional[float] = None,
+    near: Optional[Point] = None,
+    radius_km: float = 50,
+    within: Optional[Box] = None
 ):
     """
-    Retrieves a list of candidates with pagination and search.
+    Retrieves a list of candidates with pagination, search and filters.
+
+    Only the hot collection is read unless `include_archived` is set, in which case
+    archived candidates follow the hot ones. Filters are tuples rather than lists so
+    the arguments can key the stale read cache.
 
     Args:
+        tenant (str): Tenant whose candidates are listed.
+        repository (CandidateRepository): Candidate store.
         page (int): Page number for pagination.
         limit (int): Number of candidates per page.
         search (Optional[str]): Search term for filtering candidates.
+        include_archived (bool): Whether to also search archived candidates.
+        skills (Optional[Tuple[str, ...]]): Skills the candidates must all have.
+        min_experience (Optional[float]): Minimum years of experience.
+        near (Optional[Point]): (latitude, longitude) the candidates must be within `radius_km` of.
+        radius_km (float): Search radius around `near` in kilometers.
+        within (Optional[Box]): Bounding box the candidates must be located in.
 
     Returns:
         list: List of formatted candidate data.
     """
-    skip = (page - 1) * limit
-
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"fullname": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}},
-                {"address": {"$regex": search, "$options": "i"}},
-                {"education": {"$regex": search, "$options": "i"}},
-                {"phone_number": {"$regex": search, "$options": "i"}},
-                {"skills": {"$regex": search, "$options": "i"}}
-            ]
-        }
-
-    candidates = []
-    async for candidate in candidate_collection.find(query).skip(skip).limit(limit):
-        candidates.append(candidate_helper(candidate))
+    candidates = await repository.query(
+        tenant, page, limit, search, include_archived, skills, min_experience, near, radius_km, within
+    )
+    return [candidate_helper(candidate) for candidate in candidates]
 
-    return candidates
-
-async def add_candidate(candidate_data: dict) -> dict:
+@protected(mongo_breaker)
+async def add_candidate(candidate_data: dict, tenant: str, repository: CandidateRepository) -> dict:
     """
     Adds a new candidate to the database.
 
     Args:
         candidate_data (dict): Candidate data to add.
+        tenant (str): Tenant the candidate belongs to.
+        repository (CandidateRepository): Candidate store.
 
     Returns:
         dict: Formatted candidate data of the newly added candidate.
 
     Raises:
-        HTTPException: If candidate with the same email already exists.
+        HTTPException: If candidate with the same email already exists in the tenant,
+            or the tenant's candidate quota is reached.
     """
-    candidate_exists = await candidate_collection.find_one({"email": candidate_data["email"]})
-    if candidate_exists:
+    if await repository.find_by_email(tenant, candidate_data["email"]):
         raise HTTPException(status_code=400, detail="Email already registered")
-    candidate = await candidate_collection.insert_one(candidate_data)
-    new_candidate = await candidate_collection.find_one({"_id": candidate.inserted_id})
+    await reserve_candidate(tenant, repository)
+    now = utcnow()
+    candidate_data.update(candidate_schema_fields(candidate_data))
+    candidate_data["location"] = location_document(candidate_data.get("location"))
+    candidate_data["tenant_id"] = tenant
+    candidate_data["created_at"] = now
+    candidate_data["updated_at"] = now
+    try:
+        new_candidate = await repository.insert(candidate_data)
+    except BaseException:
+        await release_candidate(tenant, repository)
+        raise
     return candidate_helper(new_candidate)
 
-async def retrieve_candidate(id: str) -> dict:
+@protected(mongo_breaker, read_cache)
+async def retrieve_candidate(id: str, tenant: str, repository: CandidateRepository, include_archived: bool = False) -> dict:
     """
     Retrieves a candidate by ID.
 
     Args:
         id (str): Candidate ID.
+        tenant (str): Tenant of the current user; other tenants' candidates are not found.
+        repository (CandidateRepository): Candidate store.
+        include_archived (bool): Whether to look in the archive when the candidate isn't hot.
 
     Returns:
         dict: Formatted candidate data if found.
     """
-    candidate = await candidate_collection.find_one({"_id": ObjectId(id)})
+    candidate = await repository.get(ObjectId(id), tenant, include_archived)
     if candidate:
         return candidate_helper(candidate)
 
-async def update_candidate(id: str, data: dict):
+@protected(mongo_breaker)
+async def update_candidate(id: str, data: dict, tenant: str, repository: CandidateRepository):
     """
-    Updates a candidate by ID.
+    Updates a candidate by ID. An archived candidate is restored to the hot
+    collection first.
 
     Args:
         id (str): Candidate ID.
         data (dict): Data to update.
+        tenant (str): Tenant of the current user; other tenants' candidates are not found.
+        repository (CandidateRepository): Candidate store.
 
     Returns:
         dict: Formatted updated candidate data if successful.
     """
     if not data:
         return None
-    candidate = await candidate_collection.find_one({"_id": ObjectId(id)})
-    if not candidate:
-        return None
-    updated_result = await candidate_collection.update_one({"_id": ObjectId(id)}, {"$set": data})
-    if updated_result.modified_count > 0:
-        return await candidate_collection.find_one({"_id": ObjectId(id)})
+    data = {**data, **candidate_schema_fields(data), "tenant_id": tenant, "updated_at": utcnow()}
+    if "location" in data:
+        data["location"] = location_document(data["location"])
+    updated = await repository.update(ObjectId(id), tenant, data)
+    if updated:
+        return candidate_helper(updated)
     return None
 
-async def delete_candidate(id: str):
+@protected(mongo_breaker)
+async def delete_candidate(id: str, tenant: str, repository: CandidateRepository):
     """
-    Deletes a candidate by ID.
+    Soft deletes a candidate by ID, leaving a tombstone for incremental sync. The
+    archival job later moves it out of the hot collection.
 
     Args:
         id (str): Candidate ID.
+        tenant (str): Tenant of the current user; other tenants' candidates are not found.
+        repository (CandidateRepository): Candidate store.
 
     Returns:
         bool: True if candidate was deleted, False otherwise.
     """
-    candidate = await candidate_collection.find_one({"_id": ObjectId(id)})
-    if candidate:
-        await candidate_collection.delete_one({"_id": ObjectId(id)})
+    if await repository.soft_delete(ObjectId(id), tenant):
+        await release_candidate(tenant, repository)
         return True
 
-async def generate_csv_report():
+
+@protected(mongo_breaker)
+async def retrieve_changes(tenant: str, repository: CandidateRepository, since: Optional[str] = None, limit: int = 500) -> dict:
+    """
+    Retrieves candidates changed and deleted since a sync token.
+
+    Changes are returned in (updated_at, _id) order and deletions in (deleted_at, _id)
+    order, at most `limit` of each. Clients keep calling with the returned token while
+    `has_more` is true. Once a kind is exhausted its watermark moves to the horizon,
+    so the tokens of a tenant without changes stay current.
+
+    Args:
+        tenant (str): Tenant whose changes are returned.
+        repository (CandidateRepository): Candidate store.
+        since (Optional[str]): Token returned by the previous sync, None for a full sync.
+        limit (int): Maximum number of changes and of deletions per call.
+
+    Returns:
+        dict: The changed candidates, the deleted candidate ids, the next token and `has_more`.
+    """
+    changes_mark, deletions_mark = decode_sync_token(since)
+    horizon = sync_horizon()
+
+    changes = []
+    async for candidate in repository.changed(tenant, changes_mark, horizon, limit):
+        changes.append(candidate_helper(candidate))
+        changes_mark = (candidate.get("updated_at"), candidate["_id"])
+
+    deleted = []
+    async for tombstone in repository.deleted(tenant, deletions_mark, horizon, limit):
+        deleted.append(str(tombstone["candidate_id"]))
+        deletions_mark = (tombstone["deleted_at"], tombstone["_id"])
+
+    # A short page means everything up to the horizon has been returned.
+    if len(changes) < limit:
+        changes_mark = caught_up(horizon)
+    if len(deleted) < limit:
+        deletions_mark = caught_up(horizon)
+
+    return {
+        "changes": changes,
+        "deleted": deleted,
+        "token": encode_sync_token(changes_mark, deletions_mark),
+        "has_more": len(changes) == limit or len(deleted) == limit,
+    }
+
+@protected(mongo_breaker)
+async def generate_csv_report(tenant: str, repository: CandidateRepository, since: Optional[str] = None):
     
     """
     Generates a CSV report of all candidates and saves it to a file.
 
+    With a sync token only the candidates changed since that token are exported
+    (delta mode). Either way rows come in the same order as `retrieve_changes`, so the
+    returned token continues where this report stopped.
+
+    Args:
+        tenant (str): Tenant whose candidates are exported.
+        repository (CandidateRepository): Candidate store.
+        since (Optional[str]): Sync token from a previous report or sync, None for a full report.
+
     Returns:
-        str: Path to the generated CSV file.
+        tuple: Path to the generated CSV file and the token for the next delta report.
 
     Raises:
         Exception: If there is an error writing to the file.
     """
     
     
-    headers = ["ID", "Full Name", "Email", "Address", "Education", "Phone Number", "Experience Years", "Skills"]
+    changes_mark, deletions_mark = decode_sync_token(since)
+    horizon = sync_horizon()
 
     async def fetch_and_prepare_candidates(batch_size=1000):
+        nonlocal changes_mark
         candidates = []
-        cursor = candidate_collection.find({})
-        async for candidate in cursor:
+        async for candidate in repository.changed(tenant, changes_mark, horizon):
             candidates.append(candidate)
             if len(candidates) == batch_size:
                 yield candidates
                 candidates = []
         if candidates:
             yield candidates
+        # The report has every change up to the horizon.
+        changes_mark = caught_up(horizon)
 
-    file_path = 'report.csv'
+    file_path = f'report-{safe_tenant_name(tenant)}.csv'
 
     try:
         with open(file_path, mode='w', newline='') as csvfile:
             writer = csv.writer(csvfile)
-            writer.writerow(headers)
+            writer.writerow(REPORT_HEADERS)
             async for batch in fetch_and_prepare_candidates():
                 for candidate in batch:
-                    writer.writerow([
-                        str(candidate.get('id', '')),
-                        candidate.get('fullname', ''),
-                        candidate.get('email', ''),
-                        candidate.get('address', ''),
-                        candidate.get('education', ''),
-                        candidate.get('phone_number', ''),
-                        str(candidate.get('experience_years', '')),
-                        ', '.join(candidate.get('skills', []))
-                    ])
+                    writer.writerow(report_row(candidate))
     except Exception as e:
         # Handle file write errors
         print(f"Error writing to file: {e}")
         raise e
 
-    return file_path
\ No newline at end of file
+    return file_path, encode_sync_token(changes_mark, deletions_mark)
\ No newline at end of file
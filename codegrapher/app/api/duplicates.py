@@ -0,0 +1,121 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from ..database import database
+from ..deadline import max_time_ms, bounded
+from ..dedup import (
+    DEDUP_THRESHOLD,
+    DUPLICATE_COLLECTION,
+    signature_document,
+    similarity,
+)
+from ..tenancy import tenant_filter
+from ..repositories import CandidateRepository
+
+duplicate_collection = database.get_collection(DUPLICATE_COLLECTION)
+
+
+def duplicate_helper(duplicate) -> dict:
+    """
+    Helper function to format a duplicate pair.
+
+    Args:
+        duplicate (dict): Duplicate pair document from the database.
+
+    Returns:
+        dict: Formatted duplicate pair.
+    """
+    return {
+        "id": str(duplicate["_id"]),
+        "candidate_ids": [str(candidate_id) for candidate_id in duplicate["candidate_ids"]],
+        "similarity": duplicate["similarity"],
+        "status": duplicate["status"],
+        "detected_at": duplicate.get("detected_at"),
+        "reviewed_by": duplicate.get("reviewed_by"),
+    }
+
+
+async def index_candidate(id: str, tenant: str, repository: CandidateRepository):
+    """
+    Computes the signature of one candidate and records its likely duplicates.
+
+    Only candidates of the same tenant sharing an LSH band with it are fetched and
+    compared. Run after a candidate is added or updated.
+
+    Args:
+        id (str): Candidate ID.
+        tenant (str): Tenant of the candidate.
+        repository (CandidateRepository): Candidate store, keeping the signatures and pairs.
+    """
+    candidate = await repository.dedup_fields(ObjectId(id), tenant)
+    if candidate is None:
+        return
+    document = signature_document(candidate)
+    async for other in repository.similar_signatures(document):
+        score = similarity(document["signature"], other["signature"])
+        if score >= DEDUP_THRESHOLD:
+            await repository.record_duplicate(candidate["_id"], other["candidate_id"], score, document["tenant_id"])
+    await repository.save_signature(document)
+
+
+async def unindex_candidate(id: str, tenant: str, repository: CandidateRepository):
+    """
+    Removes a deleted candidate's signature and its unreviewed duplicate pairs.
+
+    Args:
+        id (str): Candidate ID.
+        tenant (str): Tenant of the candidate.
+        repository (CandidateRepository): Candidate store, keeping the signatures and pairs.
+    """
+    await repository.remove_signature(ObjectId(id), tenant)
+
+
+async def retrieve_duplicates(tenant: str, status: str = "pending", page: int = 1, limit: int = 10):
+    """
+    Retrieves duplicate pairs with a given review status, most similar first.
+
+    Args:
+        tenant (str): Tenant whose duplicate pairs are listed.
+        status (str): Review status ("pending", "confirmed" or "dismissed").
+        page (int): Page number for pagination.
+        limit (int): Number of pairs per page.
+
+    Returns:
+        list: List of formatted duplicate pairs.
+    """
+    skip = (page - 1) * limit
+    duplicates = []
+    cursor = duplicate_collection.find(
+        {**tenant_filter(tenant), "status": status}, max_time_ms=max_time_ms()
+    ).sort("similarity", -1).skip(skip).limit(limit)
+    async for duplicate in cursor:
+        duplicates.append(duplicate_helper(duplicate))
+    return duplicates
+
+
+async def review_duplicate(id: str, tenant: str, status: str, reviewer: str):
+    """
+    Records a review decision on a duplicate pair.
+
+    Args:
+        id (str): Duplicate pair ID.
+        tenant (str): Tenant of the reviewer; other tenants' pairs are not found.
+        status (str): "confirmed" or "dismissed".
+        reviewer (str): Email of the reviewing user.
+
+    Returns:
+        dict: Formatted duplicate pair if found.
+    """
+    try:
+        _id = ObjectId(id)
+    except InvalidId:
+        return None
+    result = await bounded(
+        duplicate_collection.update_one(
+            {"_id": _id, **tenant_filter(tenant)},
+            {"$set": {"status": status, "reviewed_by": reviewer}},
+        )
+    )
+    if result.matched_count == 0:
+        return None
+    duplicate = await duplicate_collection.find_one({"_id": _id}, max_time_ms=max_time_ms())
+    return duplicate_helper(duplicate)
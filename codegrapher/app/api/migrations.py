@@ -0,0 +1,18 @@
+from ..database import database
+from ..deadline import max_time_ms
+from ..migrations import MIGRATION_COLLECTION, MIGRATIONS, migration_progress
+
+migration_collection = database.get_collection(MIGRATION_COLLECTION)
+
+
+async def retrieve_migrations():
+    """
+    Retrieves the progress of every registered migration.
+
+    Returns:
+        list: Progress of each migration, in version order.
+    """
+    records = {}
+    async for record in migration_collection.find({}, max_time_ms=max_time_ms()):
+        records[record["_id"]] = record
+    return [migration_progress(migration, records.get(migration.version)) for migration in MIGRATIONS]
@@ -0,0 +1,51 @@
+from fastapi import HTTPException, status
+from ..repositories import CandidateRepository
+from ..tenancy import candidate_quota, tenant_quota_rejections
+
+
+async def reserve_candidate(tenant: str, repository: CandidateRepository):
+    """
+    Counts one more candidate against the tenant's quota.
+
+    The check and the increment are a single atomic operation of the repository, so
+    concurrent inserts can't go over the quota together.
+
+    Args:
+        tenant (str): Tenant id.
+        repository (CandidateRepository): Candidate store keeping the counts.
+
+    Raises:
+        HTTPException: 403 if the tenant already has as many candidates as its quota allows.
+    """
+    if not await repository.reserve(tenant, candidate_quota(tenant)):
+        tenant_quota_rejections.inc(tenant=tenant)
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Candidate quota exceeded")
+
+
+async def release_candidate(tenant: str, repository: CandidateRepository):
+    """
+    Gives back one candidate of the tenant's quota, after a delete or a failed insert.
+
+    Args:
+        tenant (str): Tenant id.
+        repository (CandidateRepository): Candidate store keeping the counts.
+    """
+    await repository.release(tenant)
+
+
+async def retrieve_tenant_usage(tenant: str, repository: CandidateRepository) -> dict:
+    """
+    Retrieves a tenant's candidate count and quota.
+
+    Args:
+        tenant (str): Tenant id.
+        repository (CandidateRepository): Candidate store keeping the counts.
+
+    Returns:
+        dict: The tenant id, number of candidates and quota (None for no limit).
+    """
+    return {
+        "tenant": tenant,
+        "candidates": await repository.usage(tenant),
+        "quota": candidate_quota(tenant) or None,
+    }
@@ -1,12 +1,16 @@
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
-from typing import Annotated
-from ..database import database
+from typing import Annotated, Optional
+from ..tracing import traced
+from ..circuit_breaker import protected, mongo_breaker, read_cache
+from ..sync import utcnow
+from ..tenancy import tenant_for_email
 from ..models.user import UserInDB, TokenData, User
+from ..repositories import UserRepository, get_user_repository
 import jwt
 import os
 
@@ -14,14 +18,36 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-user_collection = database.get_collection("users_collection")
-
 load_dotenv()
 
+# Version of the user document shape written by this code. Older documents
+# are upgraded by the migrations in `codegrapher.app.migrations`.
+USER_SCHEMA_VERSION = 2
+
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+def user_schema_fields(user: dict) -> dict:
+    """
+    Derived fields of the current user document shape.
+
+    Args:
+        user (dict): User data containing at least the email.
+
+    Returns:
+        dict: Fields to store alongside the user data.
+    """
+    return {
+        "email_lower": user.get("email", "").strip().lower(),
+        "schema_version": USER_SCHEMA_VERSION,
+    }
+
 def user_helper(user) -> dict:
     """
     Helper function to transform a MongoDB user document into a dictionary.
 
+    Reads both the current document shape and the one written before schema
+    versioning, which lacks timestamps.
+
     Args:
         user (dict): The user document.
 
@@ -30,10 +56,12 @@ def user_helper(user) -> dict:
     """
     return {
         "id": str(user["_id"]),
-        "fullname": user["fullname"],
+        "fullname": user.get("fullname"),
         "email": user["email"],
-        "city": user["city"],
-        "disabled": user["disabled"],
+        "city": user.get("city", ""),
+        "disabled": user.get("disabled", False),
+        "tenant_id": user.get("tenant_id"),
+        "created_at": user.get("created_at") or user["_id"].generation_time.replace(tzinfo=None),
     }
     
 
@@ -58,6 +86,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
+@traced("bcrypt.verify")
 def verify_password(plain_password, hashed_password):
     """
     Verify a plain password against a hashed password.
@@ -71,6 +100,7 @@ def verify_password(plain_password, hashed_password):
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+@traced("bcrypt.hash")
 def get_password_hash(password):
     """
     Hash a plain password.
@@ -127,12 +157,19 @@ def decode_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+@traced("get_current_user")
+# No stale reads: a disabled or moved user must not be authenticated from the cache.
+@protected(mongo_breaker)
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    users: Annotated[UserRepository, Depends(get_user_repository)],
+):
     """
     Retrieve the current user based on the provided token.
 
     Args:
         token (str): The JWT token.
+        users (UserRepository): User store.
 
     Returns:
         UserInDB: The user data.
@@ -158,7 +195,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     except jwt.PyJWTError:
         raise credentials_exception
     print("Email is----", email)
-    user = await user_collection.find_one({"email": token_data.email})
+    user = await users.find_by_email(token_data.email)
     print("User found----", user)
     if user is None:
         raise credentials_exception
@@ -184,12 +221,96 @@ async def get_current_active_user(current_user: Annotated[User, Depends(get_curr
     return current_user
 
 
-async def login(user_data):
+async def get_current_tenant(request: Request, current_user: Annotated[User, Depends(get_current_active_user)]) -> str:
+    """
+    Retrieve the tenant of the current active user.
+
+    Args:
+        request (Request): The incoming request, tagged with the tenant for per-tenant metrics.
+        current_user (User): The current active user.
+
+    Returns:
+        str: The tenant id.
+
+    Raises:
+        HTTPException: 403 if no administrator has assigned the user to a tenant yet.
+    """
+    tenant = current_user.tenant_id
+    if not tenant:
+        raise HTTPException(status_code=403, detail="User is not assigned to a tenant")
+    request.state.tenant = tenant
+    return tenant
+
+
+def is_admin_email(email: str) -> bool:
+    """
+    Check whether an email belongs to an administrator listed in `ADMIN_EMAILS`.
+
+    Args:
+        email (str): The user's email.
+
+    Returns:
+        bool: True if the user is an administrator.
+    """
+    return bool(email) and email.lower() in ADMIN_EMAILS
+
+
+def token_subject(token: str):
+    """
+    Extract the subject (email) of a JWT token without a database lookup.
+
+    Args:
+        token (str): The JWT token.
+
+    Returns:
+        Optional[str]: The email, or None if the token is invalid or expired.
+    """
+    try:
+        payload = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
+    except jwt.PyJWTError:
+        return None
+    return payload.get("sub")
+
+
+def is_admin_token(token: str) -> bool:
+    """
+    Check whether a JWT token was issued to an administrator, without a database lookup.
+
+    Args:
+        token (str): The JWT token.
+
+    Returns:
+        bool: True if the token is valid and its subject is an administrator.
+    """
+    return is_admin_email(token_subject(token))
+
+
+async def get_current_admin_user(current_user: Annotated[User, Depends(get_current_active_user)]):
+    """
+    Retrieve the current user and require administrator rights.
+
+    Args:
+        current_user (User): The current active user.
+
+    Returns:
+        User: The current administrator.
+
+    Raises:
+        HTTPException: If the user is not an administrator.
+    """
+    if not is_admin_email(current_user.email):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
+@protected(mongo_breaker)
+async def login(user_data, users: UserRepository):
     """
     User login function to authenticate and generate a JWT token.
 
     Args:
         user_data (UserLoginSchema): The user login data.
+        users (UserRepository): User store.
 
     Returns:
         str: The JWT token.
@@ -197,7 +318,7 @@ async def login(user_data):
     Raises:
         HTTPException: If the credentials are incorrect.
     """
-    user = await user_collection.find_one({"email": user_data.email})
+    user = await users.find_by_email(user_data.email)
     if not user or not verify_password(user_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -211,12 +332,15 @@ async def login(user_data):
     access_token = create_access_token({"sub": user["email"]})
     return access_token
 
-async def add_user(user_data: dict) -> dict:
+@protected(mongo_breaker)
+async def add_user(user_data: dict, users: UserRepository) -> dict:
     """
-    Add a new user to the database.
+    Add a new user to the database, in no tenant until an administrator assigns
+    them to their organization with `assign_tenant`.
 
     Args:
         user_data (dict): The user data.
+        users (UserRepository): User store.
 
     Returns:
         dict: The added user data.
@@ -224,22 +348,51 @@ async def add_user(user_data: dict) -> dict:
     Raises:
         HTTPException: If the email is already registered.
     """
-    user_exists = await user_collection.find_one({"email": user_data["email"]})
+    user_exists = await users.find_by_email(user_data["email"])
     if user_exists:
         raise HTTPException(status_code=400, detail="Email already registered")
     user_data["password"] = get_password_hash(user_data["password"])
-    user = await user_collection.insert_one(user_data)
-    new_user = await user_collection.find_one({"_id": user.inserted_id})
+    user_data.update(user_schema_fields(user_data))
+    # Neither taken from the request nor from the email domain, nor the default tenant
+    # holding the legacy candidates: signup doesn't verify the email, so anyone could
+    # otherwise read an organization's candidates.
+    user_data["tenant_id"] = None
+    user_data["created_at"] = utcnow()
+    new_user = await users.insert(user_data)
     return user_helper(new_user)
 
-async def retrieve_users():
+@protected(mongo_breaker)
+async def assign_tenant(email: str, tenant: Optional[str], users: UserRepository) -> Optional[dict]:
+    """
+    Moves a user to a tenant, on behalf of an administrator who vouches for them.
+
+    Args:
+        email (str): The user's email.
+        tenant (Optional[str]): Tenant id, defaults to the one mapped to the email
+            domain in `TENANT_DOMAINS`.
+        users (UserRepository): User store.
+
+    Returns:
+        Optional[dict]: The updated user data, None if no user has this email.
+
+    Raises:
+        HTTPException: 400 if no tenant is given and the email domain is not mapped to one.
+    """
+    tenant = tenant or tenant_for_email(email)
+    if not tenant:
+        raise HTTPException(status_code=400, detail="No tenant given and none is mapped to the email domain")
+    user = await users.update(email, {"tenant_id": tenant.lower()})
+    return user_helper(user) if user else None
+
+@protected(mongo_breaker, read_cache)
+async def retrieve_users(users: UserRepository):
     """
     Retrieve all users from the database.
 
+    Args:
+        users (UserRepository): User store.
+
     Returns:
         list: A list of all users.
     """
-    users = []
-    async for user in user_collection.find():
-        users.append(user_helper(user))
-    return users
\ No newline at end of file
+    return [user_helper(user) for user in await users.all()]
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import ASCENDING, IndexModel, ReplaceOne
+from .sync import TOMBSTONE_COLLECTION, TOMBSTONE_INDEXES, utcnow
+
+load_dotenv()
+
+ARCHIVE_COLLECTION = "candidate_archive"
+# Candidates not updated for this long move to the archive.
+ARCHIVE_INACTIVE_DAYS = float(os.getenv("ARCHIVE_INACTIVE_DAYS", "365"))
+# Archived candidates are purged by a TTL index this long after archival.
+ARCHIVE_RETENTION_DAYS = float(os.getenv("ARCHIVE_RETENTION_DAYS", "730"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+
+# Candidates served by default reads: neither soft deleted nor archived.
+ACTIVE = {"deleted_at": None}
+
+# Created by the archival job and, through the candidate repository, on API startup.
+ARCHIVE_INDEXES = [
+    IndexModel("archived_at", expireAfterSeconds=int(ARCHIVE_RETENTION_DAYS * 86400)),
+    IndexModel([("tenant_id", ASCENDING), ("email", ASCENDING)]),
+    IndexModel([("tenant_id", ASCENDING), ("email_lower", ASCENDING)]),
+]
+# On the hot collection, for the archival scan, which runs across tenants.
+ARCHIVAL_SCAN_INDEXES = [IndexModel("updated_at"), IndexModel("deleted_at", sparse=True)]
+
+
+def archive_filter(now: datetime, inactive_days: float = ARCHIVE_INACTIVE_DAYS) -> dict:
+    """
+    Args:
+        now (datetime): Current UTC time.
+        inactive_days (float): Days without an update after which a candidate is inactive.
+
+    Returns:
+        dict: Filter matching the candidates to move to the archive: soft deleted or inactive.
+    """
+    return {
+        "$or": [
+            {"deleted_at": {"$ne": None}},
+            {"updated_at": {"$lt": now - timedelta(days=inactive_days)}},
+        ]
+    }
+
+
+def archive_tombstone(candidate: dict, now: datetime) -> dict:
+    """
+    Args:
+        candidate (dict): Inactive candidate moved to the archive.
+        now (datetime): Time of archival.
+
+    Returns:
+        dict: The tombstone telling sync clients the candidate left the hot collection.
+    """
+    return {"candidate_id": candidate["_id"], "tenant_id": candidate.get("tenant_id"), "deleted_at": now, "reason": "archived"}
+
+
+def archive_document(candidate: dict, now: datetime) -> dict:
+    """
+    Args:
+        candidate (dict): Candidate document from the hot collection.
+        now (datetime): Time of archival.
+
+    Returns:
+        dict: The document stored in the archive collection.
+    """
+    return {
+        **candidate,
+        "archived_at": now,
+        "archive_reason": "deleted" if candidate.get("deleted_at") else "inactive",
+    }
+
+
+def create_archive_indexes(db):
+    """
+    Creates the indexes of the archive and tombstone collections and those the archival
+    scan uses.
+
+    Args:
+        db: A pymongo database.
+    """
+    db[ARCHIVE_COLLECTION].create_indexes(ARCHIVE_INDEXES)
+    db[TOMBSTONE_COLLECTION].create_indexes(TOMBSTONE_INDEXES)
+    db.candidate_collection.create_indexes(ARCHIVAL_SCAN_INDEXES)
+
+
+def archive_candidates(db, batch_size: int = ARCHIVE_BATCH_SIZE, inactive_days: float = ARCHIVE_INACTIVE_DAYS) -> dict:
+    """
+    Moves soft deleted and inactive candidates from the hot collection to the archive,
+    one batch at a time, so the hot collection and its indexes stay small.
+
+    Each batch is copied before it is deleted, and the delete re-checks the filter, so
+    a crash or a concurrent update never loses a candidate: at worst a copy is left in
+    the archive and replaced by the next run. Inactive candidates get a sync tombstone
+    along with their copy, soft deleted ones got theirs when they were deleted.
+
+    Args:
+        db: A pymongo database.
+        batch_size (int): Number of candidates moved per batch.
+        inactive_days (float): Days without an update after which a candidate is inactive.
+
+    Returns:
+        dict: Number of candidates archived.
+    """
+    create_archive_indexes(db)
+    hot, archive, tombstones = db.candidate_collection, db[ARCHIVE_COLLECTION], db[TOMBSTONE_COLLECTION]
+    archived = 0
+    last_id = None
+    while True:
+        now = utcnow()
+        query = archive_filter(now, inactive_days)
+        if last_id is not None:
+            query = {"$and": [{"_id": {"$gt": last_id}}, query]}
+        batch = list(hot.find(query).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        ids = [candidate["_id"] for candidate in batch]
+        archive.bulk_write(
+            [ReplaceOne({"_id": candidate["_id"]}, archive_document(candidate, now), upsert=True) for candidate in batch],
+            ordered=False,
+        )
+        inactive = [archive_tombstone(candidate, now) for candidate in batch if not candidate.get("deleted_at")]
+        if inactive:
+            tombstones.insert_many(inactive, ordered=False)
+        result = hot.delete_many({"$and": [{"_id": {"$in": ids}}, archive_filter(now, inactive_days)]})
+        archived += result.deleted_count
+        if result.deleted_count < len(ids):
+            # Updated since the copy was taken: they stay hot, drop their archived copy and tombstone.
+            still_hot = [candidate["_id"] for candidate in hot.find({"_id": {"$in": ids}}, {"_id": 1})]
+            archive.delete_many({"_id": {"$in": still_hot}})
+            tombstones.delete_many({"candidate_id": {"$in": still_hot}, "reason": "archived", "deleted_at": now})
+    return {"archived": archived}
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+from dotenv import load_dotenv
+from .metrics import Counter, Gauge, Histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "candidate_audit"
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+# How long a request waits for room in a full buffer before its event is dropped.
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT_SECONDS", "2"))
+AUDIT_SHUTDOWN_TIMEOUT = float(os.getenv("AUDIT_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+
+_buffers = []
+
+audit_events = Counter(
+    "audit_events_total", "Audit events by outcome (written, dropped).", ("outcome",)
+)
+audit_flush_seconds = Histogram("audit_flush_seconds", "Duration of audit batch writes.")
+audit_buffered = Gauge(
+    "audit_buffered_events",
+    "Audit events waiting to be written.",
+    callback=lambda: {(): sum(buffer.pending() for buffer in _buffers)},
+)
+
+
+class AuditBuffer:
+    """
+    Collects audit events in memory and writes them in batches off the request path.
+
+    Events are written when `batch_size` of them are waiting or `flush_interval`
+    seconds after the first one arrived, whichever comes first. The buffer holds at
+    most `max_size` events: when it is full `record` waits for the writer to catch
+    up, which slows writers down instead of growing memory, and only drops the event
+    after `enqueue_timeout`. A failed batch is retried until it is written or the
+    buffer is stopped.
+
+    Args:
+        writer (Callable[[List[dict]], Awaitable]): Writes one batch of events.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[dict]], Awaitable],
+        max_size: int = AUDIT_BUFFER_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL,
+        enqueue_timeout: float = AUDIT_ENQUEUE_TIMEOUT,
+    ):
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        _buffers.append(self)
+
+    def pending(self) -> int:
+        return (self._queue.qsize() if self._queue else 0) + len(self._batch)
+
+    def start(self):
+        """
+        Starts the background writer on the running event loop.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def record(self, event: dict) -> bool:
+        """
+        Buffers an event.
+
+        Args:
+            event (dict): The audit event.
+
+        Returns:
+            bool: False if the event was dropped because the buffer stayed full or
+                the writer is not running.
+        """
+        if self._task is None or self._task.done():
+            audit_events.inc(outcome="dropped")
+            logger.warning("Audit buffer not running, event dropped: %s", event)
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                audit_events.inc(outcome="dropped")
+                logger.warning("Audit buffer full, event dropped: %s", event)
+                return False
+        return True
+
+    async def _fill_batch(self):
+        # Waits for the first event, then takes whatever arrives until the batch is
+        # full or the flush interval is over.
+        if not self._batch:
+            self._batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    def _drain(self):
+        while len(self._batch) < self.batch_size and not self._queue.empty():
+            self._batch.append(self._queue.get_nowait())
+
+    async def _write_batch(self) -> bool:
+        started = time.monotonic()
+        try:
+            await self.writer(self._batch)
+        except Exception as exc:
+            logger.error("Failed to write %d audit events: %s", len(self._batch), exc)
+            return False
+        audit_flush_seconds.observe(time.monotonic() - started)
+        audit_events.inc(len(self._batch), outcome="written")
+        self._batch = []
+        return True
+
+    async def _run(self):
+        while True:
+            await self._fill_batch()
+            if not await self._write_batch():
+                await asyncio.sleep(self.flush_interval)
+
+    async def stop(self, timeout: float = AUDIT_SHUTDOWN_TIMEOUT):
+        """
+        Stops the writer and flushes every buffered event, giving up after `timeout` seconds.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            self._drain()
+            if not await self._write_batch():
+                await asyncio.sleep(min(self.flush_interval, max(deadline - time.monotonic(), 0)))
+        if self.pending():
+            audit_events.inc(self.pending(), outcome="dropped")
+            logger.error("Shut down with %d audit events unwritten", self.pending())
@@ -0,0 +1,61 @@
+# Celery settings, loaded with `app.config_from_object`.
+#
+# Heavy tasks (exports, duplicate detection, migrations, archival) go to their own
+# queue so a long batch job never delays the light ones. Run one worker per queue:
+#
+#     celery -A codegrapher.app.tasks worker -Q light --concurrency 8
+#     celery -A codegrapher.app.tasks worker -Q heavy --concurrency 2 --prefetch-multiplier 1
+import os
+from dotenv import load_dotenv
+from kombu import Queue
+
+load_dotenv()
+
+LIGHT_QUEUE = "light"
+HEAVY_QUEUE = "heavy"
+
+broker_url = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+result_backend = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
+result_expires = int(os.getenv("CELERY_RESULT_EXPIRES_SECONDS", str(24 * 3600)))
+result_extended = True
+
+task_serializer = "json"
+result_serializer = "json"
+accept_content = ["json"]
+timezone = "UTC"
+
+task_queues = (Queue(LIGHT_QUEUE), Queue(HEAVY_QUEUE))
+task_default_queue = LIGHT_QUEUE
+task_routes = {
+    "codegrapher.app.tasks.export_candidates": {"queue": HEAVY_QUEUE},
+    # Runs where the exports are written.
+    "codegrapher.app.tasks.purge_old_exports": {"queue": HEAVY_QUEUE},
+    "codegrapher.app.tasks.find_duplicates": {"queue": HEAVY_QUEUE},
+    "codegrapher.app.tasks.run_migrations": {"queue": HEAVY_QUEUE},
+    "codegrapher.app.tasks.archive_inactive_candidates": {"queue": HEAVY_QUEUE},
+    "codegrapher.app.tasks.recount_tenant_usage": {"queue": HEAVY_QUEUE},
+}
+
+# Acknowledge after the task ran, so a task whose worker dies is redelivered instead
+# of lost. Tasks must therefore be safe to run twice.
+task_acks_late = True
+task_reject_on_worker_lost = True
+# With late acks a worker holds each prefetched message until it is done; keep the
+# prefetch small so queued work goes to idle workers instead of waiting behind a
+# long task.
+worker_prefetch_multiplier = int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "4"))
+task_track_started = True
+task_time_limit = int(os.getenv("CELERY_TASK_TIME_LIMIT_SECONDS", "3600"))
+task_soft_time_limit = int(os.getenv("CELERY_TASK_SOFT_TIME_LIMIT_SECONDS", "3300"))
+# Redis redelivers unacknowledged messages after this; longer than any task.
+broker_transport_options = {"visibility_timeout": task_time_limit + 300}
+
+# Runs tasks inline in the caller, for development without a broker.
+task_always_eager = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() in ("1", "true", "yes")
+task_eager_propagates = True
+
+beat_schedule = {
+    "archive-inactive-candidates": {"task": "codegrapher.app.tasks.archive_inactive_candidates", "schedule": 24 * 3600},
+    "recount-tenant-usage": {"task": "codegrapher.app.tasks.recount_tenant_usage", "schedule": 24 * 3600},
+    "purge-old-exports": {"task": "codegrapher.app.tasks.purge_old_exports", "schedule": 3600},
+}
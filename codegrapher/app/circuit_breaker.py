@@ -0,0 +1,251 @@
+import contextvars
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo.errors import ConnectionFailure
+from .metrics import Counter, Gauge
+
+load_dotenv()
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "15"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", "1000"))
+STALE_MAX_AGE = float(os.getenv("STALE_MAX_AGE", "3600"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_breakers = {}
+
+breaker_calls = Counter(
+    "circuit_breaker_calls_total",
+    "Calls through a circuit breaker by outcome (success, failure, rejected).",
+    ("breaker", "outcome"),
+)
+breaker_transitions = Counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes.", ("breaker", "state")
+)
+stale_responses = Counter(
+    "circuit_breaker_stale_reads_total", "Reads served from the stale cache.", ("breaker",)
+)
+breaker_state = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state: 0 closed, 1 half open, 2 open.",
+    ("breaker",),
+    callback=lambda: {(name, ): STATE_VALUES[b.state] for name, b in _breakers.items()},
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit breaker is open.
+
+    Attributes:
+        retry_after (float): Seconds until the breaker lets a probe through.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency so requests fail fast instead of waiting on it.
+
+    After `failure_threshold` consecutive failures the breaker opens and rejects calls.
+    Once `recovery_timeout` has passed it goes half open and lets up to
+    `half_open_calls` probes through: a successful probe closes it again, a failed one
+    reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout: float = BREAKER_RECOVERY_TIMEOUT,
+        half_open_calls: int = BREAKER_HALF_OPEN_CALLS,
+        failure_exceptions: tuple = (ConnectionFailure,),
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.failure_exceptions = failure_exceptions
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        _breakers[name] = self
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            breaker_transitions.inc(breaker=self.name, state=state)
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.recovery_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """
+        Returns:
+            bool: True if a call may go through now. A True in half open state reserves a probe.
+        """
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self._transition(HALF_OPEN)
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                return False
+            self._probes += 1
+        return True
+
+    def record_success(self):
+        breaker_calls.inc(breaker=self.name, outcome="success")
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        breaker_calls.inc(breaker=self.name, outcome="failure")
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def release(self):
+        """
+        Frees a probe slot after a call that neither proved nor disproved the dependency's health.
+        """
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_rejection(self):
+        breaker_calls.inc(breaker=self.name, outcome="rejected")
+
+
+class StaleCache:
+    """
+    Bounded LRU of the last successful result of each read, served when the dependency
+    is down. Entries older than `max_age` seconds are never served.
+    """
+
+    def __init__(self, max_entries: int = STALE_CACHE_SIZE, max_age: float = STALE_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+
+    def set(self, key, value):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: (found, value, age in seconds).
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None, 0.0
+        stored_at, value = entry
+        age = time.time() - stored_at
+        if age > self.max_age:
+            del self._entries[key]
+            return False, None, 0.0
+        return True, value, age
+
+
+_stale_age: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("stale_age", default=None)
+
+
+def track_staleness() -> contextvars.Token:
+    """
+    Starts recording stale reads for the current request.
+    """
+    return _stale_age.set([])
+
+
+def stop_tracking_staleness(token: contextvars.Token):
+    _stale_age.reset(token)
+
+
+def staleness() -> Optional[float]:
+    """
+    Returns:
+        Optional[float]: Age in seconds of the oldest stale read served to the current
+            request, or None if everything was fresh.
+    """
+    ages = _stale_age.get()
+    return max(ages) if ages else None
+
+
+def _mark_stale(age: float):
+    ages = _stale_age.get()
+    if ages is not None:
+        ages.append(age)
+
+
+def protected(breaker: CircuitBreaker, cache: Optional[StaleCache] = None):
+    """
+    Decorator routing an async data access function through a circuit breaker.
+
+    With a cache the function is treated as a read: its results are remembered by
+    arguments and served, marked stale, when the breaker is open or the call fails.
+
+    Args:
+        breaker (CircuitBreaker): The breaker guarding the dependency.
+        cache (Optional[StaleCache]): Fallback cache for reads, None for writes.
+
+    Raises:
+        CircuitOpenError: If the breaker is open and there is nothing to fall back on.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items()))) if cache is not None else None
+
+            def fallback():
+                if cache is not None:
+                    found, value, age = cache.get(key)
+                    if found:
+                        stale_responses.inc(breaker=breaker.name)
+                        _mark_stale(age)
+                        return True, value
+                return False, None
+
+            if not breaker.allow():
+                breaker.record_rejection()
+                found, value = fallback()
+                if found:
+                    return value
+                raise CircuitOpenError(breaker.name, breaker.retry_after())
+            try:
+                result = await func(*args, **kwargs)
+            except breaker.failure_exceptions:
+                breaker.record_failure()
+                found, value = fallback()
+                if found:
+                    return value
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            if cache is not None:
+                cache.set(key, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+mongo_breaker = CircuitBreaker("mongo")
+read_cache = StaleCache()
@@ -0,0 +1,153 @@
+import os
+import zlib
+from typing import Optional
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+load_dotenv()
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", str(256 * 1024)))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# Content that is already compressed, or must not be buffered by a compressor.
+UNCOMPRESSIBLE_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/x-brotli",
+    "application/x-7z-compressed",
+    "application/octet-stream",
+    "text/event-stream",
+)
+
+
+class GzipCompressor:
+    def __init__(self, level: int = GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int = ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encodings() -> list:
+    """
+    Lists the content codings this process can produce, in order of preference.
+
+    Returns:
+        list: Encoding tokens as used in `Accept-Encoding`.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+COMPRESSORS = {
+    "gzip": GzipCompressor,
+    "br": BrotliCompressor,
+    "zstd": ZstdCompressor,
+}
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Picks the preferred available encoding accepted by the client.
+
+    Args:
+        accept_encoding (Optional[str]): Value of the `Accept-Encoding` request header.
+
+    Returns:
+        Optional[str]: The chosen encoding, or None to send the body uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[token] = weight
+    best = None
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+    return best[0] if best else None
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """
+    Args:
+        content_type (Optional[str]): Value of the `Content-Type` response header.
+
+    Returns:
+        bool: False for media that is already compressed or must be streamed unbuffered.
+    """
+    if not content_type:
+        return True
+    content_type = content_type.lower()
+    return not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+
+
+def get_compressor(encoding: str):
+    """
+    Args:
+        encoding (str): One of the tokens returned by `available_encodings`.
+
+    Returns:
+        A fresh streaming compressor with `compress` and `flush` methods.
+    """
+    return COMPRESSORS[encoding]()
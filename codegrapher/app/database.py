@@ -1,4 +1,6 @@
 import motor.motor_asyncio
+import pymongo
+from .tracing import MongoCommandListener
 from dotenv import load_dotenv
 import os
 import asyncio
@@ -6,11 +8,36 @@ import asyncio
 load_dotenv()
 
 MONGO_DB_URL = os.getenv("DATABASE_URL")
+# Fail fast when Mongo is unreachable instead of waiting pymongo's default 30s.
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_DB_URL)
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    MONGO_DB_URL,
+    serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+    event_listeners=[MongoCommandListener()],
+)
 
 database = client.Graphers
 
+_sync_client = None
+
+def get_sync_database():
+    """
+    Returns a blocking pymongo handle on the same database, for Celery workers
+    which run outside an event loop. The client is created on first use.
+
+    Returns:
+        pymongo.database.Database: The Graphers database.
+    """
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = pymongo.MongoClient(
+            MONGO_DB_URL,
+            serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[MongoCommandListener()],
+        )
+    return _sync_client.Graphers
+
 async def test_connection():
     try:
         collections = await database.list_collection_names()
@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import os
+import time
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", "300"))
+TIMEOUT_HEADER = "x-request-timeout"
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the time budget of the current request has been spent.
+    """
+
+
+class Deadline:
+    """
+    Time budget of a single request.
+
+    Attributes:
+        expires_at (float): Monotonic clock value at which the budget runs out.
+        explicit (bool): True if the client chose the budget through the timeout header,
+            in which case route budgets do not override it.
+        changed (asyncio.Event): Set whenever the budget is reset so the middleware
+            waiting on the request can pick up the new expiry.
+    """
+
+    def __init__(self, budget: float, explicit: bool = False):
+        self.expires_at = time.monotonic() + budget
+        self.explicit = explicit
+        self.changed = asyncio.Event()
+
+    def remaining(self) -> float:
+        """
+        Returns:
+            float: Seconds left before the deadline, never negative.
+        """
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def reset(self, budget: float):
+        """
+        Replaces the budget, counted from now. Ignored if the client set the budget explicitly.
+
+        Args:
+            budget (float): New budget in seconds.
+        """
+        if self.explicit:
+            return
+        self.expires_at = time.monotonic() + min(budget, MAX_REQUEST_TIMEOUT)
+        self.changed.set()
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """
+    Returns:
+        Optional[Deadline]: Deadline of the request being served, or None outside a request.
+    """
+    return _current_deadline.get()
+
+
+def set_deadline(deadline: Optional[Deadline]) -> contextvars.Token:
+    return _current_deadline.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token):
+    _current_deadline.reset(token)
+
+
+def max_time_ms() -> Optional[int]:
+    """
+    Remaining request budget in milliseconds, suitable for Motor's `max_time_ms` argument.
+
+    Returns:
+        Optional[int]: Milliseconds left, or None when no deadline is active.
+
+    Raises:
+        DeadlineExceeded: If the budget is already spent.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return None
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return max(int(remaining * 1000), 1)
+
+
+async def bounded(awaitable):
+    """
+    Awaits a Motor call that does not accept `max_time_ms` (writes), bounded by the request deadline.
+
+    Args:
+        awaitable: The Motor coroutine or future.
+
+    Returns:
+        The result of the awaitable.
+
+    Raises:
+        DeadlineExceeded: If the deadline expires first.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return await awaitable
+    if deadline.expired():
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("Request deadline exceeded")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def request_budget(seconds: float):
+    """
+    Builds a route dependency that sets the time budget of that route.
+
+    Usage:
+        @router.get("/slow", dependencies=[Depends(request_budget(120))])
+
+    Args:
+        seconds (float): Budget for the route in seconds.
+
+    Returns:
+        Callable: The dependency.
+    """
+    async def apply_budget():
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.reset(seconds)
+
+    return apply_budget
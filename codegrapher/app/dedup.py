@@ -0,0 +1,253 @@
+import hashlib
+from array import array
+import os
+import random
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable, List
+from dotenv import load_dotenv
+from pymongo import ASCENDING, IndexModel, ReplaceOne, UpdateOne
+from .archive import ACTIVE
+from .tenancy import DEFAULT_TENANT
+
+load_dotenv()
+
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "20"))
+DEDUP_ROWS = int(os.getenv("DEDUP_ROWS", "3"))
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))
+NUM_PERM = DEDUP_BANDS * DEDUP_ROWS
+
+# Universal hashing h(x) = (a * x + b) mod p over a Mersenne prime. The
+# coefficients are seeded so signatures stay comparable across processes.
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1_000_003)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+PROJECTION = {"fullname": 1, "phone_number": 1, "skills": 1, "tenant_id": 1}
+SIGNATURE_COLLECTION = "candidate_signatures"
+DUPLICATE_COLLECTION = "candidate_duplicates"
+
+# Created by the batch job and, through the candidate repository, on API startup.
+SIGNATURE_INDEXES = [IndexModel("candidate_id", unique=True), IndexModel("bands")]
+DUPLICATE_INDEXES = [
+    IndexModel("pair_key", unique=True),
+    IndexModel("candidate_ids"),
+    IndexModel([("tenant_id", ASCENDING), ("status", ASCENDING), ("similarity", ASCENDING)]),
+]
+
+
+def normalize_name(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[\W\d_]+", " ", name.lower()).split())
+
+
+def normalize_phone(phone: str) -> str:
+    # Country codes and trunk prefixes vary between submissions, the last ten digits don't.
+    return re.sub(r"\D", "", phone or "")[-10:]
+
+
+def normalize_skills(skills: Iterable[str]) -> List[str]:
+    return sorted({" ".join(skill.lower().split()) for skill in skills or [] if skill.strip()})
+
+
+def shingles(candidate: dict) -> set:
+    """
+    Builds the feature set of a candidate: character trigrams of the normalized name,
+    the normalized phone number and its 4-grams (to survive a mistyped digit), and the
+    normalized skills.
+
+    Args:
+        candidate (dict): Candidate document.
+
+    Returns:
+        set: The shingles.
+    """
+    features = set()
+    name = f" {normalize_name(candidate.get('fullname'))} "
+    features.update(f"n:{name[i:i + 3]}" for i in range(len(name) - 2))
+    phone = normalize_phone(candidate.get("phone_number"))
+    if phone:
+        features.add(f"p:{phone}")
+        features.update(f"p4:{phone[i:i + 4]}" for i in range(len(phone) - 3))
+    features.update(f"s:{skill}" for skill in normalize_skills(candidate.get("skills")))
+    return features
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def minhash(features: set) -> List[int]:
+    """
+    Args:
+        features (set): Shingles of a candidate.
+
+    Returns:
+        List[int]: MinHash signature of `NUM_PERM` values.
+    """
+    hashes = [_hash64(feature) for feature in features] or [0]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    """
+    Splits a signature into LSH bands. Two candidates sharing any band key are compared.
+
+    Args:
+        signature (List[int]): MinHash signature.
+
+    Returns:
+        List[str]: One key per band.
+    """
+    keys = []
+    for band in range(DEDUP_BANDS):
+        rows = signature[band * DEDUP_ROWS:(band + 1) * DEDUP_ROWS]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """
+    Returns:
+        float: Estimated Jaccard similarity of the two candidates behind the signatures.
+    """
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def signature_document(candidate: dict) -> dict:
+    """
+    Args:
+        candidate (dict): Candidate document.
+
+    Returns:
+        dict: The document stored in the signature collection for this candidate. Band
+            keys are prefixed with the tenant, so candidates of different tenants are
+            never compared.
+    """
+    tenant = candidate.get("tenant_id") or DEFAULT_TENANT
+    signature = minhash(shingles(candidate))
+    return {
+        "candidate_id": candidate["_id"],
+        "tenant_id": tenant,
+        "signature": signature,
+        "bands": [f"{tenant}/{key}" for key in band_keys(signature)],
+    }
+
+
+def pair_update(id_a, id_b, score: float, tenant: str = DEFAULT_TENANT) -> tuple:
+    """
+    Builds the upsert recording a duplicate pair. Already reviewed pairs keep their status,
+    and `checked_at` records when the pair was last found.
+
+    Returns:
+        tuple: The filter and update documents.
+    """
+    ids = sorted([id_a, id_b])
+    now = datetime.now(timezone.utc)
+    return (
+        {"pair_key": f"{ids[0]}:{ids[1]}"},
+        {
+            "$set": {"candidate_ids": ids, "tenant_id": tenant, "similarity": round(score, 3), "checked_at": now},
+            "$setOnInsert": {"status": "pending", "detected_at": now},
+        },
+    )
+
+
+def find_duplicate_pairs(signatures: Iterable[dict], threshold: float = DEDUP_THRESHOLD):
+    """
+    Finds likely duplicates among signature documents with LSH banding: only candidates
+    sharing a band bucket are compared, instead of every pair.
+
+    Args:
+        signatures (Iterable[dict]): Documents built by `signature_document`.
+        threshold (float): Minimum estimated similarity.
+
+    Yields:
+        tuple: (candidate_id, candidate_id, similarity) for each pair above the threshold.
+    """
+    by_id = {}
+    buckets = defaultdict(list)
+    for document in signatures:
+        # Packed as 64-bit integers, a signature takes 512 bytes instead of ~2.5KB as a list.
+        by_id[document["candidate_id"]] = array("Q", document["signature"])
+        for key in document["bands"]:
+            buckets[key].append(document["candidate_id"])
+
+    seen = set()
+    for ids in buckets.values():
+        if len(ids) < 2:
+            continue
+        for i, id_a in enumerate(ids):
+            for id_b in ids[i + 1:]:
+                pair = (id_a, id_b) if id_a < id_b else (id_b, id_a)
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                score = similarity(by_id[id_a], by_id[id_b])
+                if score >= threshold:
+                    yield pair[0], pair[1], score
+
+
+def create_dedup_indexes(db):
+    """
+    Creates the indexes of the signature and duplicate collections.
+
+    Args:
+        db: A pymongo database.
+    """
+    db[SIGNATURE_COLLECTION].create_indexes(SIGNATURE_INDEXES)
+    db[DUPLICATE_COLLECTION].create_indexes(DUPLICATE_INDEXES)
+
+
+def rebuild_duplicates(db, batch_size: int = 1000) -> dict:
+    """
+    Recomputes every candidate signature and records all duplicate pairs. Used by the
+    batch Celery task; inserts are handled incrementally by the API.
+
+    Pending pairs not found again, because their candidates changed or are gone, are
+    removed. Reviewed pairs are kept, and so are pairs recorded by the API during the run.
+
+    Args:
+        db: A pymongo database.
+        batch_size (int): Number of writes per `bulk_write`.
+
+    Returns:
+        dict: Number of candidates processed, duplicate pairs found and stale pairs removed.
+    """
+    create_dedup_indexes(db)
+    started = datetime.now(timezone.utc)
+    processed = 0
+    tenants = {}
+
+    def compute_and_store_signatures():
+        nonlocal processed
+        writes = []
+        for candidate in db.candidate_collection.find(ACTIVE, PROJECTION):
+            document = signature_document(candidate)
+            tenants[candidate["_id"]] = document["tenant_id"]
+            writes.append(ReplaceOne({"candidate_id": candidate["_id"]}, document, upsert=True))
+            if len(writes) == batch_size:
+                db[SIGNATURE_COLLECTION].bulk_write(writes, ordered=False)
+                writes = []
+            processed += 1
+            yield document
+        if writes:
+            db[SIGNATURE_COLLECTION].bulk_write(writes, ordered=False)
+
+    pairs = 0
+    writes = []
+    for id_a, id_b, score in find_duplicate_pairs(compute_and_store_signatures()):
+        writes.append(UpdateOne(*pair_update(id_a, id_b, score, tenants[id_a]), upsert=True))
+        pairs += 1
+        if len(writes) == batch_size:
+            db[DUPLICATE_COLLECTION].bulk_write(writes, ordered=False)
+            writes = []
+    if writes:
+        db[DUPLICATE_COLLECTION].bulk_write(writes, ordered=False)
+    stale = db[DUPLICATE_COLLECTION].delete_many({"status": "pending", "checked_at": {"$not": {"$gte": started}}})
+    return {"candidates": processed, "pairs": pairs, "removed": stale.deleted_count}
+
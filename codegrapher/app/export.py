@@ -0,0 +1,98 @@
+import csv
+import os
+import time
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from .archive import ACTIVE
+from .tenancy import tenant_filter, safe_tenant_name
+from .sync import sync_horizon, after_watermark, caught_up, decode_sync_token, encode_sync_token
+
+load_dotenv()
+
+# Directory the export task writes its CSV files to.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+REPORT_HEADERS = ["ID", "Full Name", "Email", "Address", "Education", "Phone Number", "Experience Years", "Skills"]
+
+
+def report_row(candidate: dict) -> list:
+    """
+    Args:
+        candidate (dict): Candidate document.
+
+    Returns:
+        list: The candidate's CSV report row, in `REPORT_HEADERS` order.
+    """
+    return [
+        str(candidate.get('_id', '')),
+        candidate.get('fullname', ''),
+        candidate.get('email', ''),
+        candidate.get('address', ''),
+        candidate.get('education', ''),
+        candidate.get('phone_number', ''),
+        str(candidate.get('experience_years', '')),
+        ', '.join(candidate.get('skills', []))
+    ]
+
+
+def export_candidates(db, tenant: str, since: Optional[str] = None, directory: str = EXPORT_DIR,
+                      name: Optional[str] = None) -> dict:
+    """
+    Writes the CSV report of a tenant's candidates, as `generate_csv_report` does, from
+    a worker instead of the request handling it.
+
+    Args:
+        db: A pymongo database.
+        tenant (str): Tenant whose candidates are exported.
+        since (Optional[str]): Sync token from a previous report or sync, None for a full report.
+        directory (str): Directory the file is written to.
+        name (Optional[str]): File name, defaults to one derived from the tenant.
+
+    Returns:
+        dict: Path of the file, tenant, number of rows and the token for the next delta report.
+    """
+    changes_mark, deletions_mark = decode_sync_token(since)
+    horizon = sync_horizon()
+    query = {**after_watermark("updated_at", changes_mark, horizon), **tenant_filter(tenant), **ACTIVE}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name or f"report-{safe_tenant_name(tenant)}.csv")
+    rows = 0
+    cursor = db.candidate_collection.find(query).sort(
+        [("updated_at", ASCENDING), ("_id", ASCENDING)]
+    ).batch_size(EXPORT_BATCH_SIZE)
+    with open(path, mode='w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(REPORT_HEADERS)
+        for candidate in cursor:
+            writer.writerow(report_row(candidate))
+            rows += 1
+    token = encode_sync_token(caught_up(horizon), deletions_mark)
+    return {"path": path, "tenant": tenant, "rows": rows, "token": token}
+
+
+def purge_exports(directory: str = EXPORT_DIR, max_age: float = 24 * 3600) -> int:
+    """
+    Deletes export files older than `max_age`, which nothing serves anymore.
+
+    Args:
+        directory (str): Directory the export task writes to.
+        max_age (float): Age in seconds after which a file is deleted.
+
+    Returns:
+        int: Number of files deleted.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    deleted = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(".csv") and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                # Deleted by another worker purging the same directory.
+                continue
+            deleted += 1
+    return deleted
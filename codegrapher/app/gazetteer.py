@@ -0,0 +1,161 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from .archive import ACTIVE
+from .dedup import normalize_name
+from .geo import location_document
+from .migrations import AdaptiveThrottle
+from .sync import utcnow
+
+load_dotenv()
+
+# A GeoNames city dump (e.g. cities15000.txt from https://download.geonames.org/export/dump/).
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "data/cities15000.txt")
+MAX_PLACE_WORDS = 3
+
+# Columns of the GeoNames "geoname" table.
+_NAME, _ASCII_NAME, _ALTERNATE_NAMES, _LATITUDE, _LONGITUDE, _COUNTRY, _POPULATION = 1, 2, 3, 4, 5, 8, 14
+
+# Country names people write in addresses instead of the ISO code.
+COUNTRY_ALIASES = {"uk": "GB", "england": "GB", "scotland": "GB", "wales": "GB", "usa": "US", "uae": "AE"}
+
+
+class Gazetteer:
+    """
+    In-memory index of place names to coordinates, loaded from a local GeoNames file
+    so addresses can be resolved offline, without calling a geocoding service.
+
+    Args:
+        places (Dict[str, List[dict]]): Normalized place name to the places with that name.
+    """
+
+    def __init__(self, places: Dict[str, List[dict]]):
+        self.places = places
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        """
+        Args:
+            path (str): Path of a GeoNames tab-separated file.
+
+        Returns:
+            Gazetteer: Index of every city, by name, ASCII name and alternate names.
+        """
+        places = defaultdict(list)
+        csv.field_size_limit(sys.maxsize)
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.reader(file, delimiter="\t", quoting=csv.QUOTE_NONE):
+                place = {
+                    "city": row[_NAME],
+                    "country": row[_COUNTRY],
+                    "latitude": float(row[_LATITUDE]),
+                    "longitude": float(row[_LONGITUDE]),
+                    "population": int(row[_POPULATION] or 0),
+                }
+                names = {row[_NAME], row[_ASCII_NAME], *row[_ALTERNATE_NAMES].split(",")}
+                for name in {normalize_name(name) for name in names}:
+                    if name:
+                        places[name].append(place)
+        return cls(dict(places))
+
+    def locate(self, address: str) -> Optional[dict]:
+        """
+        Finds the city an address is in.
+
+        Addresses usually end with the city and country, so comma separated parts are
+        tried from the last one, by groups of up to `MAX_PLACE_WORDS` words, longest
+        first. Among cities sharing a name, one in the country the address ends with
+        wins, then the most populous.
+
+        Args:
+            address (str): Free text address.
+
+        Returns:
+            Optional[dict]: Latitude, longitude, country and city, None if no city matched.
+        """
+        parts = [normalize_name(part) for part in (address or "").split(",")]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        countries = set()
+        if parts[-1] in COUNTRY_ALIASES or len(parts[-1]) == 2:
+            # A trailing country ("..., UK" or "..., NG") narrows the search but isn't a place.
+            countries.add(COUNTRY_ALIASES.get(parts[-1], parts[-1].upper()))
+            parts = parts[:-1]
+        for part in reversed(parts):
+            tokens = part.split()
+            for size in range(min(len(tokens), MAX_PLACE_WORDS), 0, -1):
+                for start in range(len(tokens) - size, -1, -1):
+                    matches = self.places.get(" ".join(tokens[start:start + size]))
+                    if matches:
+                        best = max(matches, key=lambda place: (place["country"] in countries, place["population"]))
+                        return {key: best[key] for key in ("latitude", "longitude", "country", "city")}
+        return None
+
+
+def backfill_locations(db, gazetteer: Gazetteer, sleep: Callable[[float], None] = time.sleep) -> dict:
+    """
+    Sets the location of candidates that have an address but no location, in
+    `_id`-range batches sized by `AdaptiveThrottle`. Candidates whose address matches
+    no city are marked with `geocoded_at` so later runs skip them.
+
+    `updated_at` is left alone: it is the archive's inactivity clock, and a backfill
+    isn't activity. Sync clients therefore only get a backfilled location with the
+    candidate's next update or a full sync.
+
+    Args:
+        db: A pymongo database.
+        gazetteer (Gazetteer): The place index.
+        sleep (Callable[[float], None]): Used to pause between batches.
+
+    Returns:
+        dict: Number of candidates located and left unresolved.
+    """
+    collection = db.candidate_collection
+    throttle = AdaptiveThrottle()
+    located = unresolved = 0
+    last_id = None
+    pending = {**ACTIVE, "location": None, "geocoded_at": None, "address": {"$nin": [None, ""]}}
+    while True:
+        query = pending if last_id is None else {"$and": [{"_id": {"$gt": last_id}}, pending]}
+        started = time.monotonic()
+        batch = list(collection.find(query, {"address": 1}).sort("_id", 1).limit(throttle.batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        now = utcnow()
+        writes = []
+        for candidate in batch:
+            location = gazetteer.locate(candidate["address"])
+            fields = {"geocoded_at": now}
+            if location:
+                fields["location"] = location_document(location)
+                located += 1
+            else:
+                unresolved += 1
+            # Re-checked so a location set through the API meanwhile is kept.
+            writes.append(UpdateOne({"_id": candidate["_id"], "location": None}, {"$set": fields}))
+        collection.bulk_write(writes, ordered=False)
+        sleep(throttle.record(time.monotonic() - started))
+    return {"located": located, "unresolved": unresolved}
+
+
+def main(argv: Optional[List[str]] = None):
+    from .database import get_sync_database
+
+    parser = argparse.ArgumentParser(description="Backfill candidate locations from their address.")
+    parser.add_argument("--gazetteer", default=GAZETTEER_PATH, help="GeoNames cities file")
+    args = parser.parse_args(argv)
+    result = backfill_locations(get_sync_database(), Gazetteer.load(args.gazetteer))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
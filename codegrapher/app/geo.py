@@ -0,0 +1,156 @@
+import math
+from typing import Optional, Tuple
+
+EARTH_RADIUS_KM = 6378.1
+MAX_RADIUS_KM = 20000
+
+# Stored under "location": {"city", "country", "point"}, with the point as GeoJSON so
+# it can carry a 2dsphere index.
+POINT_FIELD = "location.point"
+
+Point = Tuple[float, float]
+Box = Tuple[float, float, float, float]
+
+
+def location_document(location: Optional[dict]) -> Optional[dict]:
+    """
+    Converts a location as accepted by the API into its stored form.
+
+    Args:
+        location (Optional[dict]): Latitude, longitude, country and city.
+
+    Returns:
+        Optional[dict]: The stored location, None if there is none.
+    """
+    if not location:
+        return None
+    return {
+        "city": location.get("city"),
+        "country": location["country"].upper() if location.get("country") else None,
+        "point": {"type": "Point", "coordinates": [location["longitude"], location["latitude"]]},
+    }
+
+
+def location_helper(location: Optional[dict]) -> Optional[dict]:
+    """
+    Args:
+        location (Optional[dict]): Stored location.
+
+    Returns:
+        Optional[dict]: The location as returned by the API.
+    """
+    if not location or not location.get("point"):
+        return None
+    longitude, latitude = location["point"]["coordinates"]
+    return {"latitude": latitude, "longitude": longitude, "country": location.get("country"), "city": location.get("city")}
+
+
+def _floats(value: str, count: int) -> tuple:
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != count:
+        raise ValueError(f"expected {count} comma separated numbers")
+    return tuple(parts)
+
+
+def parse_point(value: str) -> Point:
+    """
+    Args:
+        value (str): "latitude,longitude".
+
+    Returns:
+        Point: (latitude, longitude).
+
+    Raises:
+        ValueError: If the value is malformed or out of range.
+    """
+    latitude, longitude = _floats(value, 2)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("coordinates out of range")
+    return latitude, longitude
+
+
+def parse_box(value: str) -> Box:
+    """
+    Args:
+        value (str): "min_longitude,min_latitude,max_longitude,max_latitude", the GeoJSON bbox order.
+
+    Returns:
+        Box: The four bounds.
+
+    Raises:
+        ValueError: If the value is malformed, out of range, or crosses the antimeridian.
+    """
+    min_lon, min_lat, max_lon, max_lat = _floats(value, 4)
+    if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError("invalid bounding box")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def geo_filter(near: Optional[Point] = None, radius_km: float = 50, within: Optional[Box] = None) -> dict:
+    """
+    Builds the filter matching candidates within `radius_km` of a point and/or inside
+    a bounding box. Both use `$geoWithin`, which the 2dsphere index serves and which,
+    unlike `$near`, combines with other filters, pagination and `$unionWith`.
+
+    Args:
+        near (Optional[Point]): Center of the search.
+        radius_km (float): Search radius around `near` in kilometers.
+        within (Optional[Box]): Bounding box.
+
+    Returns:
+        dict: The Mongo filter, empty if neither is given.
+    """
+    clauses = []
+    if near is not None:
+        latitude, longitude = near
+        clauses.append({POINT_FIELD: {"$geoWithin": {"$centerSphere": [[longitude, latitude], radius_km / EARTH_RADIUS_KM]}}})
+    if within is not None:
+        min_lon, min_lat, max_lon, max_lat = within
+        ring = [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+        clauses.append({POINT_FIELD: {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}})
+    if len(clauses) == 2:
+        return {"$and": clauses}
+    return clauses[0] if clauses else {}
+
+
+def distance_km(a: Point, b: Point) -> float:
+    """
+    Args:
+        a (Point): (latitude, longitude).
+        b (Point): (latitude, longitude).
+
+    Returns:
+        float: Great-circle distance between the points, on the sphere `$centerSphere` uses.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def geo_matches(location: Optional[dict], near: Optional[Point] = None, radius_km: float = 50,
+                within: Optional[Box] = None) -> bool:
+    """
+    Evaluates the filter built by `geo_filter` on one stored location, for stores
+    queried without Mongo. Box edges are taken along parallels rather than geodesics,
+    which only differs from Mongo for boxes spanning many degrees.
+
+    Args:
+        location (Optional[dict]): Stored location.
+        near (Optional[Point]): Center of the search.
+        radius_km (float): Search radius around `near` in kilometers.
+        within (Optional[Box]): Bounding box.
+
+    Returns:
+        bool: True if the location satisfies both filters, or neither is given.
+    """
+    if near is None and within is None:
+        return True
+    if not location or not location.get("point"):
+        return False
+    longitude, latitude = location["point"]["coordinates"]
+    if near is not None and distance_km(near, (latitude, longitude)) > radius_km:
+        return False
+    if within is not None:
+        min_lon, min_lat, max_lon, max_lat = within
+        return min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat
+    return True
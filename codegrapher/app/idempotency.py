@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .circuit_breaker import protected, mongo_breaker
+from .database import database
+from .deadline import MAX_REQUEST_TIMEOUT
+from .sync import utcnow
+
+load_dotenv()
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+# How long a request owns its key. A retry arriving after that takes the key over, as
+# the owner must have crashed: no request runs longer than `MAX_REQUEST_TIMEOUT`.
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", str(MAX_REQUEST_TIMEOUT)))
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+# Routes whose effects must not be repeated when a client retries.
+IDEMPOTENT_ROUTES = {("POST", "/"), ("POST", "/candidate/")}
+
+IN_PROGRESS, COMPLETED = "in_progress", "completed"
+
+idempotency_collection = database.get_collection("idempotency_keys")
+
+
+class IdempotencyConflict(Exception):
+    """
+    Raised when an idempotency key cannot be honoured.
+
+    Attributes:
+        status_code (int): 422 if the key was used for a different request, 409 if the
+            original request is still running after the wait.
+    """
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def create_idempotency_indexes():
+    """
+    Creates the TTL index expiring stored responses. Safe to call on every startup.
+    """
+    await idempotency_collection.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL)
+
+
+def fingerprint(method: str, path: str, body: bytes) -> str:
+    """
+    Returns:
+        str: Digest identifying the request a key was first used with.
+    """
+    return hashlib.sha256(method.encode() + b" " + path.encode() + b"\n" + body).hexdigest()
+
+
+def scoped_key(method: str, path: str, key: str, subject: Optional[str]) -> str:
+    """
+    Scopes a client key by route and user, so two users can never replay each other's responses.
+    """
+    return f"{method} {path} {subject or '-'} {key}"
+
+
+def lease_expired(record: dict) -> bool:
+    """
+    Returns:
+        bool: True if the record is in progress but its owner's lease has run out.
+            Records written before leases existed have none and count as expired.
+    """
+    locked_until = record.get("locked_until")
+    return record["status"] == IN_PROGRESS and (locked_until is None or locked_until <= utcnow())
+
+
+@protected(mongo_breaker)
+async def claim(key: str, request_fingerprint: str) -> Optional[dict]:
+    """
+    Claims an idempotency key for a new request, or takes over one whose owner's
+    lease ran out before it stored a response.
+
+    Args:
+        key (str): The scoped key.
+        request_fingerprint (str): Fingerprint of the request.
+
+    Returns:
+        Optional[dict]: None if the caller now owns the key and must run the request,
+            otherwise the existing record.
+    """
+    while True:
+        now = utcnow()
+        locked_until = now + timedelta(seconds=IDEMPOTENCY_LEASE)
+        try:
+            await idempotency_collection.insert_one({
+                "_id": key,
+                "status": IN_PROGRESS,
+                "fingerprint": request_fingerprint,
+                "created_at": datetime.now(timezone.utc),
+                "locked_until": locked_until,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        taken = await idempotency_collection.find_one_and_update(
+            {
+                "_id": key,
+                "status": IN_PROGRESS,
+                "fingerprint": request_fingerprint,
+                "locked_until": {"$not": {"$gt": now}},
+            },
+            {"$set": {"locked_until": locked_until}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is not None:
+            return None
+        record = await idempotency_collection.find_one({"_id": key})
+        if record is not None:
+            return record
+        # Expired or released between the insert and the read: try again.
+
+
+@protected(mongo_breaker)
+async def wait_for_completion(key: str, timeout: float = IDEMPOTENCY_WAIT) -> Optional[dict]:
+    """
+    Waits for the request owning a key to store its response.
+
+    Args:
+        key (str): The scoped key.
+        timeout (float): Maximum wait in seconds.
+
+    Returns:
+        Optional[dict]: The completed record, or None if the owner gave up (failed), its
+            lease ran out or it is still running after `timeout`.
+    """
+    delay = 0.02
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        record = await idempotency_collection.find_one({"_id": key})
+        if record is None or record["status"] == COMPLETED:
+            return record
+        if lease_expired(record):
+            return None
+    return None
+
+
+@protected(mongo_breaker)
+async def complete(key: str, status: int, headers: list, body: bytes):
+    """
+    Stores the response of the request owning a key, for replay to retries.
+    """
+    await idempotency_collection.update_one(
+        {"_id": key},
+        {"$set": {"status": COMPLETED, "response": {"status": status, "headers": headers, "body": body}}},
+    )
+
+
+@protected(mongo_breaker)
+async def release(key: str):
+    """
+    Forgets a key whose request failed, so that a retry runs it again.
+    """
+    await idempotency_collection.delete_one({"_id": key, "status": IN_PROGRESS})
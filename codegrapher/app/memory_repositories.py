@@ -0,0 +1,373 @@
+import copy
+import itertools
+import re
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from bson.objectid import ObjectId
+from .dedup import PROJECTION, normalize_skills, pair_update
+from .geo import Box, Point, geo_matches
+from .repositories import (
+    SEARCH_FIELDS,
+    CandidateRepository,
+    UserRepository,
+    get_candidate_repository,
+    get_user_repository,
+)
+from .sync import Watermark, utcnow, watermark_key
+from .tenancy import DEFAULT_TENANT
+
+
+def _tenant(document: dict) -> str:
+    # Documents written before tenancy belong to the default tenant, as in `tenant_filter`.
+    return document.get("tenant_id") or DEFAULT_TENANT
+
+
+def _email_key(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def _is_active(document: dict) -> bool:
+    return document.get("deleted_at") is None
+
+
+class _Collection:
+    """
+    Documents by `_id` with the secondary indexes of the Mongo collection they stand
+    for. Only active documents are indexed, as every read filters on `ACTIVE`,
+    unless `only_active` is false.
+    """
+
+    def __init__(self, only_active: bool = True):
+        self.indexed = _is_active if only_active else (lambda document: True)
+        self.documents: Dict[ObjectId, dict] = {}
+        self.positions: Dict[ObjectId, int] = {}
+        self.by_tenant: Dict[str, Dict[ObjectId, None]] = defaultdict(dict)
+        self.by_email: Dict[Tuple[str, str], Set[ObjectId]] = defaultdict(set)
+        self.by_skill: Dict[Tuple[str, str], Set[ObjectId]] = defaultdict(set)
+        self._timelines: Dict[str, Tuple[List[tuple], List[ObjectId]]] = {}
+        self._sequence = itertools.count()
+
+    def _index(self, document: dict):
+        _id, tenant = document["_id"], _tenant(document)
+        self.by_tenant[tenant][_id] = None
+        if document.get("email"):
+            self.by_email[(tenant, _email_key(document.get("email_lower") or document["email"]))].add(_id)
+        for skill in document.get("skills_canonical") or ():
+            self.by_skill[(tenant, skill)].add(_id)
+
+    def _unindex(self, document: dict):
+        _id, tenant = document["_id"], _tenant(document)
+        self.by_tenant[tenant].pop(_id, None)
+        keys = [(self.by_email, (tenant, _email_key(document.get("email_lower") or document.get("email"))))]
+        keys += [(self.by_skill, (tenant, skill)) for skill in document.get("skills_canonical") or ()]
+        for index, key in keys:
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(_id)
+                if not ids:
+                    del index[key]
+
+    def put(self, document: dict):
+        _id = document["_id"]
+        previous = self.documents.get(_id)
+        if previous is not None:
+            self._timelines.pop(_tenant(previous), None)
+            if self.indexed(previous):
+                self._unindex(previous)
+        self.positions.setdefault(_id, next(self._sequence))
+        self.documents[_id] = document
+        self._timelines.pop(_tenant(document), None)
+        if self.indexed(document):
+            self._index(document)
+
+    def remove(self, _id: ObjectId) -> Optional[dict]:
+        document = self.documents.pop(_id, None)
+        if document is not None:
+            self.positions.pop(_id, None)
+            self._timelines.pop(_tenant(document), None)
+            if self.indexed(document):
+                self._unindex(document)
+        return document
+
+    def get(self, _id: ObjectId, tenant: str) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: The active document of the tenant with this id.
+        """
+        if _id in self.by_tenant.get(tenant, ()):
+            return self.documents[_id]
+        return None
+
+    def ids(self, tenant: str, skills: Optional[List[str]] = None) -> Iterable[ObjectId]:
+        """
+        Returns:
+            Iterable[ObjectId]: Active documents of the tenant having all the skills,
+                in insertion order like a Mongo collection scan.
+        """
+        in_tenant = self.by_tenant.get(tenant, {})
+        if not skills:
+            return in_tenant
+        sets = sorted((self.by_skill.get((tenant, skill), set()) for skill in skills), key=len)
+        if len(sets[0]) * 8 < len(in_tenant):
+            # Rare skill: sorting its few candidates beats walking the tenant.
+            return sorted(set.intersection(*sets), key=self.positions.__getitem__)
+        # Common skill: walk the tenant in order, the caller stops once its page is full.
+        return (_id for _id in in_tenant if all(_id in ids for ids in sets))
+
+    def timeline(self, tenant: str, field: str) -> Tuple[List[tuple], List[ObjectId]]:
+        """
+        Returns:
+            Tuple[List[tuple], List[ObjectId]]: Sort keys and ids of the tenant's active
+                documents in (`field`, _id) order, rebuilt after a write to the tenant.
+        """
+        if tenant not in self._timelines:
+            entries = sorted(
+                (watermark_key((self.documents[_id].get(field), _id)), _id) for _id in self.by_tenant.get(tenant, {})
+            )
+            self._timelines[tenant] = ([key for key, _ in entries], [_id for _, _id in entries])
+        return self._timelines[tenant]
+
+
+def _after(timeline: Tuple[List[tuple], List[ObjectId]], after: Watermark, horizon: datetime) -> Iterator[ObjectId]:
+    keys, ids = timeline
+    for position in range(bisect_right(keys, watermark_key(after)), len(keys)):
+        has_ts, ts = keys[position][:2]
+        if has_ts and ts > horizon:
+            return
+        yield ids[position]
+
+
+class InMemoryCandidateRepository(CandidateRepository):
+    """
+    Candidates kept in process memory, for tests and benchmarks that should not need
+    Mongo. Lookups by id, email, tenant and skill go through dict indexes, and sync
+    reads through per tenant timelines sorted on first use after a write, so the
+    cost measured is that of the layers above rather than of scans.
+
+    Semantics follow `MotorCandidateRepository`; search uses Python regular
+    expressions and the bounding box test is planar, see `geo_matches`.
+    """
+
+    def __init__(self):
+        self.hot = _Collection()
+        self.archived = _Collection()
+        self.tombstones = _Collection(only_active=False)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.signatures: Dict[ObjectId, dict] = {}
+        self.by_band: Dict[str, Set[ObjectId]] = defaultdict(set)
+        self.duplicates: Dict[str, dict] = {}
+
+    async def create_indexes(self):
+        # `_Collection` maintains its indexes on every write.
+        pass
+
+    def load(self, candidates: Iterable[dict], archived: bool = False):
+        """
+        Stores documents as they are, without the checks of the API, to seed a test or
+        benchmark. Active candidates are counted against their tenant.
+
+        Args:
+            candidates (Iterable[dict]): Stored candidate documents; missing ids are generated.
+            archived (bool): Whether they go to the archive instead of the hot collection.
+        """
+        collection = self.archived if archived else self.hot
+        for candidate in candidates:
+            candidate = copy.deepcopy(candidate)
+            candidate.setdefault("_id", ObjectId())
+            if archived:
+                candidate.setdefault("archived_at", utcnow())
+            collection.put(candidate)
+            if _is_active(candidate):
+                self.counts[_tenant(candidate)] += 1
+
+    async def get(self, _id: ObjectId, tenant: str, include_archived: bool = False) -> Optional[dict]:
+        candidate = self.hot.get(_id, tenant)
+        if candidate is None and include_archived:
+            candidate = self.archived.get(_id, tenant)
+        return dict(candidate) if candidate else None
+
+    async def find_by_email(self, tenant: str, email: str) -> Optional[dict]:
+        for collection in (self.hot, self.archived):
+            ids = collection.by_email.get((tenant, _email_key(email)))
+            if ids:
+                return dict(collection.documents[next(iter(ids))])
+        return None
+
+    async def query(
+        self,
+        tenant: str,
+        page: int = 1,
+        limit: int = 10,
+        search: Optional[str] = None,
+        include_archived: bool = False,
+        skills: Optional[Tuple[str, ...]] = None,
+        min_experience: Optional[float] = None,
+        near: Optional[Point] = None,
+        radius_km: float = 50,
+        within: Optional[Box] = None,
+    ) -> List[dict]:
+        pattern = re.compile(search, re.IGNORECASE) if search else None
+        skills = normalize_skills(skills) if skills else None
+
+        def matches(candidate: dict) -> bool:
+            if pattern is not None and not any(
+                pattern.search(value)
+                for field in SEARCH_FIELDS
+                for value in (candidate.get(field) if isinstance(candidate.get(field), list) else [candidate.get(field)])
+                if isinstance(value, str)
+            ):
+                return False
+            if min_experience is not None:
+                experience = candidate.get("experience_years")
+                if experience is None or experience < min_experience:
+                    return False
+            return geo_matches(candidate.get("location"), near, radius_km, within)
+
+        collections = (self.hot, self.archived) if include_archived else (self.hot,)
+        found = (
+            collection.documents[_id]
+            for collection in collections
+            for _id in collection.ids(tenant, skills)
+        )
+        skip = (page - 1) * limit
+        return [dict(candidate) for candidate in itertools.islice(filter(matches, found), skip, skip + limit)]
+
+    async def insert(self, candidate: dict) -> dict:
+        candidate = copy.deepcopy(candidate)
+        candidate.setdefault("_id", ObjectId())
+        self.hot.put(candidate)
+        return dict(candidate)
+
+    def _restore(self, _id: ObjectId, tenant: str) -> bool:
+        archived = self.archived.get(_id, tenant)
+        if archived is None:
+            return False
+        self.archived.remove(_id)
+        archived.pop("archived_at", None)
+        archived.pop("archive_reason", None)
+        self.hot.put(archived)
+        return True
+
+    async def update(self, _id: ObjectId, tenant: str, fields: dict) -> Optional[dict]:
+        if self.hot.get(_id, tenant) is None and not self._restore(_id, tenant):
+            return None
+        candidate = {**self.hot.documents[_id], **copy.deepcopy(fields)}
+        self.hot.put(candidate)
+        return dict(candidate)
+
+    async def soft_delete(self, _id: ObjectId, tenant: str) -> bool:
+        if self.hot.get(_id, tenant) is None and not self._restore(_id, tenant):
+            return False
+        self.hot.put({**self.hot.documents[_id], "deleted_at": utcnow()})
+        self.tombstones.put({"_id": ObjectId(), "candidate_id": _id, "tenant_id": tenant, "deleted_at": utcnow()})
+        return True
+
+    async def changed(self, tenant: str, after: Watermark, horizon, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        ids = _after(self.hot.timeline(tenant, "updated_at"), after, horizon)
+        for _id in itertools.islice(ids, limit):
+            yield dict(self.hot.documents[_id])
+
+    async def deleted(self, tenant: str, after: Watermark, horizon, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        ids = _after(self.tombstones.timeline(tenant, "deleted_at"), after, horizon)
+        for _id in itertools.islice(ids, limit):
+            yield dict(self.tombstones.documents[_id])
+
+    async def reserve(self, tenant: str, quota: int) -> bool:
+        if quota and self.counts[tenant] >= quota:
+            return False
+        self.counts[tenant] += 1
+        return True
+
+    async def release(self, tenant: str):
+        if self.counts[tenant] > 0:
+            self.counts[tenant] -= 1
+
+    async def usage(self, tenant: str) -> int:
+        return self.counts.get(tenant, 0)
+
+    async def dedup_fields(self, _id: ObjectId, tenant: str) -> Optional[dict]:
+        candidate = self.hot.get(_id, tenant)
+        if candidate is None:
+            return None
+        return {"_id": _id, **{field: candidate[field] for field in PROJECTION if field in candidate}}
+
+    async def similar_signatures(self, signature: dict) -> AsyncIterator[dict]:
+        ids = set().union(*(self.by_band.get(band, ()) for band in signature["bands"]))
+        ids.discard(signature["candidate_id"])
+        for _id in sorted(ids):
+            yield dict(self.signatures[_id])
+
+    def _drop_signature(self, _id: ObjectId):
+        previous = self.signatures.pop(_id, None)
+        for band in previous["bands"] if previous else ():
+            self.by_band[band].discard(_id)
+            if not self.by_band[band]:
+                del self.by_band[band]
+
+    async def save_signature(self, signature: dict):
+        self._drop_signature(signature["candidate_id"])
+        self.signatures[signature["candidate_id"]] = copy.deepcopy(signature)
+        for band in signature["bands"]:
+            self.by_band[band].add(signature["candidate_id"])
+
+    async def record_duplicate(self, id_a: ObjectId, id_b: ObjectId, score: float, tenant: str):
+        query, update = pair_update(id_a, id_b, score, tenant)
+        pair = self.duplicates.setdefault(query["pair_key"], {"_id": ObjectId(), **query, **update["$setOnInsert"]})
+        pair.update(update["$set"])
+
+    async def remove_signature(self, _id: ObjectId, tenant: str):
+        if _id in self.signatures and self.signatures[_id]["tenant_id"] == tenant:
+            self._drop_signature(_id)
+        for key, pair in list(self.duplicates.items()):
+            if _id in pair["candidate_ids"] and pair["tenant_id"] == tenant and pair["status"] == "pending":
+                del self.duplicates[key]
+
+
+class InMemoryUserRepository(UserRepository):
+    """
+    Users kept in process memory, indexed by email.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, dict] = {}
+
+    async def create_indexes(self):
+        pass
+
+    async def find_by_email(self, email: str) -> Optional[dict]:
+        user = self.users.get(email)
+        return dict(user) if user else None
+
+    async def insert(self, user: dict) -> dict:
+        user = copy.deepcopy(user)
+        user.setdefault("_id", ObjectId())
+        self.users[user["email"]] = user
+        return dict(user)
+
+    async def update(self, email: str, fields: dict) -> Optional[dict]:
+        if email not in self.users:
+            return None
+        self.users[email] = {**self.users[email], **copy.deepcopy(fields)}
+        return dict(self.users[email])
+
+    async def all(self) -> List[dict]:
+        return [dict(user) for user in self.users.values()]
+
+
+def use_in_memory_repositories(app) -> Tuple[InMemoryCandidateRepository, InMemoryUserRepository]:
+    """
+    Makes a FastAPI application store candidates and users in memory, until its
+    `dependency_overrides` are cleared.
+
+    Args:
+        app (FastAPI): The application.
+
+    Returns:
+        Tuple[InMemoryCandidateRepository, InMemoryUserRepository]: The repositories now in use.
+    """
+    candidates, users = InMemoryCandidateRepository(), InMemoryUserRepository()
+    app.dependency_overrides[get_candidate_repository] = lambda: candidates
+    app.dependency_overrides[get_user_repository] = lambda: users
+    return candidates, users
@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from .sync import utcnow
+from .api.candidate import candidate_schema_fields
+from .api.users import user_schema_fields
+from .tenancy import DEFAULT_TENANT
+
+load_dotenv()
+
+MIGRATION_COLLECTION = "migrations"
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_MIN_BATCH_SIZE = int(os.getenv("MIGRATION_MIN_BATCH_SIZE", "50"))
+MIGRATION_MAX_BATCH_SIZE = int(os.getenv("MIGRATION_MAX_BATCH_SIZE", "5000"))
+# Batches slower than this are taken as a sign Mongo is under load.
+MIGRATION_TARGET_LATENCY_MS = float(os.getenv("MIGRATION_TARGET_LATENCY_MS", "200"))
+# Fraction of wall time a runner spends on batches, the rest it sleeps.
+MIGRATION_DUTY_CYCLE = float(os.getenv("MIGRATION_DUTY_CYCLE", "0.5"))
+MIGRATION_LEASE_SECONDS = float(os.getenv("MIGRATION_LEASE_SECONDS", "120"))
+
+PENDING, RUNNING, COMPLETED, FAILED = "pending", "running", "completed", "failed"
+
+
+class Migration(ABC):
+    """
+    A versioned backfill bringing the documents of one collection to `schema_version`.
+
+    Subclasses set the class attributes and implement `transform`. Documents are
+    selected by their `schema_version` field, so documents already written in the new
+    shape by the API are skipped, and a document is never transformed twice.
+    """
+
+    version: int
+    name: str
+    collection: str
+    schema_version: int
+    projection: Optional[dict] = None
+
+    def pending_filter(self) -> dict:
+        # $not also matches documents without a schema_version at all.
+        return {"schema_version": {"$not": {"$gte": self.schema_version}}}
+
+    @abstractmethod
+    def transform(self, document: dict) -> dict:
+        """
+        Args:
+            document (dict): A document in an older shape, restricted to `projection`.
+
+        Returns:
+            dict: The fields to `$set` on it, including `schema_version`.
+        """
+
+
+def _generation_time(document: dict):
+    return document["_id"].generation_time.replace(tzinfo=None)
+
+
+class CandidateNormalizedFields(Migration):
+    """
+    Adds the lowercased email, canonical skills and created/updated timestamps to
+    candidates written before they existed. Timestamps are taken from the ObjectId.
+    """
+
+    version = 1
+    name = "candidate_normalized_fields"
+    collection = "candidate_collection"
+    schema_version = 1
+    projection = {"email": 1, "skills": 1, "created_at": 1, "updated_at": 1}
+
+    def transform(self, document: dict) -> dict:
+        created_at = document.get("created_at") or _generation_time(document)
+        return {
+            **candidate_schema_fields(document),
+            "created_at": created_at,
+            "updated_at": document.get("updated_at") or created_at,
+            "schema_version": self.schema_version,
+        }
+
+
+class UserNormalizedFields(Migration):
+    """
+    Adds the lowercased email and creation timestamp to users written before they existed.
+    """
+
+    version = 2
+    name = "user_normalized_fields"
+    collection = "users_collection"
+    schema_version = 1
+    projection = {"email": 1, "created_at": 1}
+
+    def transform(self, document: dict) -> dict:
+        return {
+            **user_schema_fields(document),
+            "created_at": document.get("created_at") or _generation_time(document),
+            "schema_version": self.schema_version,
+        }
+
+
+class CandidateTenant(Migration):
+    """
+    Assigns candidates created before tenancy to the default tenant.
+    """
+
+    version = 3
+    name = "candidate_tenant"
+    collection = "candidate_collection"
+    schema_version = 2
+    projection = {"tenant_id": 1}
+
+    def transform(self, document: dict) -> dict:
+        return {"tenant_id": document.get("tenant_id") or DEFAULT_TENANT, "schema_version": self.schema_version}
+
+
+class UserTenant(Migration):
+    """
+    Assigns users created before tenancy to the default tenant. Their email was never
+    verified, so an administrator moves them to their organization's tenant.
+    """
+
+    version = 4
+    name = "user_tenant"
+    collection = "users_collection"
+    schema_version = 2
+    projection = {"tenant_id": 1}
+
+    def transform(self, document: dict) -> dict:
+        return {
+            "tenant_id": document.get("tenant_id") or DEFAULT_TENANT,
+            "schema_version": self.schema_version,
+        }
+
+
+MIGRATIONS: List[Migration] = [CandidateNormalizedFields(), UserNormalizedFields(), CandidateTenant(), UserTenant()]
+
+
+class AdaptiveThrottle:
+    """
+    Sizes migration batches from the measured latency of the previous ones.
+
+    The batch size grows additively while batches finish under the target latency and is
+    halved as soon as one does not, so the backfill backs off quickly when Mongo slows
+    down. Between batches the runner sleeps so it only uses `duty_cycle` of wall time.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = MIGRATION_BATCH_SIZE,
+        target_latency: float = MIGRATION_TARGET_LATENCY_MS / 1000,
+        duty_cycle: float = MIGRATION_DUTY_CYCLE,
+        min_batch_size: int = MIGRATION_MIN_BATCH_SIZE,
+        max_batch_size: int = MIGRATION_MAX_BATCH_SIZE,
+    ):
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.batch_size = min(max(batch_size, min_batch_size), max_batch_size)
+        self.target_latency = target_latency
+        self.duty_cycle = min(max(duty_cycle, 0.01), 1.0)
+
+    def record(self, latency: float) -> float:
+        """
+        Adjusts the batch size after a batch.
+
+        Args:
+            latency (float): Seconds the batch took.
+
+        Returns:
+            float: Seconds to pause before the next batch.
+        """
+        if latency > self.target_latency:
+            self.batch_size = max(self.batch_size // 2, self.min_batch_size)
+        else:
+            self.batch_size = min(self.batch_size + self.min_batch_size, self.max_batch_size)
+        return latency * (1 - self.duty_cycle) / self.duty_cycle
+
+
+def migration_progress(migration: Migration, record: Optional[dict]) -> dict:
+    """
+    Formats the progress of a migration.
+
+    Args:
+        migration (Migration): The registered migration.
+        record (Optional[dict]): Its document in the migrations collection, None if it never ran.
+
+    Returns:
+        dict: Status, documents migrated, estimated total and percentage.
+    """
+    record = record or {}
+    status = record.get("status", PENDING)
+    processed = record.get("processed", 0)
+    total = record.get("total", 0)
+    if status == COMPLETED:
+        percent = 100.0
+    else:
+        percent = round(min(processed / total * 100, 100.0), 1) if total else 0.0
+    return {
+        "version": migration.version,
+        "name": migration.name,
+        "collection": migration.collection,
+        "status": status,
+        "processed": processed,
+        "total": total,
+        "percent": percent,
+        "batch_size": record.get("batch_size"),
+        "latency_ms": record.get("latency_ms"),
+        "last_id": str(record["last_id"]) if record.get("last_id") else None,
+        "error": record.get("error"),
+        "started_at": record.get("started_at"),
+        "updated_at": record.get("updated_at"),
+        "completed_at": record.get("completed_at"),
+    }
+
+
+class MigrationRunner:
+    """
+    Applies registered migrations in version order, in `_id`-range batches.
+
+    Progress is checkpointed after every batch in the migrations collection, so an
+    interrupted run resumes after the last migrated `_id`. A lease on each migration
+    keeps concurrent runners (e.g. two Celery workers) from working on the same one.
+
+    Args:
+        db: A pymongo database.
+        migrations (List[Migration]): Migrations to apply.
+        sleep (Callable[[float], None]): Used to pause between batches.
+    """
+
+    def __init__(self, db, migrations: List[Migration] = MIGRATIONS, sleep: Callable[[float], None] = time.sleep):
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.sleep = sleep
+        self.owner = uuid.uuid4().hex
+        self.records = db[MIGRATION_COLLECTION]
+
+    def status(self) -> List[dict]:
+        records = {record["_id"]: record for record in self.records.find()}
+        return [migration_progress(migration, records.get(migration.version)) for migration in self.migrations]
+
+    def run(self) -> List[dict]:
+        """
+        Applies every migration that is not completed yet. Stops at the first one held
+        by another runner, as later versions may depend on it.
+
+        Returns:
+            List[dict]: Progress of every migration.
+        """
+        for migration in self.migrations:
+            if not self.run_migration(migration):
+                break
+        return self.status()
+
+    def _claim(self, migration: Migration, total: int) -> Optional[dict]:
+        now = utcnow()
+        try:
+            return self.records.find_one_and_update(
+                {
+                    "_id": migration.version,
+                    "status": {"$ne": COMPLETED},
+                    "$or": [{"lease_owner": self.owner}, {"lease_until": None}, {"lease_until": {"$lt": now}}],
+                },
+                {
+                    "$set": {
+                        "name": migration.name,
+                        "collection": migration.collection,
+                        "status": RUNNING,
+                        "total": total,
+                        "lease_owner": self.owner,
+                        "lease_until": now + timedelta(seconds=MIGRATION_LEASE_SECONDS),
+                        "updated_at": now,
+                        "error": None,
+                    },
+                    "$setOnInsert": {"started_at": now, "last_id": None, "processed": 0},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The record exists but is completed or leased: the upsert tried to insert it again.
+            return None
+
+    def _checkpoint(self, migration: Migration, fields: dict) -> bool:
+        now = utcnow()
+        fields = {"updated_at": now, "lease_until": now + timedelta(seconds=MIGRATION_LEASE_SECONDS), **fields}
+        result = self.records.update_one(
+            {"_id": migration.version, "lease_owner": self.owner}, {"$set": fields}
+        )
+        return result.matched_count == 1
+
+    def run_migration(self, migration: Migration) -> bool:
+        """
+        Applies one migration until no document is left in an older shape.
+
+        Args:
+            migration (Migration): The migration.
+
+        Returns:
+            bool: True if the migration is completed, False if another runner holds it.
+        """
+        collection = self.db[migration.collection]
+        record = self.records.find_one({"_id": migration.version})
+        if record and record.get("status") == COMPLETED:
+            return True
+        record = self._claim(migration, collection.estimated_document_count())
+        if record is None:
+            return False
+
+        throttle = AdaptiveThrottle(record.get("batch_size") or MIGRATION_BATCH_SIZE)
+        last_id = record.get("last_id")
+        processed = record.get("processed", 0)
+        try:
+            while True:
+                query = migration.pending_filter()
+                if last_id is not None:
+                    query = {"$and": [{"_id": {"$gt": last_id}}, query]}
+                started = time.monotonic()
+                documents = list(
+                    collection.find(query, migration.projection).sort("_id", 1).limit(throttle.batch_size)
+                )
+                if not documents:
+                    break
+                writes = [
+                    UpdateOne({"_id": document["_id"], **migration.pending_filter()}, {"$set": migration.transform(document)})
+                    for document in documents
+                ]
+                result = collection.bulk_write(writes, ordered=False)
+                latency = time.monotonic() - started
+                last_id = documents[-1]["_id"]
+                processed += result.modified_count
+                pause = throttle.record(latency)
+                checkpoint = {
+                    "last_id": last_id,
+                    "processed": processed,
+                    "batch_size": throttle.batch_size,
+                    "latency_ms": round(latency * 1000, 1),
+                }
+                if not self._checkpoint(migration, checkpoint):
+                    # Lease expired and another runner took over, it resumes from its own checkpoint.
+                    return False
+                self.sleep(pause)
+        except Exception as exc:
+            self._checkpoint(migration, {"status": FAILED, "error": str(exc), "lease_until": None})
+            raise
+        self._checkpoint(migration, {"status": COMPLETED, "completed_at": utcnow(), "lease_until": None})
+        return True
+
+
+def main(argv: Optional[List[str]] = None):
+    from .database import get_sync_database
+
+    parser = argparse.ArgumentParser(description="Apply or inspect document schema migrations.")
+    parser.add_argument("command", choices=["status", "run"])
+    args = parser.parse_args(argv)
+    runner = MigrationRunner(get_sync_database())
+    progress = runner.run() if args.command == "run" else runner.status()
+    print(json.dumps(progress, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,34 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 
+class Location(BaseModel):
+    """
+    Location model to represent where a candidate is based.
+
+    Attributes:
+        latitude (float): Latitude in degrees.
+        longitude (float): Longitude in degrees.
+        country (Optional[str]): ISO 3166 country code.
+        city (Optional[str]): City name.
+
+    Config:
+        json_schema_extra (dict): Example of a location instance.
+    """
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    country: Optional[str] = Field(None, min_length=2, max_length=2)
+    city: Optional[str] = Field(None, max_length=100)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "latitude": 51.5074,
+                "longitude": -0.1278,
+                "country": "GB",
+                "city": "London"
+            }
+        }
+
 class Candidate(BaseModel):
     """
     Candidate model to represent a candidate's information.
@@ -13,6 +41,7 @@ class Candidate(BaseModel):
         phone_number (str): The phone number of the candidate.
         experience_years (float): The number of years of experience the candidate has.
         skills (List[str]): A list of skills possessed by the candidate.
+        location (Optional[Location]): Structured location of the candidate, used by geographic search.
 
     Config:
         json_schema_extra (dict): Example of a candidate instance.
@@ -24,6 +53,7 @@ class Candidate(BaseModel):
     phone_number: str = Field(...)
     experience_years: float = Field(..., ge=0)
     skills: List[str]
+    location: Optional[Location] = None
 
     class Config:
         json_schema_extra = {
@@ -34,6 +64,7 @@ class Candidate(BaseModel):
                 "education": "Bachelor in CS",
                 "phone_number": "12345678901",
                 "experience_years": 5.5,
-                "skills": ["Python", "JavaScript", "SQL"]
+                "skills": ["Python", "JavaScript", "SQL"],
+                "location": {"latitude": 51.5074, "longitude": -0.1278, "country": "GB", "city": "London"}
             }
         }
@@ -0,0 +1,21 @@
+from typing import Literal
+from pydantic import BaseModel, Field
+
+class DuplicateReview(BaseModel):
+    """
+    DuplicateReview model to represent a reviewer's decision on a suspected duplicate pair.
+
+    Attributes:
+        status (str): "confirmed" if both records are the same person, "dismissed" otherwise.
+
+    Config:
+        json_schema_extra (dict): Example of a review instance.
+    """
+    status: Literal["confirmed", "dismissed"] = Field(...)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "status": "confirmed"
+            }
+        }
@@ -30,11 +30,14 @@ class User(BaseModel):
         fullname (Union[str, None]): The full name of the user (optional).
         email (EmailStr): The email address of the user.
         city (str): The city where the user resides.
+        tenant_id (Union[str, None]): The organization the user belongs to, None until
+            an administrator assigns one.
     """
     fullname: Union[str, None] = None
     email: EmailStr = Field(...)
     city: str = Field(..., min_length=1, max_length=50)
     disabled: Union[bool, None] = Field(default=False)
+    tenant_id: Union[str, None] = None
 
 class UserInDB(User):
     """
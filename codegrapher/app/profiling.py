@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_PER_MINUTE = int(os.getenv("PROFILE_MAX_PER_MINUTE", "6"))
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_FLAG = "__profile"
+
+# Only one sampler runs at a time: it samples the whole event loop thread, so two
+# overlapping profiles would record the same stacks.
+_active = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the stack of one thread from a background thread.
+
+    Nothing runs until `start` is called, so an idle profiler costs nothing. Samples are
+    written in the speedscope "sampled" format, which also renders as a flamegraph.
+
+    Attributes:
+        name (str): Name of the profile, usually "<METHOD> <route>".
+        interval (float): Seconds between two samples.
+    """
+
+    def __init__(self, name: str, interval: float = PROFILE_INTERVAL):
+        self.name = name
+        self.interval = interval
+        self._target = threading.get_ident()
+        self._frames = {}
+        self._samples = []
+        self._weights = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = 0.0
+        self._duration = 0.0
+
+    def start(self) -> bool:
+        """
+        Starts sampling the calling thread.
+
+        Returns:
+            bool: False if another profile is already running.
+        """
+        if not _active.acquire(blocking=False):
+            return False
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._duration = time.perf_counter() - self._started_at
+        _active.release()
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self._samples.append(stack)
+            self._weights.append(now - last)
+            last = now
+
+    def to_speedscope(self) -> dict:
+        """
+        Returns:
+            dict: The profile as a speedscope JSON document.
+        """
+        frames = [None] * len(self._frames)
+        for (name, file, line), index in self._frames.items():
+            frames[index] = {"name": name, "file": file, "line": line}
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "codegrapher",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self._duration,
+                    "samples": self._samples,
+                    "weights": self._weights,
+                }
+            ],
+        }
+
+    def save(self, file_name: str) -> str:
+        """
+        Writes the profile to `PROFILE_DIR`.
+
+        Args:
+            file_name (str): Name of the file, as returned by `profile_file_name`.
+
+        Returns:
+            str: Path of the written file.
+        """
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, file_name)
+        with open(path, "w") as f:
+            json.dump(self.to_speedscope(), f)
+        return path
+
+
+def profile_file_name(method: str, route: str) -> str:
+    """
+    Args:
+        method (str): HTTP method.
+        route (str): Route template or path.
+
+    Returns:
+        str: A unique, filesystem-safe file name for the profile.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+    return f"{stamp}-{method.lower()}-{slug}.speedscope.json"
+
+
+class RouteSampler:
+    """
+    Decides which requests of each route get profiled.
+
+    Each route is sampled with probability `rate`, and at most `max_per_minute` times
+    per minute so a busy route cannot fill the disk.
+    """
+
+    def __init__(self, rate: float = PROFILE_SAMPLE_RATE, max_per_minute: int = PROFILE_MAX_PER_MINUTE):
+        self.rate = rate
+        self.max_per_minute = max_per_minute
+        self._windows = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.max_per_minute > 0
+
+    def should_sample(self, route: str) -> bool:
+        if not self.enabled or random.random() >= self.rate:
+            return False
+        window = int(time.monotonic() // 60)
+        current, count = self._windows.get(route, (window, 0))
+        if current != window:
+            count = 0
+        if count >= self.max_per_minute:
+            return False
+        self._windows[route] = (window, count + 1)
+        return True
+
+
+def list_profiles() -> list:
+    """
+    Lists stored profiles, newest first.
+
+    Returns:
+        list: Dicts with the file name, size in bytes and creation time.
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".speedscope.json"):
+            continue
+        stat = os.stat(os.path.join(PROFILE_DIR, name))
+        profiles.append({
+            "name": name,
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+        })
+    profiles.sort(key=lambda p: p["name"], reverse=True)
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    """
+    Args:
+        name (str): File name of a stored profile.
+
+    Returns:
+        Optional[str]: Its path, or None if it does not exist or the name is not a plain file name.
+    """
+    if os.path.basename(name) != name or not name.endswith(".speedscope.json"):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,483 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional, Tuple
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .database import database
+from .deadline import max_time_ms, bounded
+from .dedup import (
+    DUPLICATE_COLLECTION,
+    DUPLICATE_INDEXES,
+    PROJECTION,
+    SIGNATURE_COLLECTION,
+    SIGNATURE_INDEXES,
+    normalize_skills,
+    pair_update,
+)
+from .archive import ACTIVE, ARCHIVAL_SCAN_INDEXES, ARCHIVE_COLLECTION, ARCHIVE_INDEXES
+from .tenancy import tenant_filter
+from .geo import Box, Point, POINT_FIELD, geo_filter
+from .sync import TOMBSTONE_COLLECTION, TOMBSTONE_INDEXES, Watermark, after_watermark, utcnow
+
+SEARCH_FIELDS = ("fullname", "email", "address", "education", "phone_number", "skills")
+
+
+class CandidateRepository(ABC):
+    """
+    Storage of candidates, their archive, deletion tombstones and per tenant counts.
+
+    Reads and writes stored documents, ids as `ObjectId`; formatting them for the API
+    and the rules around them (uniqueness, quotas, audit) stay in `api.candidate`.
+    Every method is scoped to a tenant and only sees active candidates.
+    """
+
+    @abstractmethod
+    async def create_indexes(self):
+        """
+        Creates whatever the store needs to answer the other methods efficiently.
+        Safe to call on every startup.
+        """
+
+    @abstractmethod
+    async def get(self, _id: ObjectId, tenant: str, include_archived: bool = False) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: The candidate, looked up in the archive too if `include_archived`.
+        """
+
+    @abstractmethod
+    async def find_by_email(self, tenant: str, email: str) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: A hot or archived candidate of the tenant with this email,
+                compared case-insensitively.
+        """
+
+    @abstractmethod
+    async def query(
+        self,
+        tenant: str,
+        page: int = 1,
+        limit: int = 10,
+        search: Optional[str] = None,
+        include_archived: bool = False,
+        skills: Optional[Tuple[str, ...]] = None,
+        min_experience: Optional[float] = None,
+        near: Optional[Point] = None,
+        radius_km: float = 50,
+        within: Optional[Box] = None,
+    ) -> List[dict]:
+        """
+        Returns:
+            List[dict]: One page of the candidates matching the filters, hot ones first.
+        """
+
+    @abstractmethod
+    async def insert(self, candidate: dict) -> dict:
+        """
+        Returns:
+            dict: The stored candidate, with its `_id`.
+        """
+
+    @abstractmethod
+    async def update(self, _id: ObjectId, tenant: str, fields: dict) -> Optional[dict]:
+        """
+        Sets fields of a candidate, restoring it from the archive first if needed.
+
+        Returns:
+            Optional[dict]: The updated candidate, None if it doesn't exist.
+        """
+
+    @abstractmethod
+    async def soft_delete(self, _id: ObjectId, tenant: str) -> bool:
+        """
+        Marks a candidate deleted and leaves a tombstone for incremental sync.
+
+        Returns:
+            bool: True if the candidate existed.
+        """
+
+    @abstractmethod
+    def changed(self, tenant: str, after: Watermark, horizon, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """
+        Returns:
+            AsyncIterator[dict]: Candidates updated after the watermark, up to the
+                horizon, in (updated_at, _id) order.
+        """
+
+    @abstractmethod
+    def deleted(self, tenant: str, after: Watermark, horizon, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """
+        Returns:
+            AsyncIterator[dict]: Tombstones written after the watermark, up to the
+                horizon, in (deleted_at, _id) order.
+        """
+
+    @abstractmethod
+    async def reserve(self, tenant: str, quota: int) -> bool:
+        """
+        Counts one more candidate for the tenant, unless it already has `quota`.
+
+        Args:
+            tenant (str): Tenant id.
+            quota (int): Maximum number of candidates, 0 for no limit.
+
+        Returns:
+            bool: False if the tenant is at its quota.
+        """
+
+    @abstractmethod
+    async def release(self, tenant: str):
+        """
+        Gives back one candidate counted for the tenant.
+        """
+
+    @abstractmethod
+    async def usage(self, tenant: str) -> int:
+        """
+        Returns:
+            int: Number of candidates counted for the tenant.
+        """
+
+    @abstractmethod
+    async def dedup_fields(self, _id: ObjectId, tenant: str) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: The fields of the candidate duplicate detection reads,
+                `dedup.PROJECTION`.
+        """
+
+    @abstractmethod
+    def similar_signatures(self, signature: dict) -> AsyncIterator[dict]:
+        """
+        Args:
+            signature (dict): A document built by `dedup.signature_document`.
+
+        Returns:
+            AsyncIterator[dict]: The stored signatures of other candidates sharing an
+                LSH band with it.
+        """
+
+    @abstractmethod
+    async def save_signature(self, signature: dict):
+        """
+        Stores a candidate's signature, replacing the previous one.
+        """
+
+    @abstractmethod
+    async def record_duplicate(self, id_a: ObjectId, id_b: ObjectId, score: float, tenant: str):
+        """
+        Records a likely duplicate pair. Already reviewed pairs keep their status.
+        """
+
+    @abstractmethod
+    async def remove_signature(self, _id: ObjectId, tenant: str):
+        """
+        Forgets a candidate's signature and its duplicate pairs still pending review.
+        """
+
+
+class UserRepository(ABC):
+    """
+    Storage of users, looked up by email.
+    """
+
+    @abstractmethod
+    async def create_indexes(self):
+        """
+        Creates whatever the store needs to answer the other methods efficiently.
+        Safe to call on every startup.
+        """
+
+    @abstractmethod
+    async def find_by_email(self, email: str) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: The user with this email.
+        """
+
+    @abstractmethod
+    async def insert(self, user: dict) -> dict:
+        """
+        Returns:
+            dict: The stored user, with its `_id`.
+        """
+
+    @abstractmethod
+    async def update(self, email: str, fields: dict) -> Optional[dict]:
+        """
+        Returns:
+            Optional[dict]: The updated user, None if no user has this email.
+        """
+
+    @abstractmethod
+    async def all(self) -> List[dict]:
+        """
+        Returns:
+            List[dict]: Every user.
+        """
+
+
+class MotorCandidateRepository(CandidateRepository):
+    """
+    Candidates stored in Mongo, through Motor.
+
+    Args:
+        db: A Motor database.
+    """
+
+    def __init__(self, db):
+        self.candidates = db.get_collection("candidate_collection")
+        self.tombstones = db.get_collection(TOMBSTONE_COLLECTION)
+        self.archive = db.get_collection(ARCHIVE_COLLECTION)
+        self.usage_counts = db.get_collection("tenant_usage")
+        self.signatures = db.get_collection(SIGNATURE_COLLECTION)
+        self.duplicates = db.get_collection(DUPLICATE_COLLECTION)
+
+    async def create_indexes(self):
+        """
+        Creates the indexes used by incremental sync, email lookups, archival and duplicate
+        detection, and the TTL indexes purging old archived candidates and sync tombstones.
+        Safe to call on every startup.
+        """
+        # Tenant first, so a tenant's queries only walk its own part of each index.
+        await self.candidates.create_index([("tenant_id", ASCENDING), ("email", ASCENDING)])
+        await self.candidates.create_index([("tenant_id", ASCENDING), ("email_lower", ASCENDING)])
+        await self.candidates.create_index([("tenant_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)])
+        await self.candidates.create_index([("tenant_id", ASCENDING), (POINT_FIELD, "2dsphere")])
+        await self.candidates.create_indexes(ARCHIVAL_SCAN_INDEXES)
+        await self.archive.create_indexes(ARCHIVE_INDEXES)
+        await self.tombstones.create_indexes(TOMBSTONE_INDEXES)
+        await self.signatures.create_indexes(SIGNATURE_INDEXES)
+        await self.duplicates.create_indexes(DUPLICATE_INDEXES)
+
+    async def _find_one(self, collection, query: dict) -> Optional[dict]:
+        return await collection.find_one(query, max_time_ms=max_time_ms())
+
+    async def get(self, _id: ObjectId, tenant: str, include_archived: bool = False) -> Optional[dict]:
+        query = {"_id": _id, **tenant_filter(tenant), **ACTIVE}
+        candidate = await self._find_one(self.candidates, query)
+        if candidate is None and include_archived:
+            candidate = await self._find_one(self.archive, query)
+        return candidate
+
+    async def find_by_email(self, tenant: str, email: str) -> Optional[dict]:
+        # Documents not yet migrated have no email_lower, match those on the raw email.
+        same_email = {
+            **tenant_filter(tenant),
+            **ACTIVE,
+            "$or": [{"email_lower": email.strip().lower()}, {"email": email}],
+        }
+        return await self._find_one(self.candidates, same_email) or await self._find_one(self.archive, same_email)
+
+    async def query(
+        self,
+        tenant: str,
+        page: int = 1,
+        limit: int = 10,
+        search: Optional[str] = None,
+        include_archived: bool = False,
+        skills: Optional[Tuple[str, ...]] = None,
+        min_experience: Optional[float] = None,
+        near: Optional[Point] = None,
+        radius_km: float = 50,
+        within: Optional[Box] = None,
+    ) -> List[dict]:
+        skip = (page - 1) * limit
+        query = {**tenant_filter(tenant), **ACTIVE}
+        if search:
+            query["$or"] = [{field: {"$regex": search, "$options": "i"}} for field in SEARCH_FIELDS]
+        if skills:
+            query["skills_canonical"] = {"$all": normalize_skills(skills)}
+        if min_experience is not None:
+            query["experience_years"] = {"$gte": min_experience}
+        query.update(geo_filter(near, radius_km, within))
+
+        if include_archived:
+            pipeline = [
+                {"$match": query},
+                {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": query}]}},
+                {"$skip": skip},
+                {"$limit": limit},
+            ]
+            options = {}
+            budget = max_time_ms()
+            if budget is not None:
+                options["maxTimeMS"] = budget
+            cursor = self.candidates.aggregate(pipeline, **options)
+        else:
+            cursor = self.candidates.find(query, max_time_ms=max_time_ms()).skip(skip).limit(limit)
+        return [candidate async for candidate in cursor]
+
+    async def insert(self, candidate: dict) -> dict:
+        result = await bounded(self.candidates.insert_one(candidate))
+        return await self._find_one(self.candidates, {"_id": result.inserted_id})
+
+    async def _restore(self, _id: ObjectId, tenant: str) -> bool:
+        """
+        Moves an inactive candidate back from the archive to the hot collection.
+
+        Returns:
+            bool: True if the candidate was in the archive.
+        """
+        archived = await self._find_one(self.archive, {"_id": _id, **tenant_filter(tenant), **ACTIVE})
+        if archived is None:
+            return False
+        archived.pop("archived_at", None)
+        archived.pop("archive_reason", None)
+        await bounded(self.candidates.replace_one({"_id": _id}, archived, upsert=True))
+        await bounded(self.archive.delete_one({"_id": _id}))
+        return True
+
+    async def update(self, _id: ObjectId, tenant: str, fields: dict) -> Optional[dict]:
+        query = {"_id": _id, **tenant_filter(tenant), **ACTIVE}
+        candidate = await self._find_one(self.candidates, query)
+        if not candidate and not await self._restore(_id, tenant):
+            return None
+        result = await bounded(self.candidates.update_one(query, {"$set": fields}))
+        if result.modified_count > 0:
+            return await self._find_one(self.candidates, {"_id": _id})
+        return None
+
+    async def soft_delete(self, _id: ObjectId, tenant: str) -> bool:
+        query = {"_id": _id, **tenant_filter(tenant), **ACTIVE}
+        candidate = await self._find_one(self.candidates, query)
+        if candidate is None and await self._restore(_id, tenant):
+            candidate = await self._find_one(self.candidates, query)
+        if not candidate:
+            return False
+        await bounded(self.candidates.update_one(query, {"$set": {"deleted_at": utcnow()}}))
+        await bounded(
+            self.tombstones.insert_one({"candidate_id": candidate["_id"], "tenant_id": tenant, "deleted_at": utcnow()})
+        )
+        return True
+
+    def _sorted(self, collection, query: dict, field: str, limit: Optional[int]):
+        cursor = collection.find(query, max_time_ms=max_time_ms()).sort(
+            [(field, ASCENDING), ("_id", ASCENDING)]
+        )
+        return cursor.limit(limit) if limit else cursor
+
+    def changed(self, tenant: str, after: Watermark, horizon, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        query = {**after_watermark("updated_at", after, horizon), **tenant_filter(tenant), **ACTIVE}
+        return self._sorted(self.candidates, query, "updated_at", limit)
+
+    def deleted(self, tenant: str, after: Watermark, horizon, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        query = {**after_watermark("deleted_at", after, horizon), **tenant_filter(tenant)}
+        return self._sorted(self.tombstones, query, "deleted_at", limit)
+
+    async def reserve(self, tenant: str, quota: int) -> bool:
+        # The check and the increment are a single conditional upsert, so concurrent
+        # inserts can't go over the quota together.
+        if not quota:
+            await bounded(self.usage_counts.update_one({"_id": tenant}, {"$inc": {"candidates": 1}}, upsert=True))
+            return True
+        try:
+            await bounded(
+                self.usage_counts.find_one_and_update(
+                    {"_id": tenant, "candidates": {"$lt": quota}},
+                    {"$inc": {"candidates": 1}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            )
+        except DuplicateKeyError:
+            # The usage document exists but is at the quota: the upsert tried to insert it again.
+            return False
+        return True
+
+    async def release(self, tenant: str):
+        await bounded(
+            self.usage_counts.update_one({"_id": tenant, "candidates": {"$gt": 0}}, {"$inc": {"candidates": -1}})
+        )
+
+    async def usage(self, tenant: str) -> int:
+        usage = await self._find_one(self.usage_counts, {"_id": tenant})
+        return usage["candidates"] if usage else 0
+
+    async def dedup_fields(self, _id: ObjectId, tenant: str) -> Optional[dict]:
+        return await self.candidates.find_one(
+            {"_id": _id, **tenant_filter(tenant), **ACTIVE}, PROJECTION, max_time_ms=max_time_ms()
+        )
+
+    def similar_signatures(self, signature: dict) -> AsyncIterator[dict]:
+        return self.signatures.find(
+            {"bands": {"$in": signature["bands"]}, "candidate_id": {"$ne": signature["candidate_id"]}},
+            {"candidate_id": 1, "signature": 1},
+        )
+
+    async def save_signature(self, signature: dict):
+        await bounded(
+            self.signatures.replace_one(
+                {"candidate_id": signature["candidate_id"]}, signature, upsert=True
+            )
+        )
+
+    async def record_duplicate(self, id_a: ObjectId, id_b: ObjectId, score: float, tenant: str):
+        await bounded(self.duplicates.update_one(*pair_update(id_a, id_b, score, tenant), upsert=True))
+
+    async def remove_signature(self, _id: ObjectId, tenant: str):
+        await bounded(self.signatures.delete_one({"candidate_id": _id, **tenant_filter(tenant)}))
+        await bounded(
+            self.duplicates.delete_many(
+                {"candidate_ids": _id, **tenant_filter(tenant), "status": "pending"}
+            )
+        )
+
+
+class MotorUserRepository(UserRepository):
+    """
+    Users stored in Mongo, through Motor.
+
+    Args:
+        db: A Motor database.
+    """
+
+    def __init__(self, db):
+        self.users = db.get_collection("users_collection")
+
+    async def create_indexes(self):
+        await self.users.create_index("email")
+
+    async def find_by_email(self, email: str) -> Optional[dict]:
+        return await self.users.find_one({"email": email}, max_time_ms=max_time_ms())
+
+    async def insert(self, user: dict) -> dict:
+        result = await bounded(self.users.insert_one(user))
+        return await self.users.find_one({"_id": result.inserted_id}, max_time_ms=max_time_ms())
+
+    async def update(self, email: str, fields: dict) -> Optional[dict]:
+        return await bounded(
+            self.users.find_one_and_update(
+                {"email": email}, {"$set": fields}, return_document=ReturnDocument.AFTER
+            )
+        )
+
+    async def all(self) -> List[dict]:
+        return [user async for user in self.users.find(max_time_ms=max_time_ms())]
+
+
+candidate_repository = MotorCandidateRepository(database)
+user_repository = MotorUserRepository(database)
+
+
+def get_candidate_repository() -> CandidateRepository:
+    """
+    FastAPI dependency providing the candidate store. Tests and benchmarks swap it
+    through `app.dependency_overrides`.
+
+    Returns:
+        CandidateRepository: The Mongo backed repository.
+    """
+    return candidate_repository
+
+
+def get_user_repository() -> UserRepository:
+    """
+    FastAPI dependency providing the user store. Tests and benchmarks swap it
+    through `app.dependency_overrides`.
+
+    Returns:
+        UserRepository: The Mongo backed repository.
+    """
+    return user_repository
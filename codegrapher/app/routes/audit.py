@@ -0,0 +1,39 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from ..helpers import ResponseModel
+from ..models.user import User
+from ..api.users import get_current_admin_user
+from ..api.audit import retrieve_audit_events
+
+AuditRouter = APIRouter()
+
+
+@AuditRouter.get("/", response_description="Retrieve the candidate audit log")
+async def get_audit_events(
+    current_user: User = Depends(get_current_admin_user),
+    candidate_id: Optional[str] = Query(None, alias="candidate_id"),
+    actor: Optional[str] = Query(None, alias="actor"),
+    action: Optional[str] = Query(None, alias="action", pattern="^(create|update|delete)$"),
+    tenant: Optional[str] = Query(None, alias="tenant"),
+    page: int = Query(1, alias="page", ge=1),
+    limit: int = Query(50, alias="limit", ge=1, le=500)
+):
+    """
+    Retrieves who created, updated or deleted candidates, newest first.
+
+    Args:
+        current_user (User): The currently authenticated administrator.
+        candidate_id (Optional[str]): Only events about this candidate.
+        actor (Optional[str]): Only events by this user's email.
+        action (Optional[str]): Only events of this action.
+        tenant (Optional[str]): Only events of this tenant.
+        page (int): Page number for pagination.
+        limit (int): Number of events per page.
+
+    Returns:
+        ResponseModel: Response with the list of audit events.
+    """
+    events = await retrieve_audit_events(candidate_id, actor, action, tenant, page, limit)
+    if events:
+        return ResponseModel(events, "Audit events retrieved successfully")
+    return ResponseModel(events, "No record found")
@@ -1,92 +1,248 @@
-from typing import Annotated, Optional
-from fastapi import APIRouter, Body, Query, Depends, BackgroundTasks
+import asyncio
+import os
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Body, Query, Depends, BackgroundTasks, HTTPException
 from fastapi.encoders import jsonable_encoder
 from ..helpers import ResponseModel, ErrorResponseModel
 from ..models.candidate import Candidate
 from ..models.user import User
 from fastapi.responses import FileResponse, JSONResponse
-from ..api.users import get_current_active_user
+from ..api.users import get_current_active_user, get_current_tenant
+from ..deadline import request_budget
+from ..geo import MAX_RADIUS_KM, parse_box, parse_point
+from ..api.duplicates import index_candidate, unindex_candidate
+from ..api.audit import record_audit
+from ..repositories import CandidateRepository, get_candidate_repository
+from ..tasks import app as celery_app, export_candidates
 from ..api.candidate import (
     add_candidate,
     retrieve_candidates,
     retrieve_candidate,
     update_candidate,
     delete_candidate,
+    retrieve_changes,
     generate_csv_report
 )
 
 CandidateRouter = APIRouter()
 
+REPORT_TIMEOUT = 300
 
-@CandidateRouter.get("/generate-report", response_description="Generate CSV report of all candidates")
-async def generate_report():
+
+@CandidateRouter.get(
+    "/generate-report",
+    response_description="Generate CSV report of all candidates",
+    dependencies=[Depends(request_budget(REPORT_TIMEOUT))],
+)
+async def generate_report(
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository),
+    since: Optional[str] = Query(None, alias="since")
+):
     """
-    Generates a CSV report of all candidates and returns the file.
+    Generates a CSV report of the current tenant's candidates and returns the file.
+
+    Args:
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
+        since (Optional[str]): Sync token; when given only candidates changed since then are exported.
 
     Returns:
-        FileResponse: CSV file containing the report.
+        FileResponse: CSV file containing the report, with the token for the next delta
+            report in the `X-Sync-Token` header.
     """
     try:
-        file_path = await generate_csv_report()
-        return FileResponse(file_path, media_type='text/csv', filename='report.csv')
+        file_path, token = await generate_csv_report(tenant, repository, since)
+        return FileResponse(
+            file_path, media_type='text/csv', filename='report.csv', headers={"X-Sync-Token": token}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"An error occurred: {e}")
         return ErrorResponseModel("An error occurred.", 404, f"{e}")
 
+@CandidateRouter.post("/exports", response_description="Start a CSV export of all candidates", status_code=202)
+async def start_export(
+    tenant: str = Depends(get_current_tenant),
+    since: Optional[str] = Query(None, alias="since")
+):
+    """
+    Queues the CSV export of the current tenant's candidates on the heavy queue, for
+    reports too large to build within a request.
+
+    Args:
+        tenant (str): The current user's tenant.
+        since (Optional[str]): Sync token; when given only candidates changed since then are exported.
+
+    Returns:
+        ResponseModel: Response with the id of the export task, to poll with GET /exports/{task_id}.
+    """
+    result = await asyncio.to_thread(export_candidates.delay, tenant, since)
+    return ResponseModel({"task_id": result.id}, "Export started")
+
+
+@CandidateRouter.get("/exports/{task_id}", response_description="CSV export status or file")
+async def get_export(task_id: str, tenant: str = Depends(get_current_tenant)):
+    """
+    Returns the file of a finished export, or its state while it runs.
+
+    Args:
+        task_id (str): Id returned when the export was started.
+        tenant (str): The current user's tenant.
+
+    Returns:
+        FileResponse: The CSV file, with the token for the next delta report in the
+            `X-Sync-Token` header, once the export succeeded.
+        JSONResponse: The task state with status 202 while it is queued or running.
+
+    Raises:
+        HTTPException: 404 if the export belongs to another tenant or its file was
+            purged, 500 if it failed.
+    """
+    result = celery_app.AsyncResult(task_id)
+    state = await asyncio.to_thread(lambda: result.state)
+    if state == "FAILURE":
+        raise HTTPException(status_code=500, detail="Export failed")
+    if state != "SUCCESS":
+        return JSONResponse(status_code=202, content={"task_id": task_id, "state": state})
+    export = result.result
+    if not isinstance(export, dict) or export.get("tenant") != tenant:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if not os.path.exists(export["path"]):
+        raise HTTPException(status_code=404, detail="Export expired")
+    return FileResponse(
+        export["path"], media_type='text/csv', filename='report.csv', headers={"X-Sync-Token": export["token"]}
+    )
+
+
 @CandidateRouter.post("/", response_description="Candidate data added into the database")
-async def add_candidate_data(current_user: User = Depends(get_current_active_user), candidate: Candidate = Body(...)):
+async def add_candidate_data(
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository),
+    candidate: Candidate = Body(...)
+):
     """
-    Adds a new candidate to the database.
+    Adds a new candidate to the database, records who added it and checks it for
+    near-duplicates in the background.
 
     Args:
+        background_tasks (BackgroundTasks): Tasks run after the response is sent.
         current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
         candidate (Candidate): The candidate data to add.
 
     Returns:
         ResponseModel: Response with the newly added candidate data.
     """
     candidate = jsonable_encoder(candidate)
-    new_candidate = await add_candidate(candidate)
+    fields = list(candidate)
+    new_candidate = await add_candidate(candidate, tenant, repository)
+    await record_audit("create", new_candidate["id"], current_user.email, tenant, fields)
+    background_tasks.add_task(index_candidate, new_candidate["id"], tenant, repository)
     return ResponseModel(new_candidate, "Candidate added successfully.")
 
 @CandidateRouter.get("/all-candidates", response_description="Retrieve all candidates with pagination and search")
 async def get_candidates(
     current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository),
     page: int = Query(1, alias="page"),
     limit: int = Query(10, alias="limit"),
-    search: Optional[str] = Query(None, alias="search")
+    search: Optional[str] = Query(None, alias="search"),
+    include_archived: bool = Query(False, alias="include_archived"),
+    skills: Optional[List[str]] = Query(None, alias="skills"),
+    min_experience: Optional[float] = Query(None, alias="min_experience", ge=0),
+    near: Optional[str] = Query(None, alias="near", description="latitude,longitude"),
+    radius_km: float = Query(50, alias="radius_km", gt=0, le=MAX_RADIUS_KM),
+    within: Optional[str] = Query(None, alias="within", description="min_longitude,min_latitude,max_longitude,max_latitude")
 ):
     """
-    Retrieves all candidates with optional pagination and search functionality.
+    Retrieves all candidates with optional pagination, search and filters.
 
     Args:
         current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
         page (int): Page number for pagination.
         limit (int): Number of candidates per page.
         search (Optional[str]): Search term for filtering candidates.
+        include_archived (bool): Whether to also return archived, inactive candidates.
+        skills (Optional[List[str]]): Skills the candidates must all have.
+        min_experience (Optional[float]): Minimum years of experience.
+        near (Optional[str]): Only candidates within `radius_km` of this point.
+        radius_km (float): Search radius around `near` in kilometers.
+        within (Optional[str]): Only candidates inside this bounding box.
 
     Returns:
         ResponseModel: Response with the list of candidates.
+
+    Raises:
+        HTTPException: If `near` or `within` is malformed.
     """
-    candidates = await retrieve_candidates(page, limit, search)
+    try:
+        point = parse_point(near) if near else None
+        box = parse_box(within) if within else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid location filter: {e}")
+    candidates = await retrieve_candidates(
+        tenant, repository, page, limit, search, include_archived,
+        tuple(skills) if skills else None, min_experience, point, radius_km, box
+    )
     if candidates:
         return ResponseModel(candidates, "Candidates data retrieved successfully")
     return ResponseModel(candidates, "No record found")
 
+@CandidateRouter.get("/changes", response_description="Retrieve candidates changed since a sync token")
+async def get_candidate_changes(
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository),
+    since: Optional[str] = Query(None, alias="since"),
+    limit: int = Query(500, alias="limit", ge=1, le=5000)
+):
+    """
+    Retrieves candidates created, updated or deleted since a sync token.
+
+    Args:
+        current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
+        since (Optional[str]): Token returned by the previous call, omitted for a full sync.
+        limit (int): Maximum number of changes and of deletions per call.
+
+    Returns:
+        ResponseModel: Response with the changes, deleted ids, next token and `has_more`.
+    """
+    changes = await retrieve_changes(tenant, repository, since, limit)
+    return ResponseModel(changes, "Candidate changes retrieved successfully")
+
 @CandidateRouter.get("/{id}", response_description="Retrieve candidate data by ID")
-async def get_candidate_data(id: str, current_user: User = Depends(get_current_active_user)):
+async def get_candidate_data(
+    id: str,
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository),
+    include_archived: bool = Query(False, alias="include_archived")
+):
     """
     Retrieves candidate data by ID.
 
     Args:
         id (str): Candidate ID.
         current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
+        include_archived (bool): Whether to look the candidate up in the archive too.
 
     Returns:
         ResponseModel: Response with the candidate data if found.
         ErrorResponseModel: Error response if candidate not found.
     """
-    candidate = await retrieve_candidate(id)
+    candidate = await retrieve_candidate(id, tenant, repository, include_archived)
     if candidate:
         return ResponseModel(candidate, "Candidate data retrieved successfully")
     return ErrorResponseModel("An error occurred.", 404, "candidate doesn't exist.")
@@ -94,23 +250,32 @@ async def get_candidate_data(id: str, current_user: User = Depends(get_current_a
 @CandidateRouter.put("/{id}", response_description="Update candidate data by ID")
 async def update_candidate_data(
     id: str,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository),
     req: Candidate = Body(...)
 ):
     """
-    Updates candidate data by ID.
+    Updates candidate data by ID and records who updated it.
 
     Args:
         id (str): Candidate ID.
+        background_tasks (BackgroundTasks): Tasks run after the response is sent.
         current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
         req (Candidate): The candidate data to update.
 
     Returns:
         ResponseModel: Response with the updated candidate data if successful.
         ErrorResponseModel: Error response if update failed.
     """
-    updated_candidate = await update_candidate(id, req.dict())
+    data = req.dict()
+    updated_candidate = await update_candidate(id, data, tenant, repository)
     if updated_candidate:
+        await record_audit("update", id, current_user.email, tenant, list(data))
+        background_tasks.add_task(index_candidate, id, tenant, repository)
         return ResponseModel(
             updated_candidate,
             "Candidate updated successfully",
@@ -124,21 +289,29 @@ async def update_candidate_data(
 @CandidateRouter.delete("/{id}", response_description="Delete candidate data by ID")
 async def delete_candidate_data(
     id: str,
-    current_user: User = Depends(get_current_active_user)
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository)
 ):
     """
-    Deletes candidate data by ID.
+    Deletes candidate data by ID and records who deleted it.
 
     Args:
         id (str): Candidate ID.
+        background_tasks (BackgroundTasks): Tasks run after the response is sent.
         current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
 
     Returns:
         ResponseModel: Response confirming the candidate was deleted.
         ErrorResponseModel: Error response if candidate not found.
     """
-    deleted_candidate = await delete_candidate(id)
+    deleted_candidate = await delete_candidate(id, tenant, repository)
     if deleted_candidate:
+        await record_audit("delete", id, current_user.email, tenant)
+        background_tasks.add_task(unindex_candidate, id, tenant, repository)
         return ResponseModel(
             {}, "Candidate deleted successfully"
         )
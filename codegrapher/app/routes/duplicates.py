@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Body, Query, Depends
+from ..helpers import ResponseModel, ErrorResponseModel
+from ..models.duplicate import DuplicateReview
+from ..models.user import User
+from ..api.users import get_current_active_user, get_current_admin_user, get_current_tenant
+from ..api.duplicates import retrieve_duplicates, review_duplicate
+from ..tasks import find_duplicates
+
+DuplicateRouter = APIRouter()
+
+
+@DuplicateRouter.get("/", response_description="Retrieve suspected duplicate candidates")
+async def get_duplicates(
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    status: str = Query("pending", alias="status", pattern="^(pending|confirmed|dismissed)$"),
+    page: int = Query(1, alias="page", ge=1),
+    limit: int = Query(10, alias="limit", ge=1, le=100)
+):
+    """
+    Retrieves suspected duplicate candidate pairs, most similar first.
+
+    Args:
+        current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        status (str): Review status to filter on.
+        page (int): Page number for pagination.
+        limit (int): Number of pairs per page.
+
+    Returns:
+        ResponseModel: Response with the list of duplicate pairs.
+    """
+    duplicates = await retrieve_duplicates(tenant, status, page, limit)
+    if duplicates:
+        return ResponseModel(duplicates, "Duplicates retrieved successfully")
+    return ResponseModel(duplicates, "No record found")
+
+
+@DuplicateRouter.post("/scan", response_description="Start a full duplicate detection run")
+async def scan_duplicates(current_user: User = Depends(get_current_admin_user)):
+    """
+    Queues the batch job recomputing all signatures and duplicate pairs.
+
+    Args:
+        current_user (User): The currently authenticated administrator.
+
+    Returns:
+        ResponseModel: Response with the id of the queued task.
+    """
+    result = find_duplicates.delay()
+    return ResponseModel({"task_id": result.id}, "Duplicate detection started")
+
+
+@DuplicateRouter.put("/{id}", response_description="Review a suspected duplicate pair")
+async def review_duplicate_data(
+    id: str,
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    req: DuplicateReview = Body(...)
+):
+    """
+    Confirms or dismisses a suspected duplicate pair.
+
+    Args:
+        id (str): Duplicate pair ID.
+        current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        req (DuplicateReview): The review decision.
+
+    Returns:
+        ResponseModel: Response with the reviewed pair.
+        ErrorResponseModel: Error response if the pair doesn't exist.
+    """
+    duplicate = await review_duplicate(id, tenant, req.status, current_user.email)
+    if duplicate:
+        return ResponseModel(duplicate, "Duplicate reviewed successfully")
+    return ErrorResponseModel("An error occurred.", 404, "duplicate doesn't exist.")
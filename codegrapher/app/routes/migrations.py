@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+from ..helpers import ResponseModel
+from ..models.user import User
+from ..api.users import get_current_admin_user
+from ..api.migrations import retrieve_migrations
+from ..tasks import run_migrations
+
+MigrationRouter = APIRouter()
+
+
+@MigrationRouter.get("/", response_description="Retrieve schema migration progress")
+async def get_migrations(current_user: User = Depends(get_current_admin_user)):
+    """
+    Retrieves the status and progress of every schema migration.
+
+    Args:
+        current_user (User): The currently authenticated administrator.
+
+    Returns:
+        ResponseModel: Response with the progress of each migration.
+    """
+    return ResponseModel(await retrieve_migrations(), "Migrations retrieved successfully")
+
+
+@MigrationRouter.post("/run", response_description="Start applying pending schema migrations")
+async def start_migrations(current_user: User = Depends(get_current_admin_user)):
+    """
+    Queues the job applying pending migrations. Running it while a previous run is
+    still going is harmless, each migration is worked on by one runner at a time.
+
+    Args:
+        current_user (User): The currently authenticated administrator.
+
+    Returns:
+        ResponseModel: Response with the id of the queued task.
+    """
+    result = run_migrations.delay()
+    return ResponseModel({"task_id": result.id}, "Migrations started")
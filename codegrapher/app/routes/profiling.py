@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import FileResponse
+from ..helpers import ResponseModel, ErrorResponseModel
+from ..models.user import User
+from ..api.users import get_current_admin_user
+from ..profiling import list_profiles, profile_path
+
+ProfilingRouter = APIRouter()
+
+
+@ProfilingRouter.get("/", response_description="List stored request profiles")
+async def get_profiles(current_user: User = Depends(get_current_admin_user)):
+    """
+    Lists stored request profiles, newest first.
+
+    Args:
+        current_user (User): The currently authenticated administrator.
+
+    Returns:
+        ResponseModel: Response with the profile file names, sizes and creation times.
+    """
+    return ResponseModel(list_profiles(), "Profiles retrieved successfully")
+
+
+@ProfilingRouter.get("/{name}", response_description="Download a request profile")
+async def get_profile(name: str, current_user: User = Depends(get_current_admin_user)):
+    """
+    Downloads a stored profile. The file opens in https://www.speedscope.app.
+
+    Args:
+        name (str): File name of the profile.
+        current_user (User): The currently authenticated administrator.
+
+    Returns:
+        FileResponse: The speedscope JSON file.
+        ErrorResponseModel: Error response if the profile doesn't exist.
+    """
+    path = profile_path(name)
+    if path is None:
+        return ErrorResponseModel("An error occurred.", 404, "profile doesn't exist.")
+    return FileResponse(path, media_type="application/json", filename=name)
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from ..helpers import ResponseModel
+from ..models.user import User
+from ..api.users import get_current_active_user, get_current_tenant
+from ..api.tenants import retrieve_tenant_usage
+from ..repositories import CandidateRepository, get_candidate_repository
+
+TenantRouter = APIRouter()
+
+
+@TenantRouter.get("/usage", response_description="Retrieve the current tenant's usage and quota")
+async def get_tenant_usage(
+    current_user: User = Depends(get_current_active_user),
+    tenant: str = Depends(get_current_tenant),
+    repository: CandidateRepository = Depends(get_candidate_repository)
+):
+    """
+    Retrieves how many candidates the current user's tenant has and its quota.
+
+    Args:
+        current_user (User): The currently authenticated user.
+        tenant (str): The current user's tenant.
+        repository (CandidateRepository): Candidate store.
+
+    Returns:
+        ResponseModel: Response with the tenant id, candidate count and quota.
+    """
+    return ResponseModel(await retrieve_tenant_usage(tenant, repository), "Tenant usage retrieved successfully")
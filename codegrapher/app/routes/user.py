@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Body, Depends
+from typing import Optional
+from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm
-from ..api.users import add_user, login
+from ..api.users import add_user, assign_tenant, get_current_admin_user, login
+from ..repositories import UserRepository, get_user_repository
 
 from ..models.user import (
+    User,
     UserInDB,
     UserLoginSchema,
     Token
@@ -13,18 +16,19 @@ from ..helpers import ResponseModel
 UserRouter = APIRouter()
 
 @UserRouter.post("/", response_description="User data added into the database")
-async def add_user_data(data: UserInDB = Body(...)):
+async def add_user_data(data: UserInDB = Body(...), users: UserRepository = Depends(get_user_repository)):
     """
     Add a new user to the database.
 
     Args:
         data (UserInDB): The user data to add to the database.
+        users (UserRepository): User store.
 
     Returns:
         ResponseModel: A response model containing the new user data and a success message.
     """
     data = jsonable_encoder(data)
-    new_user = await add_user(data)
+    new_user = await add_user(data, users)
     return ResponseModel(new_user, "User added successfully.")
 
 def oauth2_to_user_login_schema(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -41,16 +45,48 @@ def oauth2_to_user_login_schema(form_data: OAuth2PasswordRequestForm = Depends()
     return user_data
 
 @UserRouter.post("/token", response_description="User logged in successfully")
-async def user_login(formdata: UserLoginSchema = Depends(oauth2_to_user_login_schema)):
+async def user_login(
+    formdata: UserLoginSchema = Depends(oauth2_to_user_login_schema),
+    users: UserRepository = Depends(get_user_repository)
+):
     """
     User login endpoint.
 
     Args:
         formdata (UserLoginSchema): The user login data.
+        users (UserRepository): User store.
 
     Returns:
         Token: A token model containing the access token and token type.
     """
-    access_token = await login(formdata)
+    access_token = await login(formdata, users)
     return Token(access_token=access_token, token_type="bearer")
 
+@UserRouter.put("/users/{email}/tenant", response_description="User assigned to a tenant")
+async def assign_user_tenant(
+    email: str,
+    tenant: Optional[str] = Body(None, embed=True),
+    current_user: User = Depends(get_current_admin_user),
+    users: UserRepository = Depends(get_user_repository)
+):
+    """
+    Assigns a user to a tenant. Signup doesn't verify emails, so users are in
+    no tenant until an administrator assigns one.
+
+    Args:
+        email (str): The user's email.
+        tenant (Optional[str]): Tenant id, defaults to the one of the email domain.
+        current_user (User): The current administrator.
+        users (UserRepository): User store.
+
+    Returns:
+        ResponseModel: Response with the updated user data.
+
+    Raises:
+        HTTPException: 404 if no user has this email, 400 if no tenant is given
+            and none is mapped to the email domain.
+    """
+    user = await assign_tenant(email, tenant, users)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return ResponseModel(user, "User assigned to tenant successfully.")
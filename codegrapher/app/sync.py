@@ -0,0 +1,176 @@
+import base64
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, IndexModel
+
+load_dotenv()
+
+# Changes newer than this are held back so writes still in flight on other
+# app servers, with slightly older timestamps, are not skipped by a watermark.
+SYNC_SAFETY_LAG = timedelta(seconds=float(os.getenv("SYNC_SAFETY_LAG_SECONDS", "5")))
+SYNC_TOMBSTONE_RETENTION = timedelta(days=float(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30")))
+
+# Candidates that left the hot collection, deleted or archived, for incremental sync.
+TOMBSTONE_COLLECTION = "candidate_tombstones"
+TOMBSTONE_INDEXES = [
+    IndexModel([("tenant_id", ASCENDING), ("deleted_at", ASCENDING), ("_id", ASCENDING)]),
+    # Tokens older than the retention get a 410, so older tombstones are never read.
+    IndexModel("deleted_at", expireAfterSeconds=int(SYNC_TOMBSTONE_RETENTION.total_seconds())),
+]
+
+# A watermark is the (timestamp, _id) of the last document a client has seen,
+# timestamp None meaning documents written before timestamps existed.
+Watermark = Tuple[Optional[datetime], Optional[ObjectId]]
+
+EMPTY_WATERMARK: Watermark = (None, None)
+
+# Sorts after every real id, so a watermark (horizon, LAST_ID) is past every
+# document stamped up to the horizon.
+LAST_ID = ObjectId("f" * 24)
+
+
+def utcnow() -> datetime:
+    """
+    Returns:
+        datetime: The current UTC time, truncated to the millisecond precision Mongo stores.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def sync_horizon() -> datetime:
+    return utcnow() - SYNC_SAFETY_LAG
+
+
+def caught_up(horizon: datetime) -> Watermark:
+    """
+    Returns:
+        Watermark: The watermark of a client that has seen everything up to the
+            horizon, used once a page comes back short so that a quiet tenant's token
+            keeps moving with time.
+    """
+    return horizon, LAST_ID
+
+
+def _to_ms(ts: datetime) -> int:
+    return int(ts.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).replace(tzinfo=None)
+
+
+def _encode_watermark(watermark: Watermark) -> list:
+    ts, _id = watermark
+    return [_to_ms(ts) if ts else None, str(_id) if _id else None]
+
+
+def _decode_watermark(value: list) -> Watermark:
+    ms, _id = value
+    return _from_ms(ms) if ms is not None else None, ObjectId(_id) if _id else None
+
+
+def encode_sync_token(changes: Watermark, deletions: Watermark) -> str:
+    """
+    Encodes the watermarks of a sync into an opaque token, stamped with the time
+    it is issued.
+
+    Args:
+        changes (Watermark): Last changed candidate returned.
+        deletions (Watermark): Last tombstone returned.
+
+    Returns:
+        str: URL-safe token to pass as `since` on the next sync.
+    """
+    payload = {"c": _encode_watermark(changes), "d": _encode_watermark(deletions), "t": _to_ms(utcnow())}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_sync_token(token: Optional[str]) -> Tuple[Watermark, Watermark]:
+    """
+    Decodes a token produced by `encode_sync_token`.
+
+    Args:
+        token (Optional[str]): The token, or None for a full sync.
+
+    Returns:
+        Tuple[Watermark, Watermark]: The change and deletion watermarks.
+
+    Raises:
+        HTTPException: 400 if the token is malformed, 410 if it was issued longer than
+            the tombstone retention ago, so deletions since may have been purged and
+            the client must resync from scratch.
+    """
+    if not token:
+        return EMPTY_WATERMARK, EMPTY_WATERMARK
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        changes, deletions = _decode_watermark(payload["c"]), _decode_watermark(payload["d"])
+        # Tokens issued before they carried a time are treated as expired.
+        issued = _from_ms(payload["t"]) if "t" in payload else datetime.min
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    if issued < utcnow() - SYNC_TOMBSTONE_RETENTION:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync token expired, a full resync is required")
+    return changes, deletions
+
+
+def after_watermark(field: str, watermark: Watermark, horizon: datetime) -> dict:
+    """
+    Builds the query matching documents after a watermark, in (`field`, _id) order,
+    up to the horizon.
+
+    Args:
+        field (str): The timestamp field.
+        watermark (Watermark): The last (timestamp, _id) seen.
+        horizon (datetime): Upper bound of the timestamps to return.
+
+    Returns:
+        dict: The Mongo filter.
+    """
+    ts, _id = watermark
+    in_window = {field: {"$ne": None, "$lte": horizon}}
+    if ts is None:
+        if _id is None:
+            return {"$or": [{field: None}, in_window]}
+        return {"$or": [{field: None, "_id": {"$gt": _id}}, in_window]}
+    return {
+        "$or": [
+            {field: ts, "_id": {"$gt": _id}},
+            {field: {"$gt": ts, "$lte": horizon}},
+        ]
+    }
+
+
+def is_after_watermark(ts: Optional[datetime], _id: ObjectId, watermark: Watermark, horizon: datetime) -> bool:
+    """
+    Evaluates the filter built by `after_watermark` on one document, for stores
+    queried without Mongo.
+
+    Args:
+        ts (Optional[datetime]): The document's timestamp field.
+        _id (ObjectId): The document's id.
+        watermark (Watermark): The last (timestamp, _id) seen.
+        horizon (datetime): Upper bound of the timestamps to return.
+
+    Returns:
+        bool: True if the document comes after the watermark and isn't past the horizon.
+    """
+    if ts is not None and ts > horizon:
+        return False
+    return watermark_key((ts, _id)) > watermark_key(watermark)
+
+
+def watermark_key(watermark: Watermark) -> tuple:
+    """
+    Returns:
+        tuple: Sort key of a (timestamp, _id) pair in the order Mongo sorts them, a
+            missing timestamp or id first.
+    """
+    ts, _id = watermark
+    return (ts is not None, ts or datetime.min, _id is not None, _id.binary if _id else b"")
@@ -1,8 +1,88 @@
 # tasks.py
-from celery import Celery
+from typing import Iterable, Optional, Sequence
+from celery import Celery, group
+from .tracing import instrument_celery
+from .worker import instrument_task_metrics, instrument_worker_metrics
+from .database import get_sync_database
+from .dedup import rebuild_duplicates
+from .migrations import MigrationRunner
+from .archive import archive_candidates
+from .tenancy import recount_usage
+from .export import export_candidates as write_export, purge_exports
+
+app = Celery('tasks')
+app.config_from_object("codegrapher.app.celeryconfig")
+instrument_celery()
+instrument_task_metrics()
+instrument_worker_metrics(app)
+
+
+def chunked(task, items: Sequence, size: int, *args) -> group:
+    """
+    Splits `items` into batches of `size` and builds one call of `task` per batch, so
+    a large job runs in parallel across workers and a failed batch is retried alone.
+    Unlike `task.chunks`, each call receives its whole batch as a list and can process
+    it in bulk.
+
+    Args:
+        task: The task, called as `task(batch, *args)`.
+        items (Sequence): The items to process, JSON serializable.
+        size (int): Number of items per call.
+        *args: Extra arguments passed to every call.
+
+    Returns:
+        group: The calls, to start with `.apply_async()` or `.delay()`.
+    """
+    if size < 1:
+        raise ValueError("size must be positive")
+    items = list(items)
+    return group(task.s(items[start:start + size], *args) for start in range(0, len(items), size))
+
+
+def grouped(task, calls: Iterable[Sequence]) -> group:
+    """
+    Args:
+        task: The task.
+        calls (Iterable[Sequence]): Positional arguments of each call.
+
+    Returns:
+        group: One call of `task` per argument list, run in parallel.
+    """
+    return group(task.s(*args) for args in calls)
 
-app = Celery('tasks', broker='redis://localhost:6380/0')
 
 @app.task
 def add(x, y):
     return x + y
+
+
+@app.task
+def find_duplicates():
+    return rebuild_duplicates(get_sync_database())
+
+
+@app.task
+def export_candidates(tenant: str, since: Optional[str] = None):
+    task_id = export_candidates.request.id
+    return write_export(get_sync_database(), tenant, since, name=f"{task_id}.csv" if task_id else None)
+
+
+@app.task
+def purge_old_exports():
+    # Export files hold candidate data; drop them once their task result has expired.
+    return purge_exports(max_age=app.conf.result_expires)
+
+
+@app.task
+def run_migrations():
+    return MigrationRunner(get_sync_database()).run()
+
+
+@app.task
+def archive_inactive_candidates():
+    return archive_candidates(get_sync_database())
+
+
+@app.task
+def recount_tenant_usage():
+    return recount_usage(get_sync_database())
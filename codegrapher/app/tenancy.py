@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Optional
+from bson.errors import InvalidId
+from bson.max_key import MaxKey
+from bson.min_key import MinKey
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReplaceOne, UpdateOne
+from .archive import ARCHIVE_COLLECTION
+from .audit import AUDIT_COLLECTION
+from .metrics import Counter, Histogram
+from .sync import TOMBSTONE_COLLECTION, utcnow
+
+load_dotenv()
+
+# Tenant of every user and candidate created before tenancy. Users signing up since
+# are in no tenant, and can't read any candidate, until an administrator assigns one;
+# `assign_legacy_candidates` moves legacy candidates to their organization's tenant.
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default").lower()
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    mapping = {}
+    for item in value.split(","):
+        key, _, mapped = item.partition("=")
+        if key.strip() and mapped.strip():
+            mapping[key.strip().lower()] = mapped.strip()
+    return mapping
+
+
+# "acme.com=acme,acme.co.uk=acme": tenant that users with these email domains are
+# assigned to when an administrator confirms them, see `api.users.assign_tenant`.
+TENANT_DOMAINS = {domain: tenant.lower() for domain, tenant in _parse_mapping(os.getenv("TENANT_DOMAINS", "")).items()}
+# Maximum number of candidates per tenant, 0 for no limit, with per tenant overrides
+# as "acme=50000,globex=0".
+TENANT_CANDIDATE_QUOTA = int(os.getenv("TENANT_CANDIDATE_QUOTA", "0"))
+TENANT_QUOTAS = {tenant: int(quota) for tenant, quota in _parse_mapping(os.getenv("TENANT_QUOTAS", "")).items()}
+# "acme=zone-acme": tenants whose candidates are pinned to a shard zone by `shard_candidates`.
+TENANT_ZONES = _parse_mapping(os.getenv("TENANT_ZONES", ""))
+
+tenant_request_seconds = Histogram(
+    "tenant_request_duration_seconds", "HTTP request duration by tenant and route.", ("tenant", "route")
+)
+tenant_quota_rejections = Counter(
+    "tenant_quota_rejections_total", "Candidates refused because the tenant quota was reached.", ("tenant",)
+)
+
+
+def tenant_for_email(email: str, domains: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """
+    Args:
+        email (str): A user's email.
+        domains (Optional[Dict[str, str]]): Email domain to tenant, defaults to `TENANT_DOMAINS`.
+
+    Returns:
+        Optional[str]: The tenant assigned to the email domain, None if it has none.
+    """
+    domain = (email or "").rpartition("@")[2].lower()
+    return (TENANT_DOMAINS if domains is None else domains).get(domain)
+
+
+def tenant_filter(tenant: str) -> dict:
+    """
+    Args:
+        tenant (str): Tenant id.
+
+    Returns:
+        dict: Filter restricting a query to the tenant's documents. Documents written
+            before tenancy have no tenant_id and belong to `DEFAULT_TENANT`.
+    """
+    if tenant == DEFAULT_TENANT:
+        return {"tenant_id": {"$in": [DEFAULT_TENANT, None]}}
+    return {"tenant_id": tenant}
+
+
+def candidate_quota(tenant: str) -> int:
+    """
+    Returns:
+        int: Maximum number of candidates of the tenant, 0 for no limit.
+    """
+    return TENANT_QUOTAS.get(tenant.lower(), TENANT_CANDIDATE_QUOTA)
+
+
+def safe_tenant_name(tenant: str) -> str:
+    """
+    Returns:
+        str: The tenant id reduced to characters safe in file and collection names.
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", tenant)
+
+
+def recount_usage(db) -> dict:
+    """
+    Recomputes the candidate count of every tenant from the hot and archive
+    collections, correcting drift in the counters kept by the API.
+
+    Args:
+        db: A pymongo database.
+
+    Returns:
+        dict: Number of candidates per tenant.
+    """
+    pipeline = [
+        {"$match": {"deleted_at": None}},
+        {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": {"deleted_at": None}}]}},
+        {"$group": {"_id": {"$ifNull": ["$tenant_id", DEFAULT_TENANT]}, "candidates": {"$sum": 1}}},
+    ]
+    counts = {row["_id"]: row["candidates"] for row in db.candidate_collection.aggregate(pipeline)}
+    writes = [ReplaceOne({"_id": tenant}, {"candidates": count}, upsert=True) for tenant, count in counts.items()]
+    if writes:
+        db.tenant_usage.bulk_write(writes, ordered=False)
+    db.tenant_usage.update_many({"_id": {"$nin": list(counts)}}, {"$set": {"candidates": 0}})
+    return counts
+
+
+def legacy_candidate_tenants(db, domains: Optional[Dict[str, str]] = None) -> Dict[ObjectId, str]:
+    """
+    Finds the organization of candidates in `DEFAULT_TENANT` from who created them:
+    the actor of their "create" audit event, whose email domain is mapped to a tenant.
+
+    Args:
+        db: A pymongo database.
+        domains (Optional[Dict[str, str]]): Email domain to tenant, defaults to `TENANT_DOMAINS`.
+
+    Returns:
+        Dict[ObjectId, str]: Tenant of each candidate whose creator's domain is mapped.
+    """
+    tenants = {}
+    events = db[AUDIT_COLLECTION].find({"action": "create", **tenant_filter(DEFAULT_TENANT)}, {"candidate_id": 1, "actor": 1})
+    for event in events:
+        tenant = tenant_for_email(event["actor"], domains)
+        if tenant and tenant != DEFAULT_TENANT:
+            try:
+                tenants[ObjectId(event["candidate_id"])] = tenant
+            except InvalidId:
+                continue
+    return tenants
+
+
+def assign_legacy_candidates(db, tenants: Dict[ObjectId, str], batch_size: int = 1000) -> dict:
+    """
+    Moves candidates of `DEFAULT_TENANT`, hot and archived, to the given tenants.
+
+    Moved hot candidates get a tombstone in the default tenant and a new `updated_at`,
+    so the sync clients of both tenants see the move; this also restarts their
+    archival inactivity clock. Their duplicate signatures and pending pairs are
+    dropped until the next duplicate rebuild, and their tenants' usage is adjusted.
+
+    Args:
+        db: A pymongo database.
+        tenants (Dict[ObjectId, str]): Tenant to move each candidate to, e.g. from
+            `legacy_candidate_tenants`. Candidates no longer in the default tenant are skipped.
+        batch_size (int): Number of candidates moved per batch.
+
+    Returns:
+        dict: Number of candidates moved to each tenant.
+    """
+    from .dedup import DUPLICATE_COLLECTION, SIGNATURE_COLLECTION
+
+    moved = defaultdict(int)
+    counted = defaultdict(int)
+    ids = sorted(tenants)
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        query = {"_id": {"$in": batch}, **tenant_filter(DEFAULT_TENANT)}
+        now = utcnow()
+        for collection, hot in ((db.candidate_collection, True), (db[ARCHIVE_COLLECTION], False)):
+            candidates = list(collection.find(query, {"deleted_at": 1}))
+            if not candidates:
+                continue
+            # Soft deleted and archived candidates already have their tombstone.
+            leaving = [candidate["_id"] for candidate in candidates if hot and not candidate.get("deleted_at")]
+            if leaving:
+                db[TOMBSTONE_COLLECTION].insert_many(
+                    [{"candidate_id": _id, "tenant_id": DEFAULT_TENANT, "deleted_at": now} for _id in leaving], ordered=False
+                )
+            writes = []
+            for candidate in candidates:
+                fields = {"tenant_id": tenants[candidate["_id"]]}
+                if candidate["_id"] in leaving:
+                    fields["updated_at"] = now
+                writes.append(UpdateOne({"_id": candidate["_id"], **tenant_filter(DEFAULT_TENANT)}, {"$set": fields}))
+                moved[tenants[candidate["_id"]]] += 1
+                if not candidate.get("deleted_at"):
+                    counted[tenants[candidate["_id"]]] += 1
+            collection.bulk_write(writes, ordered=False)
+        db[SIGNATURE_COLLECTION].delete_many({"candidate_id": {"$in": batch}})
+        db[DUPLICATE_COLLECTION].delete_many({"candidate_ids": {"$in": batch}, "status": "pending"})
+    usage = [UpdateOne({"_id": tenant}, {"$inc": {"candidates": count}}, upsert=True) for tenant, count in counted.items()]
+    if usage:
+        usage.append(UpdateOne({"_id": DEFAULT_TENANT}, {"$inc": {"candidates": -sum(counted.values())}}))
+        db.tenant_usage.bulk_write(usage, ordered=False)
+    return dict(moved)
+
+
+def shard_candidates(client, database: str = "Graphers", zones: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Shards the candidate collection on (tenant_id, _id) so each tenant's candidates
+    are stored together, and pins tenants listed in `zones` to their shard zone. Run
+    once against a sharded cluster's mongos; the zones must already have shards
+    assigned (`addShardToZone`).
+
+    Args:
+        client: A pymongo client connected to mongos.
+        database (str): Database name.
+        zones (Optional[Dict[str, str]]): Tenant to zone name, defaults to `TENANT_ZONES`.
+
+    Returns:
+        dict: The namespace and the zones configured.
+    """
+    namespace = f"{database}.candidate_collection"
+    zones = TENANT_ZONES if zones is None else zones
+    client.admin.command("enableSharding", database)
+    client.admin.command("shardCollection", namespace, key={"tenant_id": 1, "_id": 1})
+    for tenant, zone in zones.items():
+        client.admin.command(
+            "updateZoneKeyRange",
+            namespace,
+            min={"tenant_id": tenant, "_id": MinKey()},
+            max={"tenant_id": tenant, "_id": MaxKey()},
+            zone=zone,
+        )
+    return {"namespace": namespace, "zones": zones}
+
+
+def main(argv=None):
+    from .database import get_sync_database
+
+    parser = argparse.ArgumentParser(description="Tenant maintenance.")
+    parser.add_argument("command", choices=["recount", "shard", "assign-legacy"])
+    parser.add_argument("--tenant", help="assign-legacy: tenant to move the --candidates to")
+    parser.add_argument(
+        "--candidates",
+        help="assign-legacy: comma separated candidate ids, instead of finding tenants from the audit log",
+    )
+    args = parser.parse_args(argv)
+    db = get_sync_database()
+    if args.command == "recount":
+        result = recount_usage(db)
+    elif args.command == "shard":
+        result = shard_candidates(db.client, db.name)
+    elif args.candidates:
+        if not args.tenant:
+            parser.error("--candidates needs --tenant")
+        ids = [ObjectId(_id.strip()) for _id in args.candidates.split(",") if _id.strip()]
+        result = assign_legacy_candidates(db, {_id: args.tenant.lower() for _id in ids})
+    else:
+        result = assign_legacy_candidates(db, legacy_candidate_tenants(db))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+load_dotenv()
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "codegrapher")
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "512"))
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "4096"))
+TRACEPARENT_HEADER = "traceparent"
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+logger = logging.getLogger(__name__)
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    def traceparent(self) -> str:
+        """
+        Returns:
+            str: The context as a W3C `traceparent` value.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value) -> Optional[SpanContext]:
+    """
+    Args:
+        value: A W3C `traceparent` value, or anything else.
+
+    Returns:
+        Optional[SpanContext]: The parsed context, or None if the value is not a valid traceparent.
+    """
+    if not isinstance(value, str):
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+class Span:
+    """
+    A timed operation within a trace. Unsampled spans keep their context so the sampling
+    decision propagates, but are never exported.
+
+    Attributes:
+        name (str): Name of the operation.
+        context (SpanContext): Identity of the span.
+        parent_id (Optional[str]): Span id of the parent, None for a root span.
+        kind (str): One of `SPAN_KINDS`.
+        attributes (dict): Key/value attributes.
+    """
+
+    def __init__(self, name: str, parent: Optional[SpanContext] = None, kind: str = "internal", attributes: dict = None):
+        if parent is None:
+            trace_id = f"{random.getrandbits(128):032x}"
+            sampled = processor.exporter is not None and random.random() < TRACE_SAMPLE_RATE
+        else:
+            trace_id, sampled = parent.trace_id, parent.sampled
+        self.name = name
+        self.context = SpanContext(trace_id, f"{random.getrandbits(64):016x}", sampled)
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.context.sampled:
+            processor.submit(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": TRACE_SERVICE_NAME,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class JsonLinesExporter:
+    """
+    Appends spans to a local file, one JSON document per line.
+    """
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def export(self, spans: list):
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """
+    Sends spans to an OpenTelemetry collector using OTLP/HTTP with a JSON body.
+    """
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, timeout: float = 10):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def _span(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": span.context.trace_id,
+            "spanId": span.context.span_id,
+            "name": span.name,
+            "kind": SPAN_KINDS[span.kind],
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return otlp_span
+
+    def export(self, spans: list):
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "codegrapher"}, "spans": [self._span(s) for s in spans]}],
+            }]
+        }
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class BatchSpanProcessor:
+    """
+    Buffers finished spans in a bounded queue and exports them from a background thread,
+    in batches of `batch_size` or every `interval` seconds. Spans are dropped when the
+    queue is full rather than slowing down requests.
+    """
+
+    def __init__(self, exporter=None, batch_size: int = TRACE_BATCH_SIZE, interval: float = TRACE_EXPORT_INTERVAL):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._flush_requested = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, span: Span):
+        if self.exporter is None:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._flush_requested.wait(self.interval)
+            self._flush_requested.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Exports every queued span now.
+        """
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.error("Failed to export %d spans: %s", len(batch), e)
+
+
+def build_exporter(name: str = TRACE_EXPORTER):
+    """
+    Args:
+        name (str): "jsonl", "otlp" or "none".
+
+    Returns:
+        The exporter, or None when tracing export is disabled.
+    """
+    if name == "jsonl":
+        return JsonLinesExporter()
+    if name == "otlp":
+        return OtlpHttpExporter()
+    return None
+
+
+processor = BatchSpanProcessor(build_exporter())
+atexit.register(processor.flush)
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def tracing_enabled() -> bool:
+    """
+    Returns:
+        bool: False when `TRACE_EXPORTER` is "none", in which case requests, functions
+            and tasks are not traced at all.
+    """
+    return processor.exporter is not None
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", parent: Optional[SpanContext] = None, attributes: dict = None):
+    """
+    Starts a span as a child of `parent`, or of the current span, and makes it current.
+
+    Args:
+        name (str): Name of the operation.
+        kind (str): One of `SPAN_KINDS`.
+        parent (Optional[SpanContext]): Explicit parent, e.g. extracted from a `traceparent`.
+        attributes (dict): Initial attributes.
+
+    Yields:
+        Span: The started span, ended when the block exits.
+    """
+    if parent is None and current_span() is not None:
+        parent = current_span().context
+    span = Span(name, parent=parent, kind=kind, attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def traced(name: str):
+    """
+    Decorator recording each call of a sync or async function as a span.
+
+    Args:
+        name (str): Name of the span.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracing_enabled():
+                    return await func(*args, **kwargs)
+                with start_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracing_enabled():
+                return func(*args, **kwargs)
+            with start_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Records a client span for every Mongo command issued within a sampled span, as a
+    child of that span. pymongo calls the listener on the thread issuing the command,
+    and Motor runs pymongo on its thread pool with a copy of the calling coroutine's
+    context, so the current span is the caller's for sync and Motor calls alike.
+    """
+
+    def __init__(self):
+        self._spans = {}
+
+    @staticmethod
+    def _key(event):
+        return (event.request_id, event.connection_id, event.operation_id)
+
+    def started(self, event):
+        parent = current_span()
+        if parent is None or not parent.context.sampled:
+            return
+        collection = event.command.get(event.command_name)
+        span = Span(
+            f"mongo.{event.command_name}",
+            parent=parent.context,
+            kind="client",
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+            },
+        )
+        if isinstance(collection, str):
+            span.set_attribute("db.mongodb.collection", collection)
+        self._spans[self._key(event)] = span
+
+    def succeeded(self, event):
+        span = self._spans.pop(self._key(event), None)
+        if span is not None:
+            span.end()
+
+    def failed(self, event):
+        span = self._spans.pop(self._key(event), None)
+        if span is not None:
+            span.error = str(event.failure.get("errmsg", event.failure))
+            span.end()
+
+
+_celery_spans = {}
+
+
+def _task_traceparent(task) -> Optional[SpanContext]:
+    request = task.request
+    value = getattr(request, TRACEPARENT_HEADER, None) or (getattr(request, "headers", None) or {}).get(TRACEPARENT_HEADER)
+    return parse_traceparent(value)
+
+
+def instrument_celery():
+    """
+    Connects Celery signals so that publishing and executing a task are recorded as spans,
+    with the trace context carried in the task message headers.
+    """
+    from celery import signals
+
+    @signals.before_task_publish.connect(weak=False)
+    def on_publish(sender=None, headers=None, **kwargs):
+        if not tracing_enabled():
+            return
+        parent = current_span().context if current_span() is not None else None
+        span = Span(f"celery.publish {sender}", parent=parent, kind="producer")
+        span.set_attribute("celery.task_id", headers.get("id"))
+        headers[TRACEPARENT_HEADER] = span.context.traceparent()
+        _celery_spans[("publish", headers.get("id"))] = span
+
+    @signals.after_task_publish.connect(weak=False)
+    def on_published(sender=None, headers=None, **kwargs):
+        span = _celery_spans.pop(("publish", headers.get("id")), None)
+        if span is not None:
+            span.end()
+
+    @signals.task_prerun.connect(weak=False)
+    def on_prerun(task_id=None, task=None, **kwargs):
+        if not tracing_enabled():
+            return
+        span = Span(f"celery.run {task.name}", parent=_task_traceparent(task), kind="consumer")
+        span.set_attribute("celery.task_id", task_id)
+        _celery_spans[("run", task_id)] = (span, _current_span.set(span))
+
+    @signals.task_failure.connect(weak=False)
+    def on_failure(task_id=None, exception=None, **kwargs):
+        entry = _celery_spans.get(("run", task_id))
+        if entry is not None:
+            entry[0].record_exception(exception)
+
+    @signals.task_postrun.connect(weak=False)
+    def on_postrun(task_id=None, state=None, **kwargs):
+        entry = _celery_spans.pop(("run", task_id), None)
+        if entry is not None:
+            span, token = entry
+            span.set_attribute("celery.state", state)
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                _current_span.set(None)
+            span.end()
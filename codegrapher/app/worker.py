@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from kombu.exceptions import ChannelError
+from dotenv import load_dotenv
+from .metrics import Counter, Gauge, Histogram, render_metrics
+
+load_dotenv()
+
+# First port workers serve their own /metrics on, 0 to disable. Task durations are
+# recorded in the process running the task, so the API's /metrics doesn't see them:
+# each prefork child serves on this port plus its index, a solo or threads worker on
+# this port.
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", "0"))
+
+task_seconds = Histogram(
+    "celery_task_duration_seconds", "Celery task run time, by task and final state.", ("task", "state")
+)
+tasks_total = Counter("celery_tasks_total", "Celery tasks run, by task and final state.", ("task", "state"))
+
+_started: Dict[str, float] = {}
+
+
+def instrument_task_metrics():
+    """
+    Connects Celery signals so that the duration and outcome of every task run by this
+    process are recorded.
+    """
+    from celery import signals
+
+    @signals.task_prerun.connect(weak=False)
+    def on_prerun(task_id=None, **kwargs):
+        _started[task_id] = time.perf_counter()
+
+    @signals.task_postrun.connect(weak=False)
+    def on_postrun(task_id=None, task=None, state=None, **kwargs):
+        started = _started.pop(task_id, None)
+        if started is None:
+            return
+        task_seconds.observe(time.perf_counter() - started, task=task.name, state=state)
+        tasks_total.inc(task=task.name, state=state)
+
+
+def queue_depths(app) -> Dict[Tuple[str, ...], float]:
+    """
+    Args:
+        app: The Celery application.
+
+    Returns:
+        Dict[Tuple[str, ...], float]: Number of messages waiting in each configured
+            queue, empty if the broker can't be reached.
+    """
+    depths = {}
+    try:
+        with app.connection_for_read(connect_timeout=2) as connection:
+            connection.ensure_connection(max_retries=1)
+            channel = connection.default_channel
+            for queue in app.conf.task_queues:
+                try:
+                    depths[(queue.name,)] = channel.queue_declare(queue.name, passive=True).message_count
+                except ChannelError:
+                    # Not declared yet: no worker consumed it and nothing was sent to it.
+                    depths[(queue.name,)] = 0
+                    channel = connection.channel()
+    except Exception:
+        return {}
+    return depths
+
+
+def register_queue_depth(app) -> Gauge:
+    """
+    Exposes the depth of the application's queues, read from the broker at scrape time.
+    Reading it blocks on the broker, so only worker processes, which serve /metrics
+    from a thread, register it.
+
+    Args:
+        app: The Celery application.
+
+    Returns:
+        Gauge: The queue depth gauge.
+    """
+    return Gauge("celery_queue_depth", "Messages waiting in each Celery queue.", ("queue",),
+                 callback=lambda: queue_depths(app))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int = CELERY_METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves /metrics from a background thread of the worker.
+
+    Args:
+        port (int): Port to listen on, 0 to not serve.
+
+    Returns:
+        Optional[ThreadingHTTPServer]: The running server, None if disabled.
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def instrument_worker_metrics(app, port: int = CELERY_METRICS_PORT):
+    """
+    Connects Celery signals so that every process running tasks serves its metrics,
+    queue depths included. Processes importing the tasks without running them, like
+    the API, are left alone.
+
+    Args:
+        app: The Celery application.
+        port (int): First port, 0 to not serve.
+    """
+    from billiard.process import current_process
+    from celery import signals
+    from celery.concurrency.prefork import TaskPool
+
+    if not port:
+        return
+
+    @signals.worker_init.connect(weak=False)
+    def on_init(**kwargs):
+        # Before prefork children are started, so they inherit it.
+        register_queue_depth(app)
+
+    @signals.worker_process_init.connect(weak=False)
+    def on_process_init(**kwargs):
+        serve_metrics(port + getattr(current_process(), "index", 0))
+
+    @signals.worker_ready.connect(weak=False)
+    def on_ready(sender=None, **kwargs):
+        if not isinstance(getattr(sender, "pool", None), TaskPool):
+            serve_metrics(port)
@@ -1,12 +1,42 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from codegrapher.app.routes.user import UserRouter
 from codegrapher.app.routes.candidate import CandidateRouter
+from codegrapher.app.routes.profiling import ProfilingRouter
+from codegrapher.app.routes.duplicates import DuplicateRouter
+from codegrapher.app.routes.migrations import MigrationRouter
+from codegrapher.app.routes.audit import AuditRouter
+from codegrapher.app.routes.tenants import TenantRouter
 from starlette.middleware.base import BaseHTTPMiddleware
-from codegrapher.middleware import log_middleware, custom_exception_handler
+from codegrapher.middleware import (
+    log_middleware,
+    custom_exception_handler,
+    deadline_exception_handler,
+    DeadlineMiddleware,
+    CompressionMiddleware,
+    ProfilingMiddleware,
+    TracingMiddleware,
+    StalenessMiddleware,
+    IdempotencyMiddleware,
+    TenantMetricsMiddleware,
+    circuit_open_exception_handler,
+)
+from codegrapher.app.deadline import DeadlineExceeded
+from codegrapher.app.tracing import processor as span_processor
+from codegrapher.app.circuit_breaker import CircuitOpenError
+from codegrapher.app.metrics import render_metrics
+from pymongo.errors import ExecutionTimeout
 from .app.database import test_connection
+from .app.api.candidate import create_candidate_indexes
+from .app.idempotency import create_idempotency_indexes
+from .app.api.audit import create_audit_indexes, audit_log
+import asyncio
+import logging
 import sentry_sdk
 import uvicorn
 
+logger = logging.getLogger(__name__)
+
 sentry_sdk.init(
     dsn="https://97c681481521e0fb4e21cf936b947be7@o4507296032358400.ingest.us.sentry.io/4507296035438592",
     # Set traces_sample_rate to 1.0 to capture 100%
@@ -20,6 +50,17 @@ sentry_sdk.init(
 
 app = FastAPI(title="Fast API", description="This is Code Graphers API's ")
 app.add_middleware(BaseHTTPMiddleware, dispatch=log_middleware)
+app.add_middleware(StalenessMiddleware)
+app.add_middleware(TenantMetricsMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TracingMiddleware)
+
+app.add_exception_handler(DeadlineExceeded, deadline_exception_handler)
+app.add_exception_handler(ExecutionTimeout, deadline_exception_handler)
+app.add_exception_handler(CircuitOpenError, circuit_open_exception_handler)
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
@@ -28,10 +69,28 @@ async def general_exception_handler(request: Request, exc: Exception):
 @app.on_event("startup")
 async def startup_event():
     await test_connection()
+    audit_log.start()
+    try:
+        await create_candidate_indexes()
+        await create_idempotency_indexes()
+        await create_audit_indexes()
+    except Exception:
+        logger.exception("Failed to create indexes")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await audit_log.stop()
+    # Exporting may block on the collector.
+    await asyncio.to_thread(span_processor.flush)
     
 
 app.include_router(UserRouter, tags=["User"])
 app.include_router(CandidateRouter, tags=["Candidate"], prefix="/candidate")
+app.include_router(DuplicateRouter, tags=["Duplicates"], prefix="/duplicates")
+app.include_router(ProfilingRouter, tags=["Admin"], prefix="/admin/profiles")
+app.include_router(MigrationRouter, tags=["Admin"], prefix="/admin/migrations")
+app.include_router(AuditRouter, tags=["Admin"], prefix="/admin/audit")
+app.include_router(TenantRouter, tags=["Tenant"], prefix="/tenant")
 
     
 
@@ -40,5 +99,10 @@ async def health_check():
     return {"status": "ok", "message": "API is running"}
 
 
+@app.get("/metrics", tags=["API Health"], response_class=PlainTextResponse)
+async def metrics():
+    return render_metrics()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8008, reload=True)
\ No newline at end of file
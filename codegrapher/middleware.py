@@ -1,7 +1,39 @@
 from fastapi import Request
 from starlette.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.routing import Match
+from pymongo.errors import PyMongoError
+from codegrapher.app.deadline import (
+    Deadline,
+    DEFAULT_REQUEST_TIMEOUT,
+    MAX_REQUEST_TIMEOUT,
+    TIMEOUT_HEADER,
+    set_deadline,
+    reset_deadline,
+)
+from codegrapher.app.compression import (
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_OFFLOAD_SIZE,
+    negotiate_encoding,
+    is_compressible,
+    get_compressor,
+)
+from codegrapher.app.profiling import (
+    PROFILE_HEADER,
+    PROFILE_QUERY_FLAG,
+    RouteSampler,
+    SamplingProfiler,
+    profile_file_name,
+)
+from codegrapher.app.tracing import TRACEPARENT_HEADER, parse_traceparent, start_span, tracing_enabled
+from codegrapher.app.circuit_breaker import CircuitOpenError, track_staleness, stop_tracking_staleness, staleness
+from codegrapher.app import idempotency
+from codegrapher.app.tenancy import tenant_request_seconds
+from codegrapher.app.api.users import is_admin_token, token_subject
+import asyncio
 import logging
 import sys
+import time
 
 logger = logging.getLogger()
 
@@ -22,8 +54,544 @@ async def log_middleware(request: Request, call_next):
     logger.info(f"Response log {response.status_code}")
     return response
 
+def route_path(scope) -> str:
+    """
+    Resolves the route template ("/candidate/{id}") matching a request, before routing.
+
+    Args:
+        scope (dict): The ASGI scope.
+
+    Returns:
+        str: The route template, or the raw path if no route matches.
+    """
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return scope["path"]
+
 async def custom_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
         status_code=500,
         content={"message": str(exc)},
     )
+
+async def deadline_exception_handler(request: Request, exc: Exception):
+    return JSONResponse(
+        status_code=504,
+        content={"message": "Request deadline exceeded"},
+    )
+
+
+async def circuit_open_exception_handler(request: Request, exc: Exception):
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(max(int(exc.retry_after), 1))},
+    )
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware giving every HTTP request a time budget.
+
+    The budget defaults to `REQUEST_TIMEOUT`, can be set per route with the
+    `request_budget` dependency, or by the client through the `X-Request-Timeout`
+    header (seconds, capped at `MAX_REQUEST_TIMEOUT`). The handler is cancelled when
+    the budget runs out, answering 504 if nothing was sent yet, and also when the
+    client disconnects.
+    """
+
+    def __init__(self, app, default_timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.app = app
+        self.default_timeout = default_timeout
+
+    def _initial_deadline(self, scope) -> Deadline:
+        for name, value in scope.get("headers", []):
+            if name.decode("latin-1") == TIMEOUT_HEADER:
+                try:
+                    budget = float(value)
+                except ValueError:
+                    break
+                if budget > 0:
+                    return Deadline(min(budget, MAX_REQUEST_TIMEOUT), explicit=True)
+        return Deadline(self.default_timeout)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = self._initial_deadline(scope)
+        body_received = asyncio.Event()
+        disconnected = asyncio.Event()
+        response_started = False
+        # Without a body (GET searches and reports) the listener owns `receive` from
+        # the start, and the app is handed an empty body if it asks for one.
+        empty_body_pending = not self._has_body(scope)
+        if empty_body_pending:
+            body_received.set()
+
+        async def wrapped_receive():
+            nonlocal empty_body_pending
+            # Once the body is read the listener below owns `receive`; the app
+            # only gets to observe the disconnect.
+            if body_received.is_set():
+                if empty_body_pending:
+                    empty_body_pending = False
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_received.set()
+            return message
+
+        async def wrapped_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        async def listen_for_disconnect():
+            await body_received.wait()
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        token = set_deadline(deadline)
+        try:
+            handler = asyncio.create_task(self.app(scope, wrapped_receive, wrapped_send))
+        finally:
+            reset_deadline(token)
+        listener = asyncio.create_task(listen_for_disconnect())
+        client_gone = asyncio.create_task(disconnected.wait())
+        try:
+            while not handler.done():
+                deadline.changed.clear()
+                budget_changed = asyncio.create_task(deadline.changed.wait())
+                done, _ = await asyncio.wait(
+                    {handler, client_gone, budget_changed},
+                    timeout=deadline.remaining(),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                budget_changed.cancel()
+                if handler in done:
+                    break
+                if client_gone in done:
+                    logger.info(f"Client disconnected, cancelling {scope['method']} {scope['path']}")
+                    await self._cancel(handler)
+                    return
+                if deadline.expired():
+                    logger.warning(f"Deadline exceeded for {scope['method']} {scope['path']}")
+                    await self._cancel(handler)
+                    if not response_started:
+                        response = await deadline_exception_handler(None, None)
+                        await response(scope, receive, send)
+                    return
+            handler.result()
+        finally:
+            listener.cancel()
+            client_gone.cancel()
+            if not handler.done():
+                await self._cancel(handler)
+
+    @staticmethod
+    def _has_body(scope) -> bool:
+        headers = Headers(scope=scope)
+        if scope["method"] not in ("POST", "PUT", "PATCH", "DELETE"):
+            return False
+        if "transfer-encoding" in headers:
+            return True
+        return headers.get("content-length", "0").strip() not in ("", "0")
+
+    @staticmethod
+    async def _cancel(task: asyncio.Task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Cancelled request raised {e!r}")
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies with gzip, brotli or zstd.
+
+    The encoding is negotiated from `Accept-Encoding`. Bodies are compressed chunk by
+    chunk so streaming and file responses keep streaming. Responses smaller than
+    `minimum_size`, already encoded, or of an already compressed media type are sent
+    as is. Chunks of at least `offload_size` bytes are compressed in a worker thread
+    so large exports do not block the event loop.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        offload_size: int = COMPRESSION_OFFLOAD_SIZE,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def compress(data: bytes, final: bool) -> bytes:
+            if len(data) >= self.offload_size:
+                body = await asyncio.to_thread(compressor.compress, data)
+            else:
+                body = compressor.compress(data)
+            if final:
+                body += compressor.flush()
+            return body
+
+        async def wrapped_send(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                declared_size = headers.get("content-length")
+                too_small = (not more_body and len(body) < self.minimum_size) or (
+                    declared_size is not None and int(declared_size) < self.minimum_size
+                )
+                if (
+                    too_small
+                    or start_message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = get_compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                else:
+                    body = await compress(body, final=True)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            body = await compress(body, final=not more_body)
+            if body or not more_body:
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, wrapped_send)
+        if start_message is not None and compressor is None and not passthrough:
+            # The app started a response without ever sending a body message.
+            await send(start_message)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests with a sampling profiler.
+
+    An administrator profiles a single request by sending the `X-Profile: 1` header or
+    the `__profile=1` query flag along with their bearer token. Independently, the
+    route sampler profiles a share of each route's requests (`PROFILE_SAMPLE_RATE`,
+    at most `PROFILE_MAX_PER_MINUTE` per route). The stored file name is returned in
+    the `X-Profile-Id` response header. When neither applies the request is passed
+    through untouched.
+    """
+
+    def __init__(self, app, sampler: RouteSampler = None):
+        self.app = app
+        self.sampler = sampler or RouteSampler()
+
+    def _requested(self, scope) -> bool:
+        headers = Headers(scope=scope)
+        flag = headers.get(PROFILE_HEADER) or QueryParams(scope.get("query_string", b"")).get(PROFILE_QUERY_FLAG)
+        if flag not in ("1", "true"):
+            return False
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and is_admin_token(token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self._requested(scope):
+            route = route_path(scope)
+        elif self.sampler.enabled:
+            route = route_path(scope)
+            if not self.sampler.should_sample(route):
+                await self.app(scope, receive, send)
+                return
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler(f"{scope['method']} {route}")
+        if not profiler.start():
+            await self.app(scope, receive, send)
+            return
+        file_name = profile_file_name(scope["method"], route)
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])["X-Profile-Id"] = file_name
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            profiler.stop()
+            await asyncio.to_thread(profiler.save, file_name)
+            logger.info(f"Profile of {scope['method']} {scope['path']} saved as {file_name}")
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware recording a server span per request, continuing the trace of an
+    incoming W3C `traceparent` header. Does nothing while tracing is disabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracing_enabled():
+            await self.app(scope, receive, send)
+            return
+        route = route_path(scope)
+        parent = parse_traceparent(Headers(scope=scope).get(TRACEPARENT_HEADER))
+        attributes = {"http.method": scope["method"], "http.route": route, "http.target": scope["path"]}
+        with start_span(f"{scope['method']} {route}", kind="server", parent=parent, attributes=attributes) as span:
+
+            async def wrapped_send(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, wrapped_send)
+
+
+class StalenessMiddleware:
+    """
+    ASGI middleware flagging responses built from stale cached reads, served while the
+    database circuit breaker is open. Such responses carry `X-Data-Staleness` (age in
+    seconds of the oldest cached read) and a `Warning: 110` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                age = staleness()
+                if age is not None:
+                    headers = MutableHeaders(raw=message["headers"])
+                    headers["X-Data-Staleness"] = str(int(age))
+                    headers["Warning"] = '110 - "Response is Stale"'
+            await send(message)
+
+        token = track_staleness()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            stop_tracking_staleness(token)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware honouring the `Idempotency-Key` header on `IDEMPOTENT_ROUTES`.
+
+    The first request with a key runs normally and its response is stored. Retries
+    with the same key get the stored response back (with `Idempotent-Replayed: true`)
+    without reaching the route. A retry arriving while the original is still running
+    waits for it. Reusing a key for a different body is rejected with 422, and failed
+    (5xx) requests release their key so they can be retried. A key whose owner crashed
+    is taken over by a retry once its lease (`IDEMPOTENCY_LEASE`) runs out. While the
+    idempotency store is down, requests run without it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    async def _release(key: str):
+        try:
+            await idempotency.release(key)
+        except Exception as e:
+            logger.warning(f"Failed to release idempotency key {key}: {e}")
+
+    @staticmethod
+    async def _claim(key: str, request_fingerprint: str):
+        """
+        Returns:
+            Optional[dict]: None if this request owns the key and must run, else the
+                completed record to replay.
+
+        Raises:
+            IdempotencyConflict: If the key belongs to a different request or its
+                owner is still running.
+        """
+        record = await idempotency.claim(key, request_fingerprint)
+        if record is not None and record["status"] != idempotency.COMPLETED:
+            if record["fingerprint"] == request_fingerprint:
+                record = await idempotency.wait_for_completion(key)
+            if record is None:
+                # The owner failed or its lease ran out: take the key over if it's free.
+                record = await idempotency.claim(key, request_fingerprint)
+        if record is None:
+            return None
+        if record["fingerprint"] != request_fingerprint:
+            raise idempotency.IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+        if record["status"] != idempotency.COMPLETED:
+            raise idempotency.IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+        return record
+
+    @staticmethod
+    def _body_receive(body: bytes, receive):
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay_receive
+
+    @staticmethod
+    async def _replay(send, record):
+        response = record["response"]
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": response["body"]})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in idempotency.IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(idempotency.IDEMPOTENCY_HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > idempotency.IDEMPOTENCY_MAX_KEY_LENGTH:
+            response = JSONResponse(status_code=400, content={"detail": "Idempotency-Key is too long"})
+            await response(scope, receive, send)
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        _, _, token = headers.get("authorization", "").partition(" ")
+        scoped = idempotency.scoped_key(scope["method"], scope["path"], key, token_subject(token) if token else None)
+        request_fingerprint = idempotency.fingerprint(scope["method"], scope["path"], body)
+
+        try:
+            record = await self._claim(scoped, request_fingerprint)
+            if record is not None:
+                await self._replay(send, record)
+                return
+        except idempotency.IdempotencyConflict as e:
+            response = JSONResponse(status_code=e.status_code, content={"detail": str(e)})
+            await response(scope, receive, send)
+            return
+        except (CircuitOpenError, PyMongoError) as e:
+            # Better to risk running a retry twice than to refuse every write.
+            logger.warning(f"Idempotency store unavailable, running the request without it: {e}")
+            await self.app(scope, self._body_receive(body, receive), send)
+            return
+
+        start_message = None
+        response_chunks = []
+
+        async def capturing_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, self._body_receive(body, receive), capturing_send)
+        except BaseException:
+            await self._release(scoped)
+            raise
+        if start_message is None or start_message["status"] >= 500:
+            await self._release(scoped)
+            return
+        stored_headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in start_message.get("headers", [])
+            if name.lower() not in (b"content-encoding", b"content-length")
+        ]
+        try:
+            await idempotency.complete(scoped, start_message["status"], stored_headers, b"".join(response_chunks))
+        except (CircuitOpenError, PyMongoError) as e:
+            # The response is already sent; a retry takes the key over once its lease runs out.
+            logger.warning(f"Failed to store the response for idempotency key {scoped}: {e}")
+
+
+class TenantMetricsMiddleware:
+    """
+    ASGI middleware recording request durations per tenant and route, so one tenant's
+    latency can be told apart from another's. The tenant is the one the route's
+    `get_current_tenant` dependency resolved; unauthenticated requests are not recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Shared with `request.state` even if an inner layer copies the scope.
+        state = scope.setdefault("state", {})
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tenant = state.get("tenant")
+            if tenant is not None:
+                tenant_request_seconds.observe(time.perf_counter() - started, tenant=tenant, route=route_path(scope))
@@ -0,0 +1,195 @@
+import copy
+import os
+from types import SimpleNamespace
+import pytest
+from bson.objectid import ObjectId
+
+# Tasks are sent through an in-memory broker and result backend, so the suite runs
+# without Redis. Set before codegrapher.app.celeryconfig is first imported.
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+
+def _compare(operator):
+    def compare(value, operand):
+        return value is not None and operator(value, operand)
+    return compare
+
+
+def _equals(value, operand) -> bool:
+    if isinstance(value, list) and not isinstance(operand, list):
+        return operand in value
+    return value == operand
+
+
+_OPERATORS = {
+    "$eq": _equals,
+    "$ne": lambda value, operand: not _equals(value, operand),
+    "$lt": _compare(lambda value, operand: value < operand),
+    "$lte": _compare(lambda value, operand: value <= operand),
+    "$gt": _compare(lambda value, operand: value > operand),
+    "$gte": _compare(lambda value, operand: value >= operand),
+    "$in": lambda value, operand: any(_equals(value, item) for item in operand),
+    "$nin": lambda value, operand: not any(_equals(value, item) for item in operand),
+    "$not": lambda value, operand: not _condition(value, operand),
+}
+
+
+def _condition(value, condition) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        return all(_OPERATORS[op](value, operand) for op, operand in condition.items())
+    return _equals(value, condition)
+
+
+def _get(document: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def matches(document: dict, query: dict) -> bool:
+    """
+    Evaluates the subset of the Mongo query language the sync jobs use. A missing
+    field compares as None, like in Mongo.
+    """
+    for field, condition in query.items():
+        if field == "$and":
+            matched = all(matches(document, part) for part in condition)
+        elif field == "$or":
+            matched = any(matches(document, part) for part in condition)
+        else:
+            matched = _condition(_get(document, field), condition)
+        if not matched:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction=1):
+        keys = [(key, direction)] if isinstance(key, str) else key
+        documents = self.documents
+        for field, order in reversed(keys):
+            documents = sorted(documents, key=lambda document: _get(document, field), reverse=order < 0)
+        return FakeCursor(documents)
+
+    def skip(self, count):
+        return FakeCursor(self.documents[count:])
+
+    def limit(self, count):
+        return FakeCursor(self.documents[:count] if count else self.documents)
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class FakeCollection:
+    """
+    Just enough of a pymongo collection for the sync jobs. Write models are applied
+    through `_add_to_bulk`, the way pymongo itself reads them.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.indexes = []
+
+    def create_index(self, keys, **kwargs):
+        self.indexes.append(keys)
+
+    def create_indexes(self, indexes):
+        self.indexes.extend(index.document["key"] for index in indexes)
+
+    def find(self, query=None, projection=None):
+        found = [copy.deepcopy(document) for document in self.documents.values() if matches(document, query or {})]
+        if projection:
+            fields = {"_id", *(field for field, included in projection.items() if included)}
+            found = [{key: value for key, value in document.items() if key in fields} for document in found]
+        return FakeCursor(found)
+
+    def find_one(self, query=None, projection=None):
+        return next(iter(self.find(query, projection)), None)
+
+    def insert_one(self, document):
+        self.add_insert(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            self.add_insert(document)
+
+    def update_one(self, query, update, upsert=False):
+        self.add_update(query, update, False, upsert)
+
+    def delete_many(self, query):
+        ids = [_id for _id, document in self.documents.items() if matches(document, query)]
+        for _id in ids:
+            del self.documents[_id]
+        return SimpleNamespace(deleted_count=len(ids))
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            request._add_to_bulk(self)
+
+    # The `_Bulk` interface write models add themselves to.
+
+    def add_insert(self, document):
+        document.setdefault("_id", ObjectId())
+        self.documents[document["_id"]] = copy.deepcopy(document)
+
+    def add_replace(self, selector, replacement, upsert, **kwargs):
+        found = self.find_one(selector)
+        if found is None and not upsert:
+            return
+        _id = found["_id"] if found else replacement.get("_id", selector.get("_id", ObjectId()))
+        self.documents[_id] = {**copy.deepcopy(replacement), "_id": _id}
+
+    def add_update(self, selector, update, multi, upsert, **kwargs):
+        targets = [document for document in self.documents.values() if matches(document, selector)]
+        if not multi:
+            targets = targets[:1]
+        inserting = not targets and upsert
+        if inserting:
+            document = {key: value for key, value in selector.items() if not key.startswith("$") and not isinstance(value, dict)}
+            document.setdefault("_id", ObjectId())
+            self.documents[document["_id"]] = document
+            targets = [document]
+        for document in targets:
+            document.update(copy.deepcopy(update.get("$set", {})))
+            if inserting:
+                document.update(copy.deepcopy(update.get("$setOnInsert", {})))
+            for field, amount in update.get("$inc", {}).items():
+                document[field] = document.get(field, 0) + amount
+            for field in update.get("$unset", {}):
+                document.pop(field, None)
+
+    def add_delete(self, selector, limit, **kwargs):
+        for _id in [_id for _id, document in self.documents.items() if matches(document, selector)][:limit or None]:
+            del self.documents[_id]
+
+
+class FakeDatabase:
+    """A pymongo database of `FakeCollection`s, created on first use."""
+
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def sync_db():
+    """An empty in-memory stand-in for the pymongo database the Celery jobs use."""
+    return FakeDatabase()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from codegrapher.app import archive as archive_module
+from codegrapher.app.archive import ARCHIVE_COLLECTION, archive_candidates, archive_document, archive_filter
+from codegrapher.app.sync import TOMBSTONE_COLLECTION
+
+
+def test_archive_filter_selects_deleted_and_inactive_candidates():
+    query = archive_filter(datetime(2025, 1, 31), inactive_days=30)
+    assert query == {
+        "$or": [
+            {"deleted_at": {"$ne": None}},
+            {"updated_at": {"$lt": datetime(2025, 1, 1)}},
+        ]
+    }
+
+
+def test_archive_document_records_reason():
+    now = datetime(2025, 1, 1)
+    deleted = archive_document({"_id": 1, "deleted_at": now}, now)
+    inactive = archive_document({"_id": 2, "deleted_at": None}, now)
+    assert (deleted["archive_reason"], inactive["archive_reason"]) == ("deleted", "inactive")
+    assert deleted["archived_at"] == now and deleted["_id"] == 1
+
+
+def test_candidate_updated_during_archival_stays_hot(sync_db, monkeypatch):
+    now = datetime(2025, 6, 1)
+    monkeypatch.setattr(archive_module, "utcnow", lambda: now)
+    stale = now - timedelta(days=400)
+    hot, archived = sync_db.candidate_collection, sync_db[ARCHIVE_COLLECTION]
+    hot.insert_many([
+        {"_id": 1, "tenant_id": "acme", "updated_at": stale, "deleted_at": None},
+        {"_id": 2, "tenant_id": "acme", "updated_at": stale, "deleted_at": None},
+        {"_id": 3, "tenant_id": "acme", "updated_at": stale, "deleted_at": stale},
+        {"_id": 4, "tenant_id": "acme", "updated_at": now, "deleted_at": None},
+    ])
+    copy_to_archive = archived.bulk_write
+
+    def update_between_copy_and_delete(requests, ordered=True):
+        copy_to_archive(requests, ordered)
+        # Like a concurrent API update of candidate 2.
+        hot.update_one({"_id": 2, "deleted_at": None}, {"$set": {"updated_at": now}})
+
+    monkeypatch.setattr(archived, "bulk_write", update_between_copy_and_delete)
+
+    assert archive_candidates(sync_db, batch_size=2, inactive_days=365) == {"archived": 2}
+    assert [candidate["_id"] for candidate in hot.find()] == [2, 4]
+    assert hot.find_one({"_id": 2})["updated_at"] == now
+    assert [(candidate["_id"], candidate["archive_reason"]) for candidate in archived.find()] == [
+        (1, "inactive"), (3, "deleted"),
+    ]
+    # Candidate 3 got its tombstone when it was soft deleted.
+    assert [(tombstone["candidate_id"], tombstone["deleted_at"]) for tombstone in sync_db[TOMBSTONE_COLLECTION].find()] == [
+        (1, now),
+    ]
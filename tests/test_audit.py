@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from codegrapher.app.audit import AuditBuffer
+
+
+class FakeWriter:
+    def __init__(self, failures=0, delay=0.0):
+        self.batches = []
+        self.failures = failures
+        self.delay = delay
+
+    async def __call__(self, events):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo down")
+        self.batches.append(list(events))
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_batch_is_full():
+    writer = FakeWriter()
+    buffer = AuditBuffer(writer, batch_size=3, flush_interval=10)
+    buffer.start()
+    for i in range(3):
+        await buffer.record({"n": i})
+    await asyncio.sleep(0.05)
+    assert writer.batches == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+    await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_flushes_after_interval():
+    writer = FakeWriter()
+    buffer = AuditBuffer(writer, batch_size=100, flush_interval=0.05)
+    buffer.start()
+    await buffer.record({"n": 1})
+    await asyncio.sleep(0.15)
+    assert writer.batches == [[{"n": 1}]]
+    await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_buffered_events():
+    writer = FakeWriter()
+    buffer = AuditBuffer(writer, batch_size=2, flush_interval=10)
+    buffer.start()
+    for i in range(5):
+        await buffer.record({"n": i})
+    await buffer.stop()
+    assert [event["n"] for batch in writer.batches for event in batch] == [0, 1, 2, 3, 4]
+    assert not await buffer.record({"n": 5})
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried():
+    writer = FakeWriter(failures=1)
+    buffer = AuditBuffer(writer, batch_size=1, flush_interval=0.01)
+    buffer.start()
+    await buffer.record({"n": 1})
+    await asyncio.sleep(0.1)
+    assert writer.batches == [[{"n": 1}]]
+    await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_blocks_then_drops():
+    writer = FakeWriter(delay=1)
+    buffer = AuditBuffer(writer, max_size=1, batch_size=1, flush_interval=10, enqueue_timeout=0.05)
+    buffer.start()
+    assert await buffer.record({"n": 1})
+    await asyncio.sleep(0.01)
+    assert await buffer.record({"n": 2})
+    assert not await buffer.record({"n": 3})
+    await buffer.stop(timeout=0)
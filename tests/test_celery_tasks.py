@@ -0,0 +1,111 @@
+import importlib
+import os
+import time
+import pytest
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from codegrapher.app import celeryconfig
+from codegrapher.app.export import purge_exports
+from codegrapher.app.metrics import render_metrics
+from codegrapher.app.tasks import add, app, chunked, export_candidates, find_duplicates, grouped
+from codegrapher.app.worker import queue_depths, task_seconds, tasks_total
+
+
+@app.task
+def total(batch, offset=0):
+    return sum(batch) + offset
+
+
+@pytest.fixture
+def eager():
+    app.conf.task_always_eager = True
+    yield app
+    app.conf.task_always_eager = False
+
+
+@pytest.fixture(scope="module")
+def worker():
+    with start_worker(app, pool="threads", concurrency=4, queues=["light", "heavy"],
+                      perform_ping_check=False, shutdown_timeout=10):
+        yield app
+
+
+def test_broker_and_backend_come_from_environment(monkeypatch):
+    monkeypatch.setenv("CELERY_BROKER_URL", "redis://redis:6379/0")
+    monkeypatch.setenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
+    try:
+        config = importlib.reload(celeryconfig)
+        assert config.broker_url == "redis://redis:6379/0"
+        assert config.result_backend == "redis://redis:6379/1"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(celeryconfig)
+
+
+def test_heavy_tasks_are_routed_to_heavy_queue():
+    router = app.amqp.router
+    assert router.route({}, export_candidates.name)["queue"].name == "heavy"
+    assert router.route({}, find_duplicates.name)["queue"].name == "heavy"
+    assert router.route({}, add.name)["queue"].name == "light"
+
+
+def test_late_acks_with_bounded_prefetch():
+    assert app.conf.task_acks_late
+    assert app.conf.task_reject_on_worker_lost
+    assert app.conf.worker_prefetch_multiplier >= 1
+
+
+def test_chunked_passes_each_batch_as_a_list():
+    calls = chunked(total, range(10), 4, 1)
+    assert [call.args for call in calls.tasks] == [([0, 1, 2, 3], 1), ([4, 5, 6, 7], 1), ([8, 9], 1)]
+    with pytest.raises(ValueError):
+        chunked(total, [1], 0)
+
+
+def test_grouped_runs_one_call_per_argument_list(eager):
+    assert grouped(add, [(1, 2), (3, 4)]).apply_async().get() == [3, 7]
+
+
+def test_task_duration_and_outcome_are_recorded(eager):
+    before = task_seconds.count(task=add.name, state="SUCCESS")
+    add.delay(1, 2)
+    assert task_seconds.count(task=add.name, state="SUCCESS") == before + 1
+    assert tasks_total.value(task=add.name, state="SUCCESS") >= 1
+
+
+def test_queue_depth_counts_waiting_messages():
+    with app.connection_for_write() as connection:
+        connection.default_channel.queue_purge("heavy")
+    export_candidates.apply_async(("acme",), ignore_result=True)
+    assert queue_depths(app)[("heavy",)] == 1
+    with app.connection_for_write() as connection:
+        connection.default_channel.queue_purge("heavy")
+
+
+def test_queue_depth_is_empty_when_broker_is_down(monkeypatch):
+    monkeypatch.delenv("CELERY_BROKER_URL", raising=False)
+    broken = Celery("broken", broker="redis://127.0.0.1:1/0")
+    broken.conf.task_queues = app.conf.task_queues
+    assert queue_depths(broken) == {}
+
+
+def test_queue_depth_is_not_read_outside_workers():
+    # Importing the tasks, as the API does, must not make /metrics call the broker.
+    assert "celery_queue_depth" not in render_metrics()
+
+
+def test_old_exports_are_purged(tmp_path):
+    old, recent = tmp_path / "old.csv", tmp_path / "recent.csv"
+    old.write_text("ID\n")
+    recent.write_text("ID\n")
+    day_ago = time.time() - 24 * 3600
+    os.utime(old, (day_ago, day_ago))
+    assert purge_exports(str(tmp_path), max_age=3600) == 1
+    assert not old.exists() and recent.exists()
+    assert purge_exports(str(tmp_path / "missing"), max_age=3600) == 0
+
+
+def test_chunked_batches_run_through_in_memory_worker(worker):
+    items = list(range(5000))
+    results = chunked(total, items, 250).apply_async().get(timeout=30)
+    assert results == [sum(items[start:start + 250]) for start in range(0, len(items), 250)]
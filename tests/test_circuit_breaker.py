@@ -0,0 +1,112 @@
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import AsyncClient
+from pymongo.errors import ServerSelectionTimeoutError
+from codegrapher.app.api.users import create_access_token, get_current_user
+from codegrapher.app.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    StaleCache,
+    mongo_breaker,
+    protected,
+)
+from codegrapher.app.memory_repositories import InMemoryUserRepository
+from codegrapher.app.metrics import render_metrics
+from codegrapher.middleware import StalenessMiddleware
+
+breaker = CircuitBreaker("test-mongo", failure_threshold=2, recovery_timeout=60)
+cache = StaleCache()
+database_up = True
+
+
+@protected(breaker, cache)
+async def read(key: str):
+    if not database_up:
+        raise ServerSelectionTimeoutError("No servers found")
+    return {"key": key}
+
+
+@protected(breaker)
+async def write(key: str):
+    if not database_up:
+        raise ServerSelectionTimeoutError("No servers found")
+    return True
+
+
+app = FastAPI()
+app.add_middleware(StalenessMiddleware)
+
+
+@app.get("/items/{key}")
+async def get_item(key: str):
+    return await read(key)
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def reset_breaker():
+    global database_up
+    database_up = True
+    breaker.state, breaker.failures = CLOSED, 0
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_consecutive_failures():
+    global database_up
+    database_up = False
+    for _ in range(2):
+        with pytest.raises(ServerSelectionTimeoutError):
+            await write("a")
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await write("a")
+    assert 'circuit_breaker_state{breaker="test-mongo"} 2' in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_breaker():
+    breaker.state, breaker.opened_at = OPEN, 0.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.release()
+    assert await write("a")
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_stale_read_served_with_header(async_client):
+    global database_up
+    fresh = await async_client.get("/items/a")
+    assert "x-data-staleness" not in fresh.headers
+    database_up = False
+    stale = await async_client.get("/items/a")
+    assert stale.json() == {"key": "a"}
+    assert stale.headers["x-data-staleness"] == "0"
+    assert stale.headers["warning"].startswith("110")
+    with pytest.raises(ServerSelectionTimeoutError):
+        await read("never-cached")
+
+
+@pytest.mark.asyncio
+async def test_authentication_is_never_served_stale(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+    monkeypatch.setenv("ALGORITHM", "HS256")
+    users = InMemoryUserRepository()
+    await users.insert({"fullname": "Ann", "email": "ann@acme.com", "city": "Lahore", "tenant_id": "acme", "disabled": False})
+    token = create_access_token({"sub": "ann@acme.com"})
+    assert (await get_current_user(token, users)).tenant_id == "acme"
+
+    await users.update("ann@acme.com", {"disabled": True})
+    monkeypatch.setattr(mongo_breaker, "allow", lambda: False)
+    with pytest.raises(CircuitOpenError):
+        await get_current_user(token, users)
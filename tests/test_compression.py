@@ -0,0 +1,80 @@
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from httpx import AsyncClient
+from codegrapher.middleware import CompressionMiddleware
+from codegrapher.app.compression import negotiate_encoding
+
+PAYLOAD = "candidate," * 1000
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500, offload_size=4096)
+
+
+@app.get("/large")
+async def large():
+    return PlainTextResponse(PAYLOAD)
+
+
+@app.get("/small")
+async def small():
+    return PlainTextResponse("ok")
+
+
+@app.get("/stream")
+async def stream():
+    async def rows():
+        for _ in range(100):
+            yield PAYLOAD
+    return StreamingResponse(rows(), media_type="text/csv")
+
+
+@app.get("/png")
+async def png():
+    return PlainTextResponse(PAYLOAD, media_type="image/png")
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_large_response_is_gzipped(async_client):
+    response = await async_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(PAYLOAD)
+    assert response.text == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_is_compressed(async_client):
+    response = await async_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == PAYLOAD * 100
+
+
+@pytest.mark.asyncio
+async def test_small_and_compressed_media_are_skipped(async_client):
+    response = await async_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    response = await async_client.get("/png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_identity_when_not_accepted(async_client):
+    response = await async_client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == PAYLOAD
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("br;q=0.5, gzip;q=0.8") == "gzip"
@@ -0,0 +1,111 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, Depends
+from httpx import AsyncClient
+from codegrapher.middleware import DeadlineMiddleware
+from codegrapher.app.deadline import max_time_ms, request_budget
+
+app = FastAPI()
+app.add_middleware(DeadlineMiddleware, default_timeout=0.2)
+
+
+@app.get("/budget")
+async def budget():
+    return {"max_time_ms": max_time_ms()}
+
+
+@app.get("/slow")
+async def slow():
+    await asyncio.sleep(1)
+    return {"status": "ok"}
+
+
+@app.get("/slow-with-budget", dependencies=[Depends(request_budget(2))])
+async def slow_with_budget():
+    await asyncio.sleep(0.3)
+    return {"status": "ok"}
+
+
+cancelled = []
+
+
+@app.get("/slow-scan")
+async def slow_scan():
+    try:
+        await asyncio.sleep(3)
+    except asyncio.CancelledError:
+        cancelled.append("/slow-scan")
+        raise
+    return {"status": "ok"}
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_max_time_ms_follows_default_budget(async_client):
+    response = await async_client.get("/budget")
+    assert response.status_code == 200
+    assert 0 < response.json()["max_time_ms"] <= 200
+
+
+@pytest.mark.asyncio
+async def test_header_sets_budget(async_client):
+    response = await async_client.get("/budget", headers={"X-Request-Timeout": "5"})
+    assert 200 < response.json()["max_time_ms"] <= 5000
+
+
+@pytest.mark.asyncio
+async def test_slow_request_gets_504(async_client):
+    response = await async_client.get("/slow")
+    assert response.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_route_budget_extends_default(async_client):
+    response = await async_client.get("/slow-with-budget")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_is_cancelled_when_client_disconnects():
+    # httpx can't drop a connection mid-request, so the ASGI messages are sent directly.
+    messages = [{"type": "http.request", "body": b"", "more_body": False}, {"type": "http.disconnect"}]
+
+    async def receive():
+        if messages:
+            await asyncio.sleep(0.05)
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/slow-scan",
+        "raw_path": b"/slow-scan",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"x-request-timeout", b"10")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    cancelled.clear()
+    started = time.monotonic()
+    await app(scope, receive, send)
+    assert cancelled == ["/slow-scan"]
+    assert time.monotonic() - started < 1
+
+
+def test_max_time_ms_outside_request():
+    assert max_time_ms() is None
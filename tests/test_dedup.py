@@ -0,0 +1,60 @@
+from datetime import datetime
+from codegrapher.app.dedup import (
+    DUPLICATE_COLLECTION,
+    find_duplicate_pairs,
+    pair_update,
+    rebuild_duplicates,
+    minhash,
+    normalize_phone,
+    shingles,
+    signature_document,
+    similarity,
+)
+
+
+def candidate(_id, fullname, phone, skills):
+    return {"_id": _id, "fullname": fullname, "phone_number": phone, "skills": skills}
+
+
+def test_normalize_phone_ignores_formatting_and_country_code():
+    assert normalize_phone("+44 (0) 7700-900123") == normalize_phone("07700900123")
+
+
+def test_near_duplicates_are_similar():
+    a = candidate(1, "John Doe", "+44 7700 900123", ["Python", "SQL"])
+    b = candidate(2, "Jon  Doe", "07700-900123", ["sql", "python"])
+    c = candidate(3, "Maria Garcia", "+1 555 0100 222", ["Go", "Rust"])
+    sig_a, sig_b, sig_c = (minhash(shingles(x)) for x in (a, b, c))
+    assert similarity(sig_a, sig_b) > 0.6
+    assert similarity(sig_a, sig_c) < 0.2
+
+
+def test_find_duplicate_pairs_uses_lsh_buckets():
+    documents = [
+        signature_document(candidate(1, "John Doe", "+44 7700 900123", ["Python", "SQL"])),
+        signature_document(candidate(2, "John Doe", "07700900123", ["Python", "SQL", "Docker"])),
+        signature_document(candidate(3, "Maria Garcia", "+1 555 0100 222", ["Go", "Rust"])),
+        signature_document(candidate(4, "Li Wei", "+86 139 1234 5678", ["Java"])),
+    ]
+    pairs = list(find_duplicate_pairs(documents))
+    assert [(a, b) for a, b, _ in pairs] == [(1, 2)]
+
+
+def test_rebuild_removes_pending_pairs_not_found_again(sync_db):
+    sync_db.candidate_collection.insert_many([
+        {**candidate(1, "John Doe", "+44 7700 900123", ["Python", "SQL"]), "tenant_id": "acme"},
+        {**candidate(2, "John Doe", "07700900123", ["Python", "SQL", "Docker"]), "tenant_id": "acme"},
+        {**candidate(3, "Maria Garcia", "+1 555 0100 222", ["Go", "Rust"]), "tenant_id": "acme"},
+        {**candidate(4, "Maria Garcia", "+1 555 0100 222", ["Go", "Rust"]), "tenant_id": "acme", "deleted_at": datetime(2025, 1, 1)},
+        {**candidate(5, "Li Wei", "+86 139 1234 5678", ["Java"]), "tenant_id": "acme"},
+    ])
+    duplicates = sync_db[DUPLICATE_COLLECTION]
+    # Found by earlier runs: 3 and 4 before 4 was deleted, 3 and 5 before 5 was edited.
+    for id_a, id_b, status in ((3, 4, "pending"), (3, 5, "pending"), (1, 5, "rejected")):
+        duplicates.update_one(*pair_update(id_a, id_b, 0.9, "acme"), upsert=True)
+        duplicates.update_one({"pair_key": f"{id_a}:{id_b}"}, {"$set": {"status": status}})
+
+    assert rebuild_duplicates(sync_db) == {"candidates": 4, "pairs": 1, "removed": 2}
+    assert sorted((pair["pair_key"], pair["status"]) for pair in duplicates.find()) == [
+        ("1:2", "pending"), ("1:5", "rejected"),
+    ]
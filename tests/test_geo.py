@@ -0,0 +1,101 @@
+from datetime import datetime
+import pytest
+from pymongo import UpdateOne
+from codegrapher.app import gazetteer as gazetteer_module
+from codegrapher.app.gazetteer import Gazetteer, backfill_locations
+from codegrapher.app.migrations import AdaptiveThrottle
+from codegrapher.app.geo import geo_filter, location_document, location_helper, parse_box, parse_point
+
+GEONAMES = [
+    ["2643743", "London", "London", "Londres,Londra", "51.50853", "-0.12574", "P", "PPLC", "GB", "", "ENG", "", "", "", "8961989"],
+    ["6058560", "London", "London", "", "42.98339", "-81.23304", "P", "PPL", "CA", "", "08", "", "", "", "346765"],
+    ["2332459", "Lagos", "Lagos", "", "6.45407", "3.39467", "P", "PPLA", "NG", "", "05", "", "", "", "9000000"],
+    ["5128581", "New York City", "New York City", "New York,NYC", "40.71427", "-74.00597", "P", "PPL", "US", "", "NY", "", "", "", "8804190"],
+]
+
+PARIS = {"latitude": 48.85, "longitude": 2.35, "country": "FR", "city": "Paris"}
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = tmp_path / "cities.txt"
+    path.write_text("\n".join("\t".join(row) for row in GEONAMES) + "\n", encoding="utf-8")
+    return Gazetteer.load(str(path))
+
+
+def test_location_round_trip():
+    location = {"latitude": 51.5, "longitude": -0.12, "country": "gb", "city": "London"}
+    stored = location_document(location)
+    assert stored["point"] == {"type": "Point", "coordinates": [-0.12, 51.5]}
+    assert location_helper(stored) == {**location, "country": "GB"}
+    assert location_document(None) is None and location_helper(None) is None
+
+
+def test_parse_filters():
+    assert parse_point("51.5,-0.12") == (51.5, -0.12)
+    assert parse_box("-1,50,1,52") == (-1, 50, 1, 52)
+    for value in ("91,0", "1", "a,b"):
+        with pytest.raises(ValueError):
+            parse_point(value)
+    with pytest.raises(ValueError):
+        parse_box("1,50,-1,52")
+
+
+def test_geo_filter_combines_radius_and_box():
+    center, radians = geo_filter(near=(51.5, -0.12), radius_km=63.781)["location.point"]["$geoWithin"]["$centerSphere"]
+    assert center == [-0.12, 51.5] and radians == pytest.approx(0.01)
+    both = geo_filter(near=(51.5, -0.12), within=(-1, 50, 1, 52))
+    assert len(both["$and"]) == 2
+    assert geo_filter() == {}
+
+
+def test_gazetteer_prefers_country_in_address_then_population(gazetteer):
+    assert gazetteer.locate("12 Richmond St, London, CA")["country"] == "CA"
+    assert gazetteer.locate("221B Baker Street, London")["country"] == "GB"
+    assert gazetteer.locate("xyz, UK") is None
+
+
+def test_gazetteer_matches_multi_word_and_alternate_names(gazetteer):
+    assert gazetteer.locate("5th Avenue, New York, USA")["city"] == "New York City"
+    assert gazetteer.locate("Rue de Rivoli, Londres")["city"] == "London"
+    assert gazetteer.locate("Victoria Island Lagos Nigeria")["country"] == "NG"
+
+
+def test_backfill_locates_pending_candidates_without_touching_updated_at(gazetteer, sync_db, monkeypatch):
+    now, last_update = datetime(2025, 6, 1), datetime(2020, 1, 1)
+    monkeypatch.setattr(gazetteer_module, "utcnow", lambda: now)
+    # Small batches, so the backfill pages through the candidates by _id.
+    monkeypatch.setattr(gazetteer_module, "AdaptiveThrottle", lambda: AdaptiveThrottle(batch_size=2, min_batch_size=1))
+    candidates = sync_db.candidate_collection
+    candidates.insert_many([
+        {"_id": 1, "address": "221B Baker Street, London", "location": None, "updated_at": last_update},
+        {"_id": 2, "address": "Nowhere", "updated_at": last_update},
+        {"_id": 3, "address": "Lagos", "location": location_document(PARIS), "updated_at": last_update},
+        {"_id": 4, "address": "Lagos", "geocoded_at": last_update, "updated_at": last_update},
+        {"_id": 5, "address": "Lagos", "deleted_at": last_update, "updated_at": last_update},
+        {"_id": 6, "address": "", "updated_at": last_update},
+        {"_id": 7, "address": "Victoria Island Lagos Nigeria", "updated_at": last_update},
+    ])
+    requests = []
+    write = candidates.bulk_write
+
+    def recording_write(batch, ordered=True):
+        requests.extend(batch)
+        if len(requests) == 3:
+            # Candidate 7, in the second batch, gets a location through the API meanwhile.
+            candidates.update_one({"_id": 7}, {"$set": {"location": location_document(PARIS)}})
+        write(batch, ordered)
+
+    monkeypatch.setattr(candidates, "bulk_write", recording_write)
+    assert backfill_locations(sync_db, gazetteer, sleep=lambda seconds: None) == {"located": 2, "unresolved": 1}
+
+    located = {"location": location_document(gazetteer.locate("221B Baker Street, London")), "geocoded_at": now}
+    lagos = {"location": location_document(gazetteer.locate("Victoria Island Lagos Nigeria")), "geocoded_at": now}
+    assert requests == [
+        UpdateOne({"_id": 1, "location": None}, {"$set": located}),
+        UpdateOne({"_id": 2, "location": None}, {"$set": {"geocoded_at": now}}),
+        UpdateOne({"_id": 7, "location": None}, {"$set": lagos}),
+    ]
+    assert candidates.find_one({"_id": 1})["location"]["city"] == "London"
+    assert candidates.find_one({"_id": 7})["location"] == location_document(PARIS)
+    assert {candidate["updated_at"] for candidate in candidates.find()} == {last_update}
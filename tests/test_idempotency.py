@@ -0,0 +1,144 @@
+import asyncio
+import copy
+from datetime import timedelta
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse
+from httpx import AsyncClient
+from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError
+from codegrapher.app import idempotency
+from codegrapher.app.circuit_breaker import mongo_breaker
+from codegrapher.app.sync import utcnow
+from codegrapher.middleware import IdempotencyMiddleware
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for the idempotency store."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def insert_one(self, document):
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate key")
+        self.documents[document["_id"]] = copy.deepcopy(document)
+
+    async def find_one(self, query):
+        return copy.deepcopy(self.documents.get(query["_id"]))
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        # Only the lease takeover query: status, fingerprint and an expired locked_until.
+        document = self.documents.get(query["_id"])
+        if document is None or any(document[field] != query[field] for field in ("status", "fingerprint")):
+            return None
+        if document.get("locked_until") is not None and document["locked_until"] > query["locked_until"]["$not"]["$gt"]:
+            return None
+        document.update(update["$set"])
+        return copy.deepcopy(document)
+
+    async def update_one(self, query, update):
+        self.documents[query["_id"]].update(update["$set"])
+
+    async def delete_one(self, query):
+        document = self.documents.get(query["_id"])
+        if document and document["status"] == query["status"]:
+            del self.documents[query["_id"]]
+
+
+calls = []
+app = FastAPI()
+app.add_middleware(IdempotencyMiddleware)
+
+
+@app.post("/candidate/")
+async def create(data: dict = Body(...)):
+    calls.append(data)
+    await asyncio.sleep(0.05)
+    if data.get("fail"):
+        return JSONResponse(status_code=500, content={"message": "boom"})
+    return {"created": len(calls)}
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    calls.clear()
+    collection = FakeCollection()
+    monkeypatch.setattr(idempotency, "idempotency_collection", collection)
+    return collection
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_retry_replays_stored_response(async_client):
+    headers = {"Idempotency-Key": "abc"}
+    first = await async_client.post("/candidate/", json={"name": "a"}, headers=headers)
+    second = await async_client.post("/candidate/", json={"name": "a"}, headers=headers)
+    assert first.json() == second.json() == {"created": 1}
+    assert second.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_waits_for_original(async_client):
+    headers = {"Idempotency-Key": "abc"}
+    responses = await asyncio.gather(
+        async_client.post("/candidate/", json={"name": "a"}, headers=headers),
+        async_client.post("/candidate/", json={"name": "a"}, headers=headers),
+    )
+    assert [r.json() for r in responses] == [{"created": 1}, {"created": 1}]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_different_body_is_rejected(async_client):
+    headers = {"Idempotency-Key": "abc"}
+    await async_client.post("/candidate/", json={"name": "a"}, headers=headers)
+    response = await async_client.post("/candidate/", json={"name": "b"}, headers=headers)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_failed_request_releases_key(async_client):
+    headers = {"Idempotency-Key": "abc"}
+    await async_client.post("/candidate/", json={"fail": True}, headers=headers)
+    await async_client.post("/candidate/", json={"fail": True}, headers=headers)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_requests_without_key_are_not_deduplicated(async_client):
+    await async_client.post("/candidate/", json={"name": "a"})
+    await async_client.post("/candidate/", json={"name": "a"})
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_key_of_a_crashed_request_is_taken_over_once_its_lease_expires(async_client, store):
+    headers = {"Idempotency-Key": "abc"}
+    key = idempotency.scoped_key("POST", "/candidate/", "abc", None)
+    fingerprint = idempotency.fingerprint("POST", "/candidate/", b'{"name":"a"}')
+    await idempotency.claim(key, fingerprint)
+    store.documents[key]["locked_until"] = utcnow() - timedelta(seconds=1)
+
+    response = await async_client.post("/candidate/", content=b'{"name":"a"}', headers=headers)
+    assert response.json() == {"created": 1}
+    assert store.documents[key]["status"] == idempotency.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_request_runs_without_idempotency_when_the_store_is_down(async_client, store, monkeypatch):
+    async def unreachable(*args, **kwargs):
+        raise ServerSelectionTimeoutError("no servers")
+
+    monkeypatch.setattr(store, "insert_one", unreachable)
+    # Keeps the shared breaker closed, and its failure count is restored afterwards.
+    monkeypatch.setattr(mongo_breaker, "failure_threshold", 100)
+    monkeypatch.setattr(mongo_breaker, "failures", mongo_breaker.failures)
+    response = await async_client.post("/candidate/", json={"name": "a"}, headers={"Idempotency-Key": "abc"})
+    assert response.json() == {"created": 1}
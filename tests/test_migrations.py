@@ -0,0 +1,53 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+from codegrapher.app.migrations import (
+    AdaptiveThrottle,
+    CandidateNormalizedFields,
+    UserNormalizedFields,
+    migration_progress,
+)
+
+
+def test_throttle_grows_additively_and_halves_on_slow_batches():
+    throttle = AdaptiveThrottle(batch_size=400, target_latency=0.1, duty_cycle=0.5, min_batch_size=50, max_batch_size=1000)
+    throttle.record(0.05)
+    assert throttle.batch_size == 450
+    throttle.record(0.3)
+    assert throttle.batch_size == 225
+    for _ in range(5):
+        throttle.record(1.0)
+    assert throttle.batch_size == 50
+
+
+def test_throttle_pause_follows_duty_cycle():
+    throttle = AdaptiveThrottle(duty_cycle=0.25)
+    assert throttle.record(0.1) == 0.1 * 0.75 / 0.25
+
+
+def test_candidate_migration_backfills_normalized_fields():
+    _id = ObjectId.from_datetime(datetime(2024, 1, 2, 3, 4, 5))
+    fields = CandidateNormalizedFields().transform({"_id": _id, "email": " Jane@Example.COM", "skills": ["SQL ", "python", "sql"]})
+    assert fields["email_lower"] == "jane@example.com"
+    assert fields["skills_canonical"] == ["python", "sql"]
+    assert fields["created_at"] == fields["updated_at"] == datetime(2024, 1, 2, 3, 4, 5)
+    assert fields["schema_version"] == CandidateNormalizedFields.schema_version
+
+
+def test_migration_keeps_existing_timestamps():
+    created, updated = datetime(2024, 5, 1), datetime(2024, 6, 1)
+    document = {"_id": ObjectId(), "email": "a@b.c", "created_at": created, "updated_at": updated}
+    fields = CandidateNormalizedFields().transform(document)
+    assert (fields["created_at"], fields["updated_at"]) == (created, updated)
+    assert UserNormalizedFields().transform(document)["created_at"] == created
+
+
+def test_pending_filter_matches_documents_without_version():
+    assert CandidateNormalizedFields().pending_filter() == {"schema_version": {"$not": {"$gte": 1}}}
+
+
+def test_progress_of_running_and_unstarted_migrations():
+    migration = UserNormalizedFields()
+    assert migration_progress(migration, None)["status"] == "pending"
+    progress = migration_progress(migration, {"status": "running", "processed": 250, "total": 1000})
+    assert progress["percent"] == 25.0
+    assert migration_progress(migration, {"status": "completed", "processed": 990, "total": 1000})["percent"] == 100.0
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import AsyncClient
+from codegrapher.app import profiling
+from codegrapher.app.api import users
+from codegrapher.middleware import ProfilingMiddleware
+
+
+def build_app(sampler):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, sampler=sampler)
+
+    @app.get("/items/{id}")
+    async def item(id: str):
+        await asyncio.sleep(0.02)
+        return {"id": id}
+
+    return app
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_no_profile_by_default():
+    app = build_app(profiling.RouteSampler(rate=0))
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        response = await client.get("/items/1")
+    assert "x-profile-id" not in response.headers
+    assert profiling.list_profiles() == []
+
+
+@pytest.mark.asyncio
+async def test_sampled_route_writes_speedscope_file():
+    app = build_app(profiling.RouteSampler(rate=1, max_per_minute=1))
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        first = await client.get("/items/1")
+        second = await client.get("/items/2")
+    assert "items-id" in first.headers["x-profile-id"]
+    assert "x-profile-id" not in second.headers
+    path = profiling.profile_path(first.headers["x-profile-id"])
+    with open(path) as f:
+        profile = json.load(f)
+    assert profile["profiles"][0]["type"] == "sampled"
+    assert len(profile["profiles"][0]["samples"]) == len(profile["profiles"][0]["weights"])
+
+
+@pytest.mark.asyncio
+async def test_profile_flag_requires_admin_token(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "secret")
+    monkeypatch.setenv("ALGORITHM", "HS256")
+    monkeypatch.setattr(users, "ADMIN_EMAILS", {"admin@example.com"})
+    admin = users.create_access_token({"sub": "admin@example.com"})
+    other = users.create_access_token({"sub": "user@example.com"})
+    app = build_app(profiling.RouteSampler(rate=0))
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        denied = await client.get("/items/1", headers={"X-Profile": "1", "Authorization": f"Bearer {other}"})
+        allowed = await client.get("/items/1?__profile=1", headers={"Authorization": f"Bearer {admin}"})
+    assert "x-profile-id" not in denied.headers
+    assert allowed.headers["x-profile-id"] in [p["name"] for p in profiling.list_profiles()]
+
+
+def test_profile_path_rejects_traversal():
+    assert profiling.profile_path("../app.log") is None
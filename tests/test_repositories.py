@@ -0,0 +1,130 @@
+import pytest
+import pytest_asyncio
+from datetime import timedelta
+from bson.objectid import ObjectId
+from fastapi import FastAPI
+from httpx import AsyncClient
+from codegrapher.app import tenancy
+from codegrapher.app.api.users import create_access_token
+from codegrapher.app.memory_repositories import InMemoryCandidateRepository, use_in_memory_repositories
+from codegrapher.app.routes.candidate import CandidateRouter
+from codegrapher.app.routes.tenants import TenantRouter
+from codegrapher.app.sync import EMPTY_WATERMARK, utcnow
+
+
+app = FastAPI()
+app.include_router(CandidateRouter, prefix="/candidate")
+app.include_router(TenantRouter, prefix="/tenant")
+
+
+@pytest.fixture
+def repositories():
+    yield use_in_memory_repositories(app)
+    app.dependency_overrides.clear()
+
+
+@pytest_asyncio.fixture
+async def client(repositories, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+    monkeypatch.setenv("ALGORITHM", "HS256")
+    candidates, users = repositories
+    await users.insert({"fullname": "Jane Doe", "email": "jane@example.com", "city": "Lahore", "disabled": False, "tenant_id": tenancy.DEFAULT_TENANT})
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'jane@example.com'})}"}
+    async with AsyncClient(app=app, base_url="http://testserver", headers=headers) as client:
+        yield client
+
+
+def candidate_body(i: int, **fields) -> dict:
+    return {
+        "fullname": f"Candidate {i}",
+        "email": f"candidate{i}@example.com",
+        "address": "1 Main St, London",
+        "education": "BSc",
+        "phone_number": f"+4400000{i:04d}",
+        "experience_years": i,
+        "skills": ["Python", "FastAPI"] if i % 2 else ["Go"],
+        **fields,
+    }
+
+
+@pytest.mark.asyncio
+async def test_candidate_lifecycle_without_mongo(client):
+    created = (await client.post("/candidate/", json=candidate_body(1))).json()["data"][0]
+    assert (await client.post("/candidate/", json=candidate_body(1, email="CANDIDATE1@example.com"))).status_code == 400
+
+    fetched = (await client.get(f"/candidate/{created['id']}")).json()["data"][0]
+    assert fetched["email"] == "candidate1@example.com"
+
+    updated = (await client.put(f"/candidate/{created['id']}", json=candidate_body(1, fullname="Renamed"))).json()
+    assert updated["data"][0]["fullname"] == "Renamed"
+
+    assert (await client.delete(f"/candidate/{created['id']}")).json()["message"] == "Candidate deleted successfully"
+    assert (await client.get(f"/candidate/{created['id']}")).json()["code"] == 404
+    assert (await client.get("/tenant/usage")).json()["data"][0]["candidates"] == 0
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_detected_in_the_repository(client, repositories):
+    candidates, _ = repositories
+    first = (await client.post("/candidate/", json=candidate_body(1))).json()["data"][0]
+    second = (await client.post("/candidate/", json=candidate_body(1, email="other@example.com"))).json()["data"][0]
+    [pair] = candidates.duplicates.values()
+    assert sorted(map(str, pair["candidate_ids"])) == sorted([first["id"], second["id"]])
+    assert pair["status"] == "pending"
+
+    await client.delete(f"/candidate/{second['id']}")
+    assert candidates.duplicates == {}
+    assert list(candidates.signatures) == [ObjectId(first["id"])]
+
+
+@pytest.mark.asyncio
+async def test_filters_and_pagination(client):
+    for i in range(1, 8):
+        await client.post("/candidate/", json=candidate_body(i))
+    page = (await client.get("/candidate/all-candidates", params={"skills": "python", "min_experience": 3})).json()
+    assert [c["fullname"] for c in page["data"][0]] == ["Candidate 3", "Candidate 5", "Candidate 7"]
+    page = (await client.get("/candidate/all-candidates", params={"search": "candidate6@", "limit": 5})).json()
+    assert [c["fullname"] for c in page["data"][0]] == ["Candidate 6"]
+    page = (await client.get("/candidate/all-candidates", params={"page": 2, "limit": 5})).json()
+    assert len(page["data"][0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_quota_is_enforced(client, monkeypatch):
+    monkeypatch.setitem(tenancy.TENANT_QUOTAS, tenancy.DEFAULT_TENANT, 1)
+    assert (await client.post("/candidate/", json=candidate_body(1))).status_code == 200
+    assert (await client.post("/candidate/", json=candidate_body(2))).status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_changes_follow_watermarks():
+    repository = InMemoryCandidateRepository()
+    old = utcnow() - timedelta(minutes=5)
+    ids = [ObjectId() for _ in range(3)]
+    repository.load({"_id": _id, "email": f"{n}@x", "updated_at": old, "tenant_id": "acme"} for n, _id in enumerate(ids))
+    repository.load([{"email": "legacy@x"}])
+    horizon = utcnow()
+    first = [c["_id"] async for c in repository.changed("acme", EMPTY_WATERMARK, horizon, 2)]
+    assert first == sorted(ids)[:2]
+    rest = [c["_id"] async for c in repository.changed("acme", (old, first[-1]), horizon)]
+    assert rest == sorted(ids)[2:]
+    assert [c["email"] async for c in repository.changed(tenancy.DEFAULT_TENANT, EMPTY_WATERMARK, horizon)] == ["legacy@x"]
+
+    assert await repository.soft_delete(ids[0], "acme")
+    assert [t["candidate_id"] async for t in repository.deleted("acme", EMPTY_WATERMARK, utcnow())] == [ids[0]]
+    assert ids[0] not in [c["_id"] async for c in repository.changed("acme", EMPTY_WATERMARK, horizon)]
+
+
+@pytest.mark.asyncio
+async def test_archived_candidates_are_restored_on_update():
+    repository = InMemoryCandidateRepository()
+    _id = ObjectId()
+    repository.load([{"_id": _id, "email": "a@x", "tenant_id": "acme", "skills_canonical": ["go"]}], archived=True)
+    assert await repository.get(_id, "acme") is None
+    assert (await repository.get(_id, "acme", include_archived=True))["archived_at"]
+    assert await repository.find_by_email("acme", "A@X")
+    assert await repository.find_by_email("globex", "a@x") is None
+
+    updated = await repository.update(_id, "acme", {"fullname": "A"})
+    assert "archived_at" not in updated
+    assert await repository.query("acme", skills=("Go",)) == [updated]
@@ -0,0 +1,84 @@
+from datetime import timedelta
+import pytest
+from bson.objectid import ObjectId
+from fastapi import HTTPException
+from codegrapher.app import sync
+from codegrapher.app.api import candidate as candidate_api
+from codegrapher.app.memory_repositories import InMemoryCandidateRepository
+from codegrapher.app.sync import (
+    EMPTY_WATERMARK,
+    after_watermark,
+    decode_sync_token,
+    encode_sync_token,
+    utcnow,
+    SYNC_TOMBSTONE_RETENTION,
+)
+
+
+def test_token_round_trip():
+    changes = (utcnow(), ObjectId())
+    deletions = (None, ObjectId())
+    assert decode_sync_token(encode_sync_token(changes, deletions)) == (changes, deletions)
+
+
+def test_missing_token_means_full_sync():
+    assert decode_sync_token(None) == (EMPTY_WATERMARK, EMPTY_WATERMARK)
+
+
+def test_invalid_token_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_sync_token("not-a-token")
+    assert exc.value.status_code == 400
+
+
+def test_expired_token_requires_resync(monkeypatch):
+    issued = utcnow() - SYNC_TOMBSTONE_RETENTION - timedelta(days=1)
+    monkeypatch.setattr(sync, "utcnow", lambda: issued)
+    token = encode_sync_token((issued, ObjectId()), EMPTY_WATERMARK)
+    monkeypatch.undo()
+    with pytest.raises(HTTPException) as exc:
+        decode_sync_token(token)
+    assert exc.value.status_code == 410
+
+
+def test_old_watermarks_in_a_recent_token_are_accepted():
+    old = (utcnow() - SYNC_TOMBSTONE_RETENTION - timedelta(days=1), ObjectId())
+    assert decode_sync_token(encode_sync_token(old, old)) == (old, old)
+
+
+def stored_candidate(email: str, updated_at) -> dict:
+    return {"fullname": email, "email": email, "tenant_id": "acme", "updated_at": updated_at}
+
+
+@pytest.mark.asyncio
+async def test_idle_tenant_resyncs_incrementally(monkeypatch):
+    repository = InMemoryCandidateRepository()
+    idle_since = utcnow() - timedelta(days=40)
+    repository.load([stored_candidate("a@x", idle_since)])
+    now = utcnow()
+    monkeypatch.setattr(candidate_api, "sync_horizon", lambda: now)
+
+    full = await candidate_api.retrieve_changes("acme", repository)
+    assert [c["email"] for c in full["changes"]] == ["a@x"] and not full["has_more"]
+    idle = await candidate_api.retrieve_changes("acme", repository, full["token"])
+    assert idle["changes"] == [] and idle["deleted"] == []
+
+    repository.load([stored_candidate("b@x", now + timedelta(seconds=1))])
+    monkeypatch.setattr(candidate_api, "sync_horizon", lambda: now + timedelta(seconds=2))
+    later = await candidate_api.retrieve_changes("acme", repository, idle["token"])
+    assert [c["email"] for c in later["changes"]] == ["b@x"]
+
+
+def test_after_watermark_query():
+    horizon = utcnow()
+    _id = ObjectId()
+    assert after_watermark("updated_at", EMPTY_WATERMARK, horizon) == {
+        "$or": [{"updated_at": None}, {"updated_at": {"$ne": None, "$lte": horizon}}]
+    }
+    ts = horizon - timedelta(minutes=1)
+    assert after_watermark("updated_at", (ts, _id), horizon) == {
+        "$or": [
+            {"updated_at": ts, "_id": {"$gt": _id}},
+            {"updated_at": {"$gt": ts, "$lte": horizon}},
+        ]
+    }
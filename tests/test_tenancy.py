@@ -0,0 +1,148 @@
+from datetime import datetime
+import pytest
+import pytest_asyncio
+from bson.objectid import ObjectId
+from fastapi import Depends, FastAPI, Request
+from httpx import AsyncClient
+from codegrapher.app import tenancy
+from codegrapher.app.api import users as users_api
+from codegrapher.app.archive import ARCHIVE_COLLECTION
+from codegrapher.app.audit import AUDIT_COLLECTION
+from codegrapher.app.dedup import SIGNATURE_COLLECTION, find_duplicate_pairs, signature_document
+from codegrapher.app.memory_repositories import use_in_memory_repositories
+from codegrapher.app.routes.user import UserRouter
+from codegrapher.app.sync import TOMBSTONE_COLLECTION
+from codegrapher.app.tenancy import (
+    DEFAULT_TENANT,
+    assign_legacy_candidates,
+    legacy_candidate_tenants,
+    tenant_filter,
+    tenant_for_email,
+    tenant_request_seconds,
+)
+from codegrapher.middleware import TenantMetricsMiddleware
+
+
+async def tenant_from_header(request: Request) -> str:
+    request.state.tenant = request.headers["x-tenant"]
+    return request.state.tenant
+
+
+app = FastAPI()
+app.add_middleware(TenantMetricsMiddleware)
+app.include_router(UserRouter)
+
+
+@app.get("/items/{id}")
+async def get_item(id: str, tenant: str = Depends(tenant_from_header)):
+    return {"id": id, "tenant": tenant}
+
+
+@app.get("/my-tenant")
+async def my_tenant(tenant: str = Depends(users_api.get_current_tenant)):
+    return {"tenant": tenant}
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        yield client
+
+
+def test_tenant_for_email_uses_domain_mapping(monkeypatch):
+    monkeypatch.setitem(tenancy.TENANT_DOMAINS, "acme.com", "acme")
+    assert tenant_for_email("jane@ACME.com") == "acme"
+    assert tenant_for_email("jane@gmail.com") is None
+
+
+def test_default_tenant_filter_includes_documents_without_tenant():
+    assert tenant_filter("acme") == {"tenant_id": "acme"}
+    assert tenant_filter(DEFAULT_TENANT) == {"tenant_id": {"$in": [DEFAULT_TENANT, None]}}
+
+
+def test_duplicates_are_not_matched_across_tenants():
+    candidate = {"fullname": "John Doe", "phone_number": "+44 7700 900123", "skills": ["Python"]}
+    documents = [
+        signature_document({**candidate, "_id": 1, "tenant_id": "acme"}),
+        signature_document({**candidate, "_id": 2, "tenant_id": "globex"}),
+        signature_document({**candidate, "_id": 3, "tenant_id": "acme"}),
+    ]
+    assert [(a, b) for a, b, _ in find_duplicate_pairs(documents)] == [(1, 3)]
+
+
+@pytest.mark.asyncio
+async def test_request_durations_are_recorded_per_tenant(async_client):
+    before = tenant_request_seconds.count(tenant="acme", route="/items/{id}")
+    response = await async_client.get("/items/1", headers={"x-tenant": "acme"})
+    assert response.status_code == 200
+    assert tenant_request_seconds.count(tenant="acme", route="/items/{id}") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_signup_joins_a_mapped_tenant_only_once_an_admin_assigns_it(async_client, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+    monkeypatch.setenv("ALGORITHM", "HS256")
+    monkeypatch.setitem(tenancy.TENANT_DOMAINS, "acme.com", "acme")
+    monkeypatch.setattr(users_api, "ADMIN_EMAILS", {"admin@example.com"})
+    monkeypatch.setattr(users_api, "get_password_hash", lambda password: "hashed")
+    _, users = use_in_memory_repositories(app)
+    await users.insert({"fullname": "Admin", "email": "admin@example.com", "city": "Lahore", "tenant_id": DEFAULT_TENANT})
+    try:
+        body = {"fullname": "X", "email": "x@acme.com", "city": "Lahore", "password": "secret", "tenant_id": "acme"}
+        signed_up = (await async_client.post("/", json=body)).json()["data"][0]
+        assert signed_up["tenant_id"] is None
+
+        path = "/users/x@acme.com/tenant"
+        user_token = {"Authorization": f"Bearer {users_api.create_access_token({'sub': 'x@acme.com'})}"}
+        assert (await async_client.get("/my-tenant", headers=user_token)).status_code == 403
+        assert (await async_client.put(path, json={}, headers=user_token)).status_code == 403
+
+        admin_token = {"Authorization": f"Bearer {users_api.create_access_token({'sub': 'admin@example.com'})}"}
+        assigned = (await async_client.put(path, json={}, headers=admin_token)).json()["data"][0]
+        assert assigned["tenant_id"] == "acme"
+        assert (await async_client.get("/my-tenant", headers=user_token)).json() == {"tenant": "acme"}
+        assert (await async_client.put("/users/nobody@acme.com/tenant", json={}, headers=admin_token)).status_code == 404
+
+        body = {**body, "email": "y@gmail.com"}
+        await async_client.post("/", json=body)
+        unmapped = "/users/y@gmail.com/tenant"
+        assert (await async_client.put(unmapped, json={}, headers=admin_token)).status_code == 400
+        assert (await async_client.put(unmapped, json={"tenant": "Globex"}, headers=admin_token)).json()["data"][0]["tenant_id"] == "globex"
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_legacy_candidates_move_to_their_creators_tenant(sync_db):
+    created, deleted, archived, unknown, elsewhere = (ObjectId() for _ in range(5))
+    sync_db.candidate_collection.insert_many([
+        {"_id": created, "updated_at": datetime(2024, 1, 1), "deleted_at": None},
+        {"_id": deleted, "tenant_id": DEFAULT_TENANT, "deleted_at": datetime(2024, 2, 1)},
+        {"_id": unknown, "tenant_id": DEFAULT_TENANT, "deleted_at": None},
+        {"_id": elsewhere, "tenant_id": "globex", "deleted_at": None},
+    ])
+    sync_db[ARCHIVE_COLLECTION].insert_one({"_id": archived, "tenant_id": DEFAULT_TENANT, "deleted_at": None})
+    sync_db[SIGNATURE_COLLECTION].insert_one({"candidate_id": created, "tenant_id": DEFAULT_TENANT})
+    sync_db.tenant_usage.insert_one({"_id": DEFAULT_TENANT, "candidates": 3})
+    sync_db[AUDIT_COLLECTION].insert_many([
+        {"action": "create", "candidate_id": str(_id), "actor": actor, "tenant_id": tenant}
+        for _id, actor, tenant in (
+            (created, "ann@acme.com", None),
+            (deleted, "bob@acme.com", DEFAULT_TENANT),
+            (archived, "cy@acme.com", DEFAULT_TENANT),
+            (unknown, "dee@gmail.com", DEFAULT_TENANT),
+            (elsewhere, "eve@acme.com", "globex"),
+        )
+    ])
+
+    tenants = legacy_candidate_tenants(sync_db, {"acme.com": "acme"})
+    assert tenants == {created: "acme", deleted: "acme", archived: "acme"}
+    assert assign_legacy_candidates(sync_db, tenants) == {"acme": 3}
+
+    hot = sync_db.candidate_collection
+    assert [c["_id"] for c in hot.find(tenant_filter(DEFAULT_TENANT))] == [unknown]
+    assert hot.find_one({"_id": created})["updated_at"] > datetime(2024, 1, 1)
+    assert sync_db[ARCHIVE_COLLECTION].find_one({"_id": archived})["tenant_id"] == "acme"
+    # Only the active hot candidate is new to default tenant clients as a deletion.
+    assert [(t["candidate_id"], t["tenant_id"]) for t in sync_db[TOMBSTONE_COLLECTION].find()] == [(created, DEFAULT_TENANT)]
+    assert sync_db[SIGNATURE_COLLECTION].find_one({"candidate_id": created}) is None
+    assert {usage["_id"]: usage["candidates"] for usage in sync_db.tenant_usage.find()} == {DEFAULT_TENANT: 1, "acme": 2}
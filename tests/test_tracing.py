@@ -0,0 +1,126 @@
+import asyncio
+import contextvars
+import functools
+import pytest
+import pytest_asyncio
+from types import SimpleNamespace
+from fastapi import FastAPI
+from httpx import AsyncClient
+from codegrapher import middleware
+from codegrapher.app import tracing
+from codegrapher.middleware import TracingMiddleware
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = CollectingExporter()
+    monkeypatch.setattr(tracing.processor, "exporter", exporter)
+    return exporter
+
+
+app = FastAPI()
+app.add_middleware(TracingMiddleware)
+
+
+@app.get("/items/{id}")
+async def item(id: str):
+    with tracing.start_span("lookup") as span:
+        return {"traceparent": span.context.traceparent()}
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        yield client
+
+
+def test_traceparent_round_trip():
+    context = tracing.SpanContext("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True)
+    assert tracing.parse_traceparent(context.traceparent()) == context
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+@pytest.mark.asyncio
+async def test_request_span_continues_incoming_trace(async_client, exporter):
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    response = await async_client.get("/items/1", headers={"traceparent": parent})
+    tracing.processor.flush()
+    lookup, server = exporter.spans
+    assert server.name == "GET /items/{id}"
+    assert server.parent_id == "b7ad6b7169203331"
+    assert server.attributes["http.status_code"] == 200
+    assert lookup.parent_id == server.context.span_id
+    assert lookup.context.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert tracing.parse_traceparent(response.json()["traceparent"]) == lookup.context
+
+
+@pytest.mark.asyncio
+async def test_unsampled_trace_is_not_exported(async_client, exporter):
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"
+    response = await async_client.get("/items/1", headers={"traceparent": parent})
+    tracing.processor.flush()
+    assert exporter.spans == []
+    assert not tracing.parse_traceparent(response.json()["traceparent"]).sampled
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_traced_when_export_is_disabled(async_client, monkeypatch):
+    monkeypatch.setattr(tracing.processor, "exporter", None)
+
+    def unexpected(scope):
+        raise AssertionError("route resolved with tracing disabled")
+
+    monkeypatch.setattr(middleware, "route_path", unexpected)
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    response = await async_client.get("/items/1", headers={"traceparent": parent})
+    assert not tracing.parse_traceparent(response.json()["traceparent"]).sampled
+
+
+def test_export_failures_are_logged(exporter, monkeypatch, caplog):
+    def unreachable(spans):
+        raise OSError("collector down")
+
+    monkeypatch.setattr(exporter, "export", unreachable)
+    with tracing.start_span("lookup"):
+        pass
+    tracing.processor.flush()
+    assert "Failed to export 1 spans: collector down" in caplog.text
+
+
+def command_event(request_id: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        request_id=request_id, connection_id=("localhost", 27017), operation_id=request_id,
+        command_name="find", database_name="Graphers", command={"find": "candidate_collection"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_mongo_listener_records_command_span(exporter):
+    listener = tracing.MongoCommandListener()
+
+    def find(event):
+        # What pymongo does on the thread Motor runs it on.
+        listener.started(event)
+        listener.succeeded(event)
+
+    with tracing.start_span("request") as request_span:
+        # Motor's executor copies the caller's context into its thread.
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(contextvars.copy_context().run, find, command_event(1))
+        )
+    find(command_event(2))
+    tracing.processor.flush()
+    mongo_span = next(span for span in exporter.spans if span.name == "mongo.find")
+    assert len(exporter.spans) == 2
+    assert mongo_span.parent_id == request_span.context.span_id
+    assert mongo_span.context.trace_id == request_span.context.trace_id
+    assert mongo_span.attributes["db.mongodb.collection"] == "candidate_collection"